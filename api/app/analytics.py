@@ -0,0 +1,263 @@
+"""
+DuckDB backend for the KPI aggregations.
+
+The functions here return exactly what their counterparts in kpi.py and
+crud.py return, but run the group-by/sum scans in an in-process columnar
+engine. kpi.py / crud.py route to them when FINOPS_KPI_BACKEND=duckdb
+(the other values are "sqlite", the default, and "cube", see cube.py).
+
+Billing comes from one of two sources (FINOPS_DUCKDB_SOURCE):
+
+- "sqlite"  (default) the billing/resources tables, ATTACHed read-only
+            through DuckDB's sqlite extension. The extension is downloaded
+            on first use; where that fails (no network, no extension
+            repository) the tables are instead read through SQLAlchemy
+            into DuckDB-registered frames, reloaded whenever the SQLite
+            database changes
+- "parquet" the month-partitioned Parquet store (parquet_store.py); only
+            the partitions of the requested month are scanned, and float32
+            columns are rounded back to their stored precision. Owners come
+            from a snapshot of the resources table, reloaded whenever the
+            SQLite database changes.
+"""
+
+import json
+import os
+import threading
+from collections import defaultdict
+
+import pandas as pd
+import pyarrow.parquet as pq
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+
+from . import parquet_store
+from .db import DATABASE_URL, data_version, read_engine
+from .models import Billing, Resource
+from .utils import format_month_key, logger, month_key
+
+BACKEND = os.getenv("FINOPS_KPI_BACKEND", "sqlite").lower()
+SOURCE = os.getenv("FINOPS_DUCKDB_SOURCE", "sqlite").lower()
+STORE_DIR = parquet_store.STORE_DIR
+THREADS = os.getenv("FINOPS_DUCKDB_THREADS")
+
+_lock = threading.Lock()
+_state = {"con": None, "source": None, "version": None, "attached": False}
+
+BILLING_COLUMNS = ["month_key", "service", "resource_group", "resource_id", "cost"]
+
+
+def enabled() -> bool:
+    """True when the KPI functions should run on DuckDB."""
+    return BACKEND == "duckdb"
+
+
+def reset():
+    """Drop the DuckDB connection so the next query picks up the current config."""
+    with _lock:
+        if _state["con"] is not None:
+            _state["con"].close()
+        _state.update(con=None, source=None, version=None, attached=False)
+
+
+def _quote(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _connect():
+    import duckdb
+
+    if _state["con"] is not None and _state["source"] == SOURCE:
+        return _state["con"]
+    if _state["con"] is not None:
+        _state["con"].close()
+    con = duckdb.connect()
+    if THREADS:
+        con.execute(f"SET threads = {int(THREADS)}")
+    attached = False
+    if SOURCE == "sqlite":
+        try:
+            _attach(con, make_url(DATABASE_URL).database)
+            attached = True
+        except duckdb.Error as error:
+            logger.warning(
+                "DuckDB sqlite extension unavailable (%s); reading the tables "
+                "through SQLAlchemy instead.",
+                str(error).splitlines()[0],
+            )
+    _state.update(con=con, source=SOURCE, version=None, attached=attached)
+    return con
+
+
+def _attach(con, path: str):
+    """ATTACH the SQLite database read-only; INSTALL needs network on first use."""
+    con.execute("INSTALL sqlite")
+    con.execute("LOAD sqlite")
+    con.execute(f"ATTACH {_quote(path)} AS finops (TYPE sqlite, READ_ONLY)")
+    con.execute("CREATE VIEW resources_v AS SELECT * FROM finops.resources")
+
+
+def _sync_tables(con, billing: bool = False):
+    """
+    Parquet source, or sqlite source without the extension: (re)register the
+    owner snapshot, and the billing columns when `billing`, if the database
+    changed.
+    """
+    version = data_version()
+    if version is not None and version == _state["version"]:
+        return
+    table = Resource.__table__
+    resources = pd.read_sql(
+        select(table.c.resource_id, table.c.owner), read_engine
+    ).astype(object)
+    con.register("resources_v", resources)
+    if billing:
+        table = Billing.__table__
+        frame = pd.read_sql(select(*(table.c[c] for c in BILLING_COLUMNS)), read_engine)
+        con.register("billing_v", frame)
+    _state["version"] = version
+
+
+def _month_filter(month):
+    """(month key, 'YYYY-MM' partition) of a requested month, or (None, None)."""
+    key = month_key(month)
+    return (key, format_month_key(key)) if key is not None else (None, None)
+
+
+def _parquet_billing(columns, month=None):
+    """
+    SQL relation over the store parts, optionally only one month partition.
+    Parts are grouped by their float precision so each float column is
+    rounded back exactly like parquet_store.read_billing does.
+    """
+    columns = ["invoice_month"] + [c for c in columns if c != "invoice_month"]
+    if month is None:
+        files = parquet_store.partition_files(STORE_DIR)
+    else:
+        files = parquet_store.partition_files(STORE_DIR, [month])
+    if not files:
+        types = {c: "DOUBLE" for c in parquet_store.FLOAT_COLUMNS}
+        cols = ", ".join(
+            f"CAST(NULL AS {types.get(c, 'VARCHAR')}) AS {c}" for c in columns
+        )
+        return f"(SELECT {cols}, CAST(NULL AS INTEGER) AS month_key WHERE false)"
+
+    groups = defaultdict(list)
+    for path in files:
+        meta = pq.read_schema(path).metadata or {}
+        decimals = json.loads(meta.get(parquet_store.DECIMALS_KEY, b"{}"))
+        groups[tuple(sorted(decimals.items()))].append(path)
+
+    key = "CAST(replace(substr(invoice_month, 1, 7), '-', '') AS INTEGER) AS month_key"
+    selects = []
+    for decimals, paths in groups.items():
+        decimals = dict(decimals)
+        exprs = []
+        for c in columns:
+            if c in decimals:
+                exprs.append(f"round(CAST({c} AS DOUBLE), {int(decimals[c])}) AS {c}")
+            elif c in parquet_store.FLOAT_COLUMNS:
+                exprs.append(f"CAST({c} AS DOUBLE) AS {c}")
+            else:
+                exprs.append(f"CAST({c} AS VARCHAR) AS {c}")
+        file_list = "[" + ", ".join(_quote(p) for p in paths) + "]"
+        selects.append(
+            f"SELECT {', '.join(exprs)}, {key} FROM read_parquet({file_list})"
+        )
+    return "(" + " UNION ALL ".join(selects) + ")"
+
+
+def _query(sql_template: str, columns, params=(), month=None):
+    """
+    Run `sql_template` with {billing} and {resources} filled in for the
+    configured source. Returns the result rows as tuples.
+    """
+    key, partition = _month_filter(month) if month is not None else (None, None)
+    with _lock:
+        con = _connect()
+        if SOURCE == "parquet":
+            _sync_tables(con)
+            billing = _parquet_billing(columns, partition)
+        elif _state["attached"]:
+            billing = "finops.billing"
+        else:
+            _sync_tables(con, billing=True)
+            billing = "billing_v"
+        sql = sql_template.format(billing=billing, resources="resources_v")
+        if month is not None:
+            params = (key, *params)
+        return con.execute(sql, list(params)).fetchall()
+
+
+def get_cost_by_owner(month: str):
+    if month_key(month) is None:
+        return []
+    rows = _query(
+        """
+        SELECT r.owner, SUM(b.cost) AS total_cost
+        FROM {billing} b JOIN {resources} r ON r.resource_id = b.resource_id
+        WHERE b.month_key = ?
+        GROUP BY r.owner
+        ORDER BY r.owner NULLS FIRST
+        """,
+        ["resource_id", "cost"],
+        month=month,
+    )
+    return [(owner if owner else "unknown", total) for owner, total in rows]
+
+
+def monthly_trend(owner: str):
+    rows = _query(
+        """
+        SELECT b.month_key, SUM(b.cost) AS total_cost
+        FROM {billing} b JOIN {resources} r ON r.resource_id = b.resource_id
+        WHERE r.owner = ?
+        GROUP BY b.month_key
+        ORDER BY b.month_key
+        """,
+        ["resource_id", "cost"],
+        params=(owner,),
+    )
+    return [{"month": format_month_key(k), "total_cost": total} for k, total in rows]
+
+
+def top_service_expenditures(service_keyword: str = "network", n: int = 5):
+    return _query(
+        """
+        SELECT b.service, b.resource_id, r.owner, SUM(b.cost) AS total_cost
+        FROM {billing} b JOIN {resources} r ON r.resource_id = b.resource_id
+        WHERE b.service ILIKE ?
+        GROUP BY b.service, b.resource_id, r.owner
+        ORDER BY total_cost DESC
+        LIMIT ?
+        """,
+        ["service", "resource_id", "cost"],
+        params=(f"%{service_keyword}%", int(n)),
+    )
+
+
+def kpi_for_month(month: str):
+    """Same payload as crud.kpi_for_month."""
+    out = {"month": month, "total_cost": 0.0, "by_service": {}, "by_resource_group": {}}
+    if month_key(month) is None:
+        return out
+    rows = _query(
+        """
+        SELECT GROUPING(service), GROUPING(resource_group),
+               service, resource_group, SUM(cost)
+        FROM {billing} b
+        WHERE b.month_key = ?
+        GROUP BY GROUPING SETS ((service), (resource_group), ())
+        """,
+        ["service", "resource_group", "cost"],
+        month=month,
+    )
+    for no_service, no_rg, service, rg, cost in rows:
+        cost = float(cost or 0.0)
+        if no_service and no_rg:
+            out["total_cost"] = cost
+        elif no_rg:
+            out["by_service"][service] = cost
+        else:
+            out["by_resource_group"][rg] = cost
+    return out
@@ -0,0 +1,235 @@
+"""
+Month-over-month cost and unit-cost spike detection.
+
+Billing is streamed once (db.iter_batches) and pivoted with np.bincount into
+dense (entity x month) matrices of cost and usage for every resource,
+service and owner series. Deltas, z-scores against each series' own trailing
+months and unit-cost (cost / usage_qty) jumps are then computed for all
+series at once, and the flagged cells are written to the anomalies table by
+refresh_anomalies(); /anomalies and /ask read that table.
+
+A month is flagged as
+
+- cost_spike       cost rose by at least MIN_DELTA and sits Z_THRESHOLD
+                   standard deviations above the series' earlier months
+                   (which need at least MIN_HISTORY months of history)
+- unit_cost_spike  cost per unit of usage rose by UNIT_JUMP (0.5 = +50%) or
+                   more over the previous month
+
+Thresholds come from FINOPS_ANOMALY_* environment variables. `score` is the
+extra spend versus the previous month, so anomalies sort by dollar impact.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from .cache import cached
+from .cube import _Encoder
+from .db import STREAM_BATCH_SIZE, engine, iter_batches, read_engine
+from .kpi import month_clause
+from .models import Anomaly
+from .rollups import ANOMALIES_TABLE, bump_table_generation
+from .utils import format_month_key
+
+Z_THRESHOLD = float(os.getenv("FINOPS_ANOMALY_Z", "3.0"))
+MIN_DELTA = float(os.getenv("FINOPS_ANOMALY_MIN_DELTA", "1.0"))
+UNIT_JUMP = float(os.getenv("FINOPS_ANOMALY_UNIT_JUMP", "0.5"))
+MIN_HISTORY = int(os.getenv("FINOPS_ANOMALY_MIN_HISTORY", "2"))
+# std floor as a share of the trailing mean, so flat series don't divide by 0
+STD_FLOOR = 0.05
+INSERT_BATCH_SIZE = 5000
+
+ANOMALY_SQL = """
+    SELECT b.month_key, b.resource_id, b.service, r.owner, b.cost, b.usage_qty
+    FROM billing b
+    LEFT JOIN resources r ON r.resource_id = b.resource_id
+    WHERE b.month_key IS NOT NULL
+"""
+
+# entity_type -> column of ANOMALY_SQL
+ENTITY_TYPES = {"resource": "resource_id", "service": "service", "owner": "owner"}
+
+COLUMNS = [c.name for c in Anomaly.__table__.columns if c.name != "id"]
+
+
+def _month_index(keys: np.ndarray) -> np.ndarray:
+    """YYYYMM -> consecutive month number."""
+    return (keys // 100) * 12 + keys % 100 - 1
+
+
+def _month_key(index: np.ndarray) -> np.ndarray:
+    return (index // 12) * 100 + index % 12 + 1
+
+
+def score_matrix(cost: np.ndarray, usage: np.ndarray, unit_spend: np.ndarray):
+    """
+    Flag spikes in (series x month) matrices. `unit_spend` is the cost of the
+    lines that reported usage, so unit cost is unit_spend / usage. Returns a
+    dict of (series x month - 1) arrays for months 1..T-1: delta, pct_change,
+    zscore, unit_cost, prev_unit_cost, unit_cost_change, cost_spike and
+    unit_cost_spike.
+    """
+    n_series, n_months = cost.shape
+    prev, cur = cost[:, :-1], cost[:, 1:]
+    delta = cur - prev
+
+    # trailing statistics over the months since each series first had cost
+    first = np.where((cost > 0).any(axis=1), (cost > 0).argmax(axis=1), n_months)
+    history = np.arange(1, n_months)[None, :] - first[:, None]
+    count = np.maximum(history, 1)
+    mean = np.cumsum(cost, axis=1)[:, :-1] / count
+    var = np.cumsum(cost**2, axis=1)[:, :-1] / count - mean**2
+    std = np.maximum(np.sqrt(np.maximum(var, 0)), STD_FLOOR * np.abs(mean))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_change = np.where(prev > 0, delta / prev, np.nan)
+        zscore = np.where(std > 0, (cur - mean) / std, np.nan)
+        unit = np.where(usage > 0, unit_spend / usage, np.nan)
+        unit_prev, unit_cur = unit[:, :-1], unit[:, 1:]
+        unit_change = np.where(unit_prev > 0, unit_cur / unit_prev - 1, np.nan)
+
+    cost_spike = (history >= MIN_HISTORY) & (delta >= MIN_DELTA)
+    cost_spike &= np.nan_to_num(zscore, nan=-np.inf) >= Z_THRESHOLD
+    unit_spike = np.nan_to_num(unit_change, nan=-np.inf) >= UNIT_JUMP
+    return {
+        "delta": delta,
+        "pct_change": pct_change,
+        "zscore": zscore,
+        "unit_cost": unit_cur,
+        "prev_unit_cost": unit_prev,
+        "unit_cost_change": unit_change,
+        "cost_spike": cost_spike,
+        "unit_cost_spike": unit_spike,
+    }
+
+
+def _load(batch_size: int):
+    """Stream billing into entity codes, month numbers, cost and usage arrays."""
+    encoders = {t: _Encoder() for t in ENTITY_TYPES}
+    parts = {t: [] for t in ENTITY_TYPES}
+    months, cost, usage = [], [], []
+    for batch in iter_batches(ANOMALY_SQL, batch_size=batch_size):
+        for entity_type, column in ENTITY_TYPES.items():
+            parts[entity_type].append(encoders[entity_type].encode(batch[column]))
+        months.append(np.array(batch["month_key"], dtype=np.int64))
+        cost.append(np.nan_to_num(np.array(batch["cost"], dtype=np.float64)))
+        usage.append(np.array(batch["usage_qty"], dtype=np.float64))
+    if not months:
+        return None
+    codes = {t: np.concatenate(p) for t, p in parts.items()}
+    values = {t: e.values for t, e in encoders.items()}
+    return (
+        codes,
+        values,
+        np.concatenate(months),
+        np.concatenate(cost),
+        np.concatenate(usage),
+    )
+
+
+def detect_anomalies(batch_size: int = STREAM_BATCH_SIZE) -> pd.DataFrame:
+    """Every flagged (entity, month) over the whole billing table, by score."""
+    loaded = _load(batch_size)
+    if loaded is None:
+        return pd.DataFrame(columns=COLUMNS)
+    codes, values, months, cost, usage = loaded
+    has_usage = ~np.isnan(usage)
+    usage = np.where(has_usage, usage, 0.0)
+    unit_spend = np.where(has_usage, cost, 0.0)
+
+    month_index = _month_index(months)
+    first_month = month_index.min()
+    n_months = int(month_index.max() - first_month) + 1
+    month_index -= first_month
+    if n_months < 2:
+        return pd.DataFrame(columns=COLUMNS)
+
+    frames = []
+    for entity_type, entity_codes in codes.items():
+        n_series = len(values[entity_type])
+        flat = entity_codes.astype(np.int64) * n_months + month_index
+        size = n_series * n_months
+        matrices = [
+            np.bincount(flat, weights=w, minlength=size).reshape(n_series, n_months)
+            for w in (cost, usage, unit_spend)
+        ]
+        scores = score_matrix(*matrices)
+        named = np.array([v is not None for v in values[entity_type]])
+        for kind in ("cost_spike", "unit_cost_spike"):
+            series, month = np.nonzero(scores[kind] & named[:, None])
+            if not len(series):
+                continue
+            cell = (series, month)
+            cur_cost = matrices[0][series, month + 1]
+            if kind == "cost_spike":
+                score = scores["delta"][cell]
+            else:
+                unit_delta = scores["unit_cost"][cell] - scores["prev_unit_cost"][cell]
+                score = unit_delta * matrices[1][series, month + 1]
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "entity_type": entity_type,
+                        "entity": np.array(values[entity_type], dtype=object)[series],
+                        "month_key": _month_key(month + 1 + first_month),
+                        "kind": kind,
+                        "cost": cur_cost,
+                        "prev_cost": matrices[0][cell],
+                        "delta": scores["delta"][cell],
+                        "pct_change": scores["pct_change"][cell],
+                        "zscore": scores["zscore"][cell],
+                        "unit_cost": scores["unit_cost"][cell],
+                        "prev_unit_cost": scores["prev_unit_cost"][cell],
+                        "unit_cost_change": scores["unit_cost_change"][cell],
+                        "score": score,
+                    }
+                )
+            )
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    out = pd.concat(frames, ignore_index=True)
+    return out.sort_values("score", ascending=False, kind="stable", ignore_index=True)
+
+
+def refresh_anomalies(batch_size: int = STREAM_BATCH_SIZE) -> int:
+    """Recompute the anomalies table in one transaction; returns the row count."""
+    found = detect_anomalies(batch_size)
+    found = found.astype(object).where(found.notna(), None)
+    table = Anomaly.__table__
+    with engine.begin() as conn:
+        conn.execute(table.delete())
+        for start in range(0, len(found), INSERT_BATCH_SIZE):
+            chunk = found.iloc[start : start + INSERT_BATCH_SIZE]
+            conn.execute(table.insert(), chunk.to_dict("records"))
+        bump_table_generation(conn, ANOMALIES_TABLE)
+    return len(found)
+
+
+@cached(table=ANOMALIES_TABLE)
+def get_anomalies(
+    month=None, entity_type=None, kind=None, entity=None, limit=50, offset=0
+):
+    """Stored anomalies, largest score first, as dicts with a YYYY-MM month."""
+    table = Anomaly.__table__
+    q = select(table)
+    if month is not None:
+        q = q.where(month_clause(month, table.c.month_key))
+    if entity_type:
+        q = q.where(table.c.entity_type == entity_type)
+    if kind:
+        q = q.where(table.c.kind == kind)
+    if entity:
+        q = q.where(table.c.entity == entity)
+    q = q.order_by(table.c.score.desc(), table.c.id).limit(limit).offset(offset)
+    with read_engine.connect() as conn:
+        rows = conn.execute(q).mappings().all()
+    return [
+        {
+            **{k: v for k, v in row.items() if k not in ("id", "month_key")},
+            "month": format_month_key(row["month_key"]),
+        }
+        for row in rows
+    ]
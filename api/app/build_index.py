@@ -2,7 +2,8 @@ import os
 import pickle
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from . import index_factory
+from .embedding_cache import get_encoder
 
 
 # Paths (outside api folder)
@@ -33,15 +34,13 @@ docs = [
 
 # Create embeddings
 
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+embed_model = get_encoder("all-MiniLM-L6-v2")
 embeddings = embed_model.encode([d["text"] for d in docs])
 
 
 # Build FAISS index
 
-d = embeddings.shape[1]
-index = faiss.IndexFlatL2(d)
-index.add(np.array(embeddings, dtype="float32"))
+index = index_factory.build_index(np.array(embeddings, dtype="float32"))
 # Save index and docs pickle
 
 faiss.write_index(index, VECTOR_INDEX_PATH)
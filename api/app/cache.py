@@ -0,0 +1,186 @@
+"""
+Result cache for the KPI functions.
+
+Billing only changes when the ETL runs, so KPI results are cached in an LRU
+bounded both by entry count (FINOPS_KPI_CACHE_SIZE) and by approximate
+result size (FINOPS_KPI_CACHE_BYTES); set either to 0 to disable caching.
+
+Keys are the function, its arguments (months normalized to YYYYMM, so
+"2025-04" and "2025-04-01" share an entry), the active KPI backend and the
+data generation the result depends on: that month's generation for
+month-scoped calls, the any-month generation otherwise, or the generation
+of the derived table a function reads (cached(table=...)). The ETL bumps
+generations per affected month (rollups.bump_generations), so a load only
+invalidates results for the months it touched. Cached results are shared
+between callers and must not be mutated.
+"""
+
+import functools
+import inspect
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import inspect as sa_inspect, select
+
+from . import analytics
+from .db import data_version, read_engine
+from .models import DataGeneration
+from .rollups import ALL_MONTHS
+from .utils import month_key
+
+MAX_ENTRIES = int(os.getenv("FINOPS_KPI_CACHE_SIZE", "1024"))
+MAX_BYTES = int(os.getenv("FINOPS_KPI_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+
+class KPICache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._generations = {"version": None, "values": None}
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self.uncacheable = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def generations(self) -> dict:
+        """
+        month_key -> generation, re-read only when the database changed. A
+        database not yet migrated (no data_generations table) has every
+        generation at 0.
+        """
+        version = data_version()
+        cached = self._generations
+        if version is None or version != cached["version"]:
+            table = DataGeneration.__table__
+            with read_engine.connect() as conn:
+                values = {}
+                if sa_inspect(conn).has_table(table.name):
+                    rows = conn.execute(select(table.c.month_key, table.c.generation))
+                    values = dict(rows.all())
+                cached = {"version": version, "values": values}
+            if cached["values"] != self._generations["values"]:
+                self._purge(cached["values"])
+            self._generations = cached
+        return cached["values"]
+
+    def _purge(self, generations: dict):
+        """Drop entries computed against an older generation of their month."""
+        with self._lock:
+            stale = [
+                key for key in self._entries if generations.get(key[3], 0) != key[4]
+            ]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)[1]
+            self.invalidations += len(stale)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key][0]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        try:
+            nbytes = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            self.uncacheable += 1
+            return
+        if nbytes > self.max_bytes:
+            self.uncacheable += 1
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self._bytes += nbytes
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, size) = self._entries.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._generations = {"version": None, "values": None}
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "uncacheable": self.uncacheable,
+            }
+
+
+kpi_cache = KPICache()
+
+
+def _normalize(name, value):
+    if name == "month" and value is not None:
+        key = month_key(value)
+        return key if key is not None else str(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    return value
+
+
+def cached(fn=None, *, month_arg: Optional[str] = "month", table: Optional[int] = None):
+    """
+    Cache a KPI function in kpi_cache. `month_arg` names the argument that
+    scopes the result to one month; calls without it, and every call when
+    month_arg is None, depend on all months. `table` is the generation key of
+    the derived table (rollups.ANOMALIES_TABLE, ...) a function only reads,
+    so results follow that table's refreshes rather than any month's.
+    """
+    if fn is None:
+        return functools.partial(cached, month_arg=month_arg, table=table)
+    signature = inspect.signature(fn)
+    name = f"{fn.__module__}.{fn.__qualname__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not kpi_cache.enabled:
+            return fn(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = tuple((k, _normalize(k, v)) for k, v in bound.arguments.items())
+        month = bound.arguments.get(month_arg) if month_arg else None
+        scope = month_key(month) if month is not None else None
+        scope = ALL_MONTHS if scope is None else scope
+        scope = table if table is not None else scope
+        generation = kpi_cache.generations().get(scope, 0)
+        key = (name, params, analytics.BACKEND, scope, generation)
+        hit, value = kpi_cache.get(key)
+        if hit:
+            return value
+        value = fn(*args, **kwargs)
+        kpi_cache.put(key, value)
+        return value
+
+    wrapper.uncached = fn
+    return wrapper
+
+
+def stats() -> dict:
+    return kpi_cache.stats()
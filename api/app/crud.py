@@ -1,34 +1,39 @@
-from sqlalchemy.orm import sessionmaker
-from .models import Billing, Resource
-from .etl import engine
-from sqlalchemy import func
-
-Session = sessionmaker(bind=engine)
+from . import analytics
+from .cache import cached
+from .models import Billing, CostRollup
+from .db import ReadSessionLocal, iter_rows, read_engine
+from .kpi import month_clause
+from .utils import month_key, month_window
+from sqlalchemy import func, select
 
 
 def kpi_for_month(month: str):
-    session = Session()
-    total = (
-        session.query(func.sum(Billing.cost))
-        .filter(Billing.invoice_month == month)
-        .scalar()
-        or 0.0
-    )
+    # cached without the echoed month, so equivalent spellings share an entry
+    return {"month": month, **_month_totals(month)}
+
+
+@cached
+def _month_totals(month: str):
+    if analytics.enabled():
+        kpis = analytics.kpi_for_month(month)
+        return {k: v for k, v in kpis.items() if k != "month"}
+    session = ReadSessionLocal()
+    in_month = month_clause(month, CostRollup.month_key)
+    total = session.query(func.sum(CostRollup.cost)).filter(in_month).scalar() or 0.0
     by_service = (
-        session.query(Billing.service, func.sum(Billing.cost))
-        .filter(Billing.invoice_month == month)
-        .group_by(Billing.service)
+        session.query(CostRollup.service, func.sum(CostRollup.cost))
+        .filter(in_month)
+        .group_by(CostRollup.service)
         .all()
     )
     by_rg = (
-        session.query(Billing.resource_group, func.sum(Billing.cost))
-        .filter(Billing.invoice_month == month)
-        .group_by(Billing.resource_group)
+        session.query(CostRollup.resource_group, func.sum(CostRollup.cost))
+        .filter(in_month)
+        .group_by(CostRollup.resource_group)
         .all()
     )
     session.close()
     return {
-        "month": month,
         "total_cost": float(total),
         "by_service": {s: float(c) for s, c in by_service},
         "by_resource_group": {rg: float(c) for rg, c in by_rg},
@@ -36,43 +41,112 @@ def kpi_for_month(month: str):
 
 
 # Recommendation heuristics
-def detect_idle_resources(threshold_usage=1.0, month=None):
+
+# share of a resource's cost saved by shutting down an idle resource
+IDLE_SAVING_RATE = 0.5
+
+
+def _latest_month_key():
+    with read_engine.connect() as conn:
+        return conn.execute(select(func.max(Billing.month_key))).scalar()
+
+
+def idle_resources_query(threshold_usage=1.0, month=None, months=1):
     """
-    Detect resources with usage_qty below threshold in the given month.
-    Returns list of (resource_id, cost, estimated_saving)
+    Resources whose total usage_qty was <= threshold_usage in each of the
+    `months` consecutive months ending at `month` (default: the latest billed
+    month), largest estimated saving first. cost is summed over the window.
     """
-    session = Session()
-    q = session.query(Billing).filter(Billing.usage_qty <= threshold_usage)
-    if month:
-        q = q.filter(Billing.invoice_month == month)
-    rows = q.all()
-    results = []
-    for r in rows:
-        # heuristic: if usage <= threshold, estimate 50% saving by shutting down
-        est = r.cost * 0.5
-        results.append(
-            {
-                "resource_id": r.resource_id,
-                "cost": r.cost,
-                "estimated_saving": est,
-                "source": f"billing:{r.id}",
-            }
+    end = month_key(month) if month is not None else _latest_month_key()
+    if end is None or months < 1:
+        window = []
+    else:
+        window = month_window(end, months)
+    b = Billing.__table__.c
+    per_month = (
+        select(
+            b.resource_id,
+            func.sum(b.usage_qty).label("usage_qty"),
+            func.sum(b.cost).label("cost"),
+            func.max(b.id).label("last_id"),
         )
-    session.close()
-    return results
+        .where(b.month_key.in_(window), b.resource_id.is_not(None))
+        .group_by(b.resource_id, b.month_key)
+        .cte("per_month")
+    )
+    cost = func.sum(per_month.c.cost)
+    saving = (cost * IDLE_SAVING_RATE).label("estimated_saving")
+    return (
+        select(
+            per_month.c.resource_id,
+            func.count().label("months_idle"),
+            cost.label("cost"),
+            saving,
+            func.max(per_month.c.last_id).label("last_id"),
+        )
+        .where(per_month.c.usage_qty <= threshold_usage)
+        .group_by(per_month.c.resource_id)
+        .having(func.count() == len(window))
+        .order_by(saving.desc(), per_month.c.resource_id)
+    )
+
 
+def _idle_row(row):
+    return {
+        "resource_id": row["resource_id"],
+        "cost": row["cost"],
+        "estimated_saving": row["estimated_saving"],
+        "months_idle": row["months_idle"],
+        "source": f"billing:{row['last_id']}",
+    }
 
-def missing_owner_tags(month=None):
-    session = Session()
-    q = session.query(Billing).filter(
-        (Billing.resource_group == "unknown") | (Billing.service == "unknown")
+
+def iter_idle_resources(threshold_usage=1.0, month=None, months=1):
+    """Stream every idle-resource recommendation; see idle_resources_query."""
+    for row in iter_rows(idle_resources_query(threshold_usage, month, months)):
+        yield _idle_row(row)
+
+
+@cached(month_arg=None)
+def detect_idle_resources(
+    threshold_usage=1.0, month=None, months=1, limit=None, offset=0
+):
+    """
+    One page of idle-resource recommendations: dicts with resource_id, cost,
+    estimated_saving (50% of cost), months_idle and source.
+    """
+    q = idle_resources_query(threshold_usage, month, months)
+    q = q.limit(limit).offset(offset)
+    with read_engine.connect() as conn:
+        return [_idle_row(row) for row in conn.execute(q).mappings()]
+
+
+def missing_tags_query(month=None):
+    """Billing lines with an unknown service or resource group, by id."""
+    b = Billing.__table__.c
+    q = select(b.id, b.resource_id, b.cost).where(
+        (b.resource_group == "unknown") | (b.service == "unknown")
     )
     if month:
-        q = q.filter(Billing.invoice_month == month)
-    rows = q.all()
-    out = [
-        {"resource_id": r.resource_id, "cost": r.cost, "source": f"billing:{r.id}"}
-        for r in rows
-    ]
-    session.close()
-    return out
+        q = q.where(month_clause(month, b.month_key))
+    return q.order_by(b.id)
+
+
+def _missing_tag_row(row):
+    return {
+        "resource_id": row["resource_id"],
+        "cost": row["cost"],
+        "source": f"billing:{row['id']}",
+    }
+
+
+def iter_missing_owner_tags(month=None):
+    for row in iter_rows(missing_tags_query(month)):
+        yield _missing_tag_row(row)
+
+
+@cached
+def missing_owner_tags(month=None, limit=None, offset=0):
+    q = missing_tags_query(month).limit(limit).offset(offset)
+    with read_engine.connect() as conn:
+        return [_missing_tag_row(row) for row in conn.execute(q).mappings()]
@@ -0,0 +1,341 @@
+"""
+In-process columnar cost cube for interactive dashboards.
+
+billing JOIN resources is held as NumPy arrays: int32 codes for
+month/owner/service/resource_group/region/resource_id (each with its value
+dictionary) plus float64 cost, sorted by month so a month is a slice.
+get_cost_by_owner, monthly_trend, top_service_expenditures, top_n_per_group,
+get_highest_paid_owner and get_most_used_service are answered with
+bincount / argpartition and return what the SQL versions return.
+
+Enabled with FINOPS_KPI_BACKEND=cube. The cube is built on first use (the
+API warms it at startup) and rebuilt on the next query after an ETL load
+commits (db.data_version changes).
+"""
+
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from . import analytics
+from .db import STREAM_BATCH_SIZE, data_version, iter_batches
+from .utils import format_month_key, month_key
+
+CUBE_SQL = """
+    SELECT b.month_key, r.owner, b.service, b.resource_group, b.region,
+           b.resource_id, b.cost
+    FROM billing b
+    JOIN resources r ON r.resource_id = b.resource_id
+"""
+
+DIMENSIONS = [
+    "month_key",
+    "owner",
+    "service",
+    "resource_group",
+    "region",
+    "resource_id",
+]
+
+_lock = threading.Lock()
+_state = {"cube": None, "version": None}
+
+
+def enabled() -> bool:
+    """True when the KPI functions should be answered from the cube."""
+    return analytics.BACKEND == "cube"
+
+
+class _Encoder:
+    """Incremental dictionary encoding across streamed batches."""
+
+    def __init__(self):
+        self.lookup = {}
+        self.values = []
+
+    def encode(self, values) -> np.ndarray:
+        codes, uniques = pd.factorize(
+            pd.Series(values, dtype=object), use_na_sentinel=False
+        )
+        remap = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            value = None if pd.isna(value) else value
+            if value not in self.lookup:
+                self.lookup[value] = len(self.values)
+                self.values.append(value)
+            remap[i] = self.lookup[value]
+        return remap[codes]
+
+
+def _ilike_codes(values, pattern: str) -> np.ndarray:
+    """Codes of dictionary values containing `pattern`, case-insensitively."""
+    pattern = pattern.lower()
+    return np.array(
+        [i for i, v in enumerate(values) if v is not None and pattern in v.lower()],
+        dtype=np.int32,
+    )
+
+
+class CostCube:
+    def __init__(self, codes: dict, dictionaries: dict, cost: np.ndarray):
+        months = dictionaries["month_key"]
+        # renumber months in calendar order and sort rows by month
+        order = sorted(
+            range(len(months)), key=lambda i: (months[i] is None, months[i] or 0)
+        )
+        rank = np.empty(len(months), dtype=np.int32)
+        rank[order] = np.arange(len(months), dtype=np.int32)
+        month_codes = rank[codes["month_key"]] if len(months) else codes["month_key"]
+        rows = np.argsort(month_codes, kind="stable")
+
+        self.dictionaries = dict(dictionaries)
+        self.dictionaries["month_key"] = [months[i] for i in order]
+        self.codes = {name: c[rows] for name, c in codes.items()}
+        self.codes["month_key"] = month_codes[rows]
+        self.cost = cost[rows]
+        self.month_offsets = np.searchsorted(
+            self.codes["month_key"], np.arange(len(months) + 1)
+        )
+        self.index = {
+            name: {v: i for i, v in enumerate(values)}
+            for name, values in self.dictionaries.items()
+        }
+
+    @classmethod
+    def load(cls, batch_size: int = STREAM_BATCH_SIZE):
+        """Stream billing JOIN resources from the database into a new cube."""
+        encoders = {name: _Encoder() for name in DIMENSIONS}
+        parts = {name: [] for name in DIMENSIONS}
+        costs = []
+        for batch in iter_batches(CUBE_SQL, batch_size=batch_size):
+            for name in DIMENSIONS:
+                parts[name].append(encoders[name].encode(batch[name]))
+            cost = np.array(batch["cost"], dtype=np.float64)
+            costs.append(np.nan_to_num(cost))
+        codes = {
+            name: np.concatenate(p) if p else np.empty(0, dtype=np.int32)
+            for name, p in parts.items()
+        }
+        cost = np.concatenate(costs) if costs else np.empty(0, dtype=np.float64)
+        return cls(codes, {n: e.values for n, e in encoders.items()}, cost)
+
+    def __len__(self):
+        return len(self.cost)
+
+    def _month_slice(self, month) -> slice:
+        """Rows of one month; an empty slice for unknown months."""
+        code = (
+            self.index["month_key"].get(month_key(month)) if month is not None else None
+        )
+        if code is None:
+            return slice(0, 0)
+        return slice(self.month_offsets[code], self.month_offsets[code + 1])
+
+    def _sums(self, dim: str, rows, mask=None):
+        """(sum, count) per dictionary code of `dim` over rows[mask]."""
+        codes, cost = self.codes[dim][rows], self.cost[rows]
+        if mask is not None:
+            codes, cost = codes[mask], cost[mask]
+        n = len(self.dictionaries[dim])
+        return (
+            np.bincount(codes, weights=cost, minlength=n),
+            np.bincount(codes, minlength=n),
+        )
+
+    def cost_by_owner(self, month: str):
+        sums, counts = self._sums("owner", self._month_slice(month))
+        owners = self.dictionaries["owner"]
+        present = sorted(
+            np.flatnonzero(counts),
+            key=lambda i: (owners[i] is not None, owners[i] or ""),
+        )
+        return [
+            (owners[i] if owners[i] else "unknown", float(sums[i])) for i in present
+        ]
+
+    def monthly_trend(self, owner: str):
+        code = self.index["owner"].get(owner)
+        if code is None or owner is None:
+            return []
+        rows = slice(0, len(self))
+        sums, counts = self._sums("month_key", rows, self.codes["owner"] == code)
+        months = self.dictionaries["month_key"]
+        return [
+            {"month": format_month_key(months[i]), "total_cost": float(sums[i])}
+            for i in np.flatnonzero(counts)
+        ]
+
+    def top_service_expenditures(self, service_keyword: str = "network", n: int = 5):
+        services = _ilike_codes(self.dictionaries["service"], service_keyword)
+        mask = np.isin(self.codes["service"], services)
+        if not mask.any() or n <= 0:
+            return []
+        n_res = len(self.dictionaries["resource_id"])
+        # owner is a function of resource_id, so (service, resource) is the group
+        keys = (
+            self.codes["service"][mask].astype(np.int64) * n_res
+            + self.codes["resource_id"][mask]
+        )
+        groups, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse, weights=self.cost[mask])
+        k = min(n, len(totals))
+        top = np.argpartition(-totals, k - 1)[:k]
+        top = top[np.argsort(-totals[top], kind="stable")]
+
+        first_row = np.flatnonzero(mask)[np.unique(inverse, return_index=True)[1]]
+        out = []
+        for g in top:
+            row = first_row[g]
+            out.append(
+                (
+                    self.dictionaries["service"][groups[g] // n_res],
+                    self.dictionaries["resource_id"][groups[g] % n_res],
+                    self.dictionaries["owner"][self.codes["owner"][row]],
+                    float(totals[g]),
+                )
+            )
+        return out
+
+    def _sort_rank(self, dim: str) -> np.ndarray:
+        """Position of each dictionary value in SQL order (NULL first)."""
+        values = self.dictionaries[dim]
+        order = sorted(
+            range(len(values)), key=lambda i: (values[i] is not None, values[i] or "")
+        )
+        rank = np.empty(len(values), dtype=np.int64)
+        rank[order] = np.arange(len(values))
+        return rank
+
+    def top_n_per_group(self, group_by, n=5, month=None, service_keyword=None):
+        """kpi.top_n_per_group over the column arrays (one lexsort per dimension)."""
+        out = {dim: [] for dim in group_by}
+        rows = self._month_slice(month) if month is not None else slice(0, len(self))
+        row_ids = np.arange(len(self))[rows]
+        if service_keyword:
+            services = _ilike_codes(self.dictionaries["service"], service_keyword)
+            row_ids = row_ids[np.isin(self.codes["service"][row_ids], services)]
+        if n <= 0 or not len(row_ids):
+            return out
+        n_res = len(self.dictionaries["resource_id"])
+        res_rank = self._sort_rank("resource_id")
+        for dim in group_by:
+            keys = (
+                self.codes[dim][row_ids].astype(np.int64) * n_res
+                + self.codes["resource_id"][row_ids]
+            )
+            groups, first, inverse = np.unique(
+                keys, return_index=True, return_inverse=True
+            )
+            totals = np.bincount(inverse, weights=self.cost[row_ids])
+            group_codes, res_codes = groups // n_res, groups % n_res
+            order = np.lexsort(
+                (res_rank[res_codes], -totals, self._sort_rank(dim)[group_codes])
+            )
+            sorted_groups = group_codes[order]
+            starts = np.flatnonzero(
+                np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]
+            )
+            ranks = np.arange(len(order)) - np.repeat(
+                starts, np.diff(np.r_[starts, len(order)])
+            )
+            keep = ranks < n
+            for g, rank in zip(order[keep], ranks[keep]):
+                row = row_ids[first[g]]
+                out[dim].append(
+                    {
+                        "group": self.dictionaries[dim][group_codes[g]],
+                        "rank": int(rank) + 1,
+                        "resource_id": self.dictionaries["resource_id"][res_codes[g]],
+                        "owner": self.dictionaries["owner"][self.codes["owner"][row]],
+                        "total_cost": float(totals[g]),
+                    }
+                )
+        return out
+
+    def highest_paid_owner(self, month: str):
+        sums, counts = self._sums("owner", self._month_slice(month))
+        if not counts.any():
+            return None
+        present = np.flatnonzero(counts)
+        best = present[np.argmax(sums[present])]
+        owner = self.dictionaries["owner"][best]
+        return {"Owner": owner if owner else "unknown", "Cost": float(sums[best])}
+
+    def most_used_service(self, owner: str = None, month: str = None):
+        rows = self._month_slice(month) if month else slice(0, len(self))
+        mask = None
+        if owner:
+            owners = _ilike_codes(self.dictionaries["owner"], owner)
+            mask = np.isin(self.codes["owner"][rows], owners)
+        sums, counts = self._sums("service", rows, mask)
+        if not counts.any():
+            return None
+        present = np.flatnonzero(counts)
+        best = present[np.argmax(sums[present])]
+        return {
+            "Service": self.dictionaries["service"][best],
+            "Cost": float(sums[best]),
+        }
+
+    def memory_report(self) -> dict:
+        """Bytes used by the column arrays and the value dictionaries."""
+        columns = {name: int(c.nbytes) for name, c in self.codes.items()}
+        columns["cost"] = int(self.cost.nbytes)
+        columns["month_offsets"] = int(self.month_offsets.nbytes)
+        dictionaries = {
+            name: sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values)
+            for name, values in self.dictionaries.items()
+        }
+        return {
+            "rows": len(self),
+            "columns": columns,
+            "dictionaries": dictionaries,
+            "cardinality": {n: len(v) for n, v in self.dictionaries.items()},
+            "total_bytes": sum(columns.values()) + sum(dictionaries.values()),
+        }
+
+
+def get_cube(refresh: bool = False) -> CostCube:
+    """The current cube, rebuilt when the database changed since it was loaded."""
+    with _lock:
+        version = data_version()
+        stale = version is not None and version != _state["version"]
+        if refresh or _state["cube"] is None or stale:
+            _state["cube"] = CostCube.load()
+            _state["version"] = version
+        return _state["cube"]
+
+
+def reset():
+    with _lock:
+        _state.update(cube=None, version=None)
+
+
+def get_cost_by_owner(month: str):
+    return get_cube().cost_by_owner(month)
+
+
+def monthly_trend(owner: str):
+    return get_cube().monthly_trend(owner)
+
+
+def top_service_expenditures(service_keyword: str = "network", n: int = 5):
+    return get_cube().top_service_expenditures(service_keyword, n)
+
+
+def get_highest_paid_owner(month: str):
+    return get_cube().highest_paid_owner(month)
+
+
+def get_most_used_service(owner: str = None, month: str = None):
+    return get_cube().most_used_service(owner, month)
+
+
+def top_n_per_group(group_by, n=5, month=None, service_keyword=None):
+    return get_cube().top_n_per_group(group_by, n, month, service_keyword)
+
+
+def memory_report() -> dict:
+    return get_cube().memory_report()
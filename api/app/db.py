@@ -1,73 +1,194 @@
+"""
+Database runtime shared by the ETL, the API and the RAG sync.
+
+One configurable URL (FINOPS_DATABASE_URL, default data/finops.db) and two
+pooled engines on it:
+
+- `engine` / `SessionLocal` for the ETL writer
+- `read_engine` / `ReadSessionLocal` for API readers; their connections are
+  query_only, and with SQLite in WAL mode they read the last committed
+  snapshot instead of waiting on a running load
+
+SQLite connections get WAL journaling plus cache_size / mmap_size /
+synchronous / busy_timeout pragmas, each overridable through FINOPS_SQLITE_*
+environment variables.
+
+Large reads should go through the iter_* helpers, which stream rows or
+column batches from a server-side cursor instead of materializing a table.
+"""
+
 import os
+import threading
 from pathlib import Path
-from sqlalchemy import create_engine, MetaData, text
+from sqlalchemy import create_engine, event, MetaData, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 
 
-# Absolute path to finops.db
-
 BASE_DIR = Path(__file__).resolve().parents[2]  # go 3 levels up
 
-DB_PATH = BASE_DIR / "data" / "finops.db"
+DB_PATH = (BASE_DIR / "data" / "finops.db").resolve()
 
-# Ensure path is absolute
-DB_PATH = DB_PATH.resolve()
+DATABASE_URL = os.getenv("FINOPS_DATABASE_URL", f"sqlite:///{DB_PATH}")
 
-DATABASE_URL = f"sqlite:///{DB_PATH}"
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+# negative cache_size is in KiB; mmap_size is in bytes
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("FINOPS_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("FINOPS_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.getenv("FINOPS_SQLITE_CACHE_SIZE", "-65536")),
+    "mmap_size": int(os.getenv("FINOPS_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "busy_timeout": int(os.getenv("FINOPS_SQLITE_BUSY_TIMEOUT_MS", "30000")),
+    "temp_store": "MEMORY",
+}
 
-#  Check file existence before creating engine
-if not DB_PATH.exists():
-    raise FileNotFoundError(f"Database not found at: {DB_PATH}")
+POOL_SIZE = int(os.getenv("FINOPS_DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("FINOPS_DB_MAX_OVERFLOW", "10"))
 
-DATABASE_URL = f"sqlite:///{DB_PATH}"
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
 
-engine = create_engine(DATABASE_URL, echo=False, future=True, connect_args=connect_args)
+def _is_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite"
+
+
+def _is_memory(url) -> bool:
+    return url.database in (None, "", ":memory:")
+
+
+def _apply_pragmas(dbapi_conn, read_only: bool):
+    cur = dbapi_conn.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cur.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cur.execute("PRAGMA query_only=ON")
+    finally:
+        cur.close()
+
+
+def make_engine(url: str = DATABASE_URL, read_only: bool = False):
+    """
+    Pooled engine for `url`. SQLite files get their parent directory created,
+    the tuning pragmas on every new connection and, for readers, query_only.
+    """
+    parsed = make_url(url)
+    kwargs = {"future": True, "pool_pre_ping": True}
+    if _is_sqlite(parsed):
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if not _is_memory(parsed):
+            Path(parsed.database).resolve().parent.mkdir(parents=True, exist_ok=True)
+            kwargs.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW)
+    else:
+        kwargs.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW)
+    eng = create_engine(url, **kwargs)
+
+    if _is_sqlite(parsed):
+
+        @event.listens_for(eng, "connect")
+        def _on_connect(dbapi_conn, _record):
+            _apply_pragmas(dbapi_conn, read_only)
+
+    return eng
+
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+read_engine = make_engine(DATABASE_URL, read_only=True)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+
 metadata = MetaData()
 
+_version_lock = threading.Lock()
+_version_conn = {}
+
+
+def data_version():
+    """
+    Counter that changes whenever another connection commits to the SQLite
+    database (PRAGMA data_version on a dedicated reader connection), so
+    in-process caches can tell when an ETL load landed. None for other
+    databases.
+    """
+    if read_engine.dialect.name != "sqlite":
+        return None
+    with _version_lock:
+        if "conn" not in _version_conn:
+            _version_conn["conn"] = read_engine.raw_connection()
+        cur = _version_conn["conn"].cursor()
+        try:
+            return cur.execute("PRAGMA data_version").fetchone()[0]
+        finally:
+            cur.close()
+
 
 # Query helpers
 
+# Rows fetched per round trip by the streaming helpers
+STREAM_BATCH_SIZE = int(os.getenv("FINOPS_STREAM_BATCH_SIZE", "5000"))
+
+BILLING_ROWS_SQL = """
+    SELECT invoice_month, account_id, subscription, service,
+        resource_group, resource_id, region, usage_qty,
+        unit_cost, cost
+    FROM billing
+"""
+
+RESOURCE_ROWS_SQL = """
+    SELECT resource_id, owner, env, tags_json
+    FROM resources
+"""
+
+
+def _statement(sql):
+    """Raw SQL strings become text(); SQLAlchemy statements pass through."""
+    return text(sql) if isinstance(sql, str) else sql
+
+
+def iter_batches(sql, params=None, batch_size: int = STREAM_BATCH_SIZE):
+    """
+    Stream a read query as column batches ({column: [values]}) of at most
+    `batch_size` rows, using a server-side cursor so only one batch is in
+    memory at a time.
+    """
+    with read_engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=batch_size
+        ).execute(_statement(sql), params or {})
+        columns = list(result.keys())
+        for part in result.partitions():
+            yield {c: list(values) for c, values in zip(columns, zip(*part))}
+
+
+def iter_rows(sql, params=None, batch_size: int = STREAM_BATCH_SIZE):
+    """Stream a read query row by row as dicts; see iter_batches."""
+    with read_engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=batch_size
+        ).execute(_statement(sql), params or {})
+        for row in result.mappings():
+            yield dict(row)
+
+
+def iter_billing_rows(batch_size: int = STREAM_BATCH_SIZE):
+    return iter_rows(BILLING_ROWS_SQL, batch_size=batch_size)
+
+
+def iter_billing_batches(batch_size: int = STREAM_BATCH_SIZE):
+    return iter_batches(BILLING_ROWS_SQL, batch_size=batch_size)
+
+
+def iter_resource_rows(batch_size: int = STREAM_BATCH_SIZE):
+    return iter_rows(RESOURCE_ROWS_SQL, batch_size=batch_size)
+
+
+def iter_resource_batches(batch_size: int = STREAM_BATCH_SIZE):
+    return iter_batches(RESOURCE_ROWS_SQL, batch_size=batch_size)
+
 
 def get_billing_rows():
-    db = SessionLocal()
-    try:
-        rows = (
-            db.execute(
-                text(
-                    """
-            SELECT invoice_month, account_id, subscription, service, 
-                resource_group, resource_id, region, usage_qty, 
-                unit_cost, cost
-            FROM billing
-        """
-                )
-            )
-            .mappings()
-            .all()
-        )
-        return [dict(r) for r in rows]
-    finally:
-        db.close()
+    """All billing rows as a list; prefer iter_billing_rows for large tables."""
+    return list(iter_billing_rows())
 
 
 def get_resource_rows():
-    db = SessionLocal()
-    try:
-        rows = (
-            db.execute(
-                text(
-                    """
-            SELECT resource_id, owner, env, tags_json
-            FROM resources
-        """
-                )
-            )
-            .mappings()
-            .all()
-        )
-        return [dict(r) for r in rows]
-    finally:
-        db.close()
+    """All resources as a list; prefer iter_resource_rows for large tables."""
+    return list(iter_resource_rows())
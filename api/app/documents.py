@@ -0,0 +1,338 @@
+"""
+Documents embedded into the RAG vector store.
+
+FINOPS_RAG_DOCS picks the comma-separated document levels:
+
+- "resource"  one summary per resource per month (billing joined to resources)
+- "owner"     one summary per owner per month (cost_rollup, resources only)
+- "service"   one summary per service per month (cost_rollup)
+- "row"       one document per billing line (the original, largest layout)
+
+The default is the three summary levels, so the index grows with resources
+x months rather than with billing lines and a top-k search returns k
+distinct, pre-aggregated facts instead of near-identical rows. Every summary
+states the month's total and its change against the previous month, which
+is why a change to one month also rewrites the next month's summaries
+(affected_months).
+
+Every document has a stable 63-bit id (the natural key of a billing line, or
+level / entity / month of a summary) plus month_key, owner, services and env
+metadata kept next to its text in the docs pickle. MetadataIndex turns that
+metadata into per-value id lists for filtered searches.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+from sqlalchemy import bindparam, func, select, text as sql_text
+
+from .db import STREAM_BATCH_SIZE, iter_batches, read_engine
+from .models import BILLING_NATURAL_KEY, Billing, CostRollup
+from .utils import add_months, format_month_key, month_key
+
+DOC_LEVELS_ALL = ("resource", "owner", "service", "row")
+SUMMARY_LEVELS = ("resource", "owner", "service")
+_NO_IDS = np.empty(0, dtype="int64")
+
+DOC_LEVELS = tuple(
+    level.strip().lower()
+    for level in os.getenv("FINOPS_RAG_DOCS", ",".join(SUMMARY_LEVELS)).split(",")
+    if level.strip()
+)
+
+ROW_DOCS_SQL = """
+    SELECT b.month_key, b.invoice_month, b.account_id, b.subscription,
+           b.service, b.resource_group, b.resource_id, b.region,
+           b.usage_qty, b.unit_cost, b.cost,
+           r.owner, r.env, r.tags_json
+    FROM billing b
+    LEFT JOIN resources r
+      ON b.resource_id = r.resource_id
+    WHERE b.month_key IN :months OR b.month_key IS NULL
+"""
+
+# month totals of one level for :scan (the wanted :months and the months
+# before them); LAG over each entity's months finds its previous total in one
+# sorted pass, kept only when it is from exactly the month before
+_SUMMARY_SQL = """
+    WITH agg AS ({agg}),
+    lagged AS (
+        SELECT agg.*,
+               LAG(month_key) OVER w AS lag_month,
+               LAG(cost) OVER w AS lag_cost
+        FROM agg
+        WINDOW w AS (PARTITION BY entity ORDER BY month_key)
+    )
+    SELECT lagged.*,
+           CASE WHEN lag_month = CASE WHEN month_key % 100 = 1
+                                      THEN month_key - 89
+                                      ELSE month_key - 1 END
+                THEN lag_cost END AS prev_cost
+    FROM lagged
+    WHERE month_key IN :months
+"""
+
+_SUMMARY_AGG = {
+    "resource": """
+        SELECT b.month_key, b.resource_id AS entity,
+               MAX(r.owner) AS owner, MAX(r.env) AS env,
+               group_concat(DISTINCT b.service) AS services,
+               group_concat(DISTINCT b.resource_group) AS resource_groups,
+               group_concat(DISTINCT b.subscription) AS subscriptions,
+               group_concat(DISTINCT b.region) AS regions,
+               SUM(b.cost) AS cost, SUM(b.usage_qty) AS usage_qty,
+               COUNT(*) AS n_rows
+        FROM billing b
+        LEFT JOIN resources r
+          ON b.resource_id = r.resource_id
+        WHERE b.month_key IN :scan
+        GROUP BY b.month_key, b.resource_id
+    """,
+    # has_resource keeps the inner-join semantics of the owner KPIs
+    "owner": """
+        SELECT month_key, owner AS entity,
+               group_concat(DISTINCT service) AS services,
+               SUM(cost) AS cost, SUM(row_count) AS n_rows
+        FROM cost_rollup
+        WHERE has_resource = 1 AND month_key IN :scan
+        GROUP BY month_key, owner
+    """,
+    "service": """
+        SELECT month_key, service AS entity,
+               COUNT(DISTINCT CASE WHEN has_resource = 1 THEN owner END)
+                 AS n_owners,
+               SUM(cost) AS cost, SUM(row_count) AS n_rows
+        FROM cost_rollup
+        WHERE month_key IN :scan
+        GROUP BY month_key, service
+    """,
+}
+
+
+def check_levels(levels) -> tuple:
+    levels = tuple(levels)
+    unknown = [level for level in levels if level not in DOC_LEVELS_ALL]
+    if unknown or not levels:
+        raise ValueError(
+            f"unknown document levels {unknown}; expected some of {DOC_LEVELS_ALL}"
+        )
+    return levels
+
+
+def _hash_id(key: str) -> int:
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
+def row_doc_id(row) -> int:
+    """Stable 63-bit vector id of a billing line, from its natural key."""
+    return _hash_id("\x1f".join(str(row[c]) for c in BILLING_NATURAL_KEY))
+
+
+def summary_doc_id(level: str, entity, month_key: int) -> int:
+    """Stable 63-bit vector id of one level / entity / month summary."""
+    return _hash_id(f"summary\x1f{level}\x1f{entity}\x1f{month_key}")
+
+
+def row_doc_text(row) -> str:
+    return (
+        f"Invoice Month: {row['invoice_month']}, "
+        f"Account: {row['account_id']}, Subscription: {row['subscription']}, "
+        f"Service: {row['service']}, Resource Group: {row['resource_group']}, "
+        f"Resource ID: {row['resource_id']}, Region: {row['region']}, "
+        f"Usage Qty: {row['usage_qty']}, Unit Cost: {row['unit_cost']}, "
+        f"Cost: {row['cost']}, "
+        f"Owner: {row.get('owner', 'N/A')}, "
+        f"Environment: {row.get('env', 'N/A')}, "
+        f"Tags: {row.get('tags_json', '{}')}"
+    )
+
+
+def _change(cost: float, prev_cost, month_key: int) -> str:
+    prev = format_month_key(add_months(month_key, -1))
+    if prev_cost is None:
+        return f"new since {prev} (no cost that month)"
+    delta = cost - prev_cost
+    direction = "up" if delta >= 0 else "down"
+    pct = f" ({delta / prev_cost:+.1%})" if prev_cost else ""
+    return f"{direction} ${abs(delta):,.2f}{pct} from ${prev_cost:,.2f} in {prev}"
+
+
+def _split(values) -> tuple:
+    return tuple(sorted(v for v in (values or "").split(",") if v))
+
+
+def summary_doc_text(level: str, row) -> str:
+    month = format_month_key(row["month_key"])
+    cost = row["cost"] or 0.0
+    change = _change(cost, row["prev_cost"], row["month_key"])
+    if level == "resource":
+        return (
+            f"Resource {row['entity']} in {month}: cost ${cost:,.2f} over "
+            f"{row['n_rows']} billing lines, usage {row['usage_qty'] or 0:,.2f}; "
+            f"{change}. Service: {', '.join(_split(row['services']))}. "
+            f"Resource Group: {', '.join(_split(row['resource_groups']))}. "
+            f"Subscription: {', '.join(_split(row['subscriptions']))}. "
+            f"Region: {', '.join(_split(row['regions']))}. "
+            f"Owner: {row['owner'] or 'unassigned'}. "
+            f"Environment: {row['env'] or 'N/A'}."
+        )
+    if level == "owner":
+        return (
+            f"Owner {row['entity'] or 'unassigned'} in {month}: total cost "
+            f"${cost:,.2f} over {row['n_rows']} billing lines; {change}. "
+            f"Services: {', '.join(_split(row['services']))}."
+        )
+    return (
+        f"Service {row['entity']} in {month}: total cost ${cost:,.2f} over "
+        f"{row['n_rows']} billing lines across {row['n_owners']} owners; {change}."
+    )
+
+
+def _summary_meta(level: str, row) -> dict:
+    if level == "resource":
+        return {
+            "owner": row["owner"],
+            "services": _split(row["services"]),
+            "env": row["env"],
+        }
+    if level == "owner":
+        return {
+            "owner": row["entity"],
+            "services": _split(row["services"]),
+            "env": None,
+        }
+    return {"owner": None, "services": (row["entity"],), "env": None}
+
+
+def affected_months(months, levels=DOC_LEVELS) -> list:
+    """
+    Months whose documents change when `months` change: summaries also
+    compare against the previous month, so the following months are added.
+    """
+    months = set(months)
+    if any(level in SUMMARY_LEVELS for level in levels):
+        months |= {add_months(m, 1) for m in months}
+    return sorted(months)
+
+
+def iter_documents(months, levels=DOC_LEVELS, batch_size: int = STREAM_BATCH_SIZE):
+    """
+    Documents of the given month keys, streamed from the database as dicts
+    with id, month_key, text, source and the owner / services / env metadata.
+    Row documents of billing lines without a month are included as well.
+    """
+    levels = check_levels(levels)
+    months = sorted(months)
+    for level in levels:
+        if level == "row":
+            query = sql_text(ROW_DOCS_SQL).bindparams(
+                bindparam("months", expanding=True)
+            )
+            params = {"months": months}
+        else:
+            query = sql_text(_SUMMARY_SQL.format(agg=_SUMMARY_AGG[level])).bindparams(
+                bindparam("months", expanding=True), bindparam("scan", expanding=True)
+            )
+            scan = sorted(set(months) | {add_months(m, -1) for m in months})
+            params = {"months": months, "scan": scan}
+        for batch in iter_batches(query, params, batch_size=batch_size):
+            columns = list(batch)
+            for values in zip(*batch.values()):
+                row = dict(zip(columns, values))
+                if level == "row":
+                    yield {
+                        "id": row_doc_id(row),
+                        "month_key": row["month_key"],
+                        "text": row_doc_text(row),
+                        "source": "billing+resources",
+                        "owner": row["owner"],
+                        "services": (row["service"],),
+                        "env": row["env"],
+                    }
+                else:
+                    yield {
+                        "id": summary_doc_id(level, row["entity"], row["month_key"]),
+                        "month_key": row["month_key"],
+                        "text": summary_doc_text(level, row),
+                        "source": f"summary:{level}",
+                        **_summary_meta(level, row),
+                    }
+
+
+def count_documents(levels=DOC_LEVELS) -> int:
+    """Number of documents the given levels produce over all months."""
+    counts = {
+        "row": select(func.count()).select_from(Billing),
+        "resource": select(func.count()).select_from(
+            select(Billing.month_key)
+            .where(Billing.month_key.is_not(None))
+            .group_by(Billing.month_key, Billing.resource_id)
+            .subquery()
+        ),
+        "owner": select(func.count()).select_from(
+            select(CostRollup.month_key)
+            .where(CostRollup.has_resource == 1)
+            .group_by(CostRollup.month_key, CostRollup.owner)
+            .subquery()
+        ),
+        "service": select(func.count()).select_from(
+            select(CostRollup.month_key)
+            .group_by(CostRollup.month_key, CostRollup.service)
+            .subquery()
+        ),
+    }
+    with read_engine.connect() as conn:
+        return sum(
+            conn.execute(counts[level]).scalar() for level in check_levels(levels)
+        )
+
+
+class MetadataIndex:
+    """
+    Ids of the documents with each month, owner, service and env, built from
+    the docs pickle: select() answers a filter with a sorted id array to pass
+    to index_factory.search_params. Owners, services and envs match
+    case-insensitively.
+    """
+
+    FIELDS = ("month", "owner", "service", "env")
+
+    def __init__(self, docs: dict):
+        postings = {field: {} for field in self.FIELDS}
+        for doc_id, doc in docs.items():
+            if doc.get("month_key") is not None:
+                postings["month"].setdefault(doc["month_key"], []).append(doc_id)
+            for field, values in (
+                ("owner", (doc.get("owner"),)),
+                ("service", doc.get("services") or ()),
+                ("env", (doc.get("env"),)),
+            ):
+                for value in values:
+                    if value:
+                        postings[field].setdefault(value.lower(), []).append(doc_id)
+        self._postings = {
+            field: {
+                value: np.unique(np.array(ids, dtype="int64"))
+                for value, ids in values.items()
+            }
+            for field, values in postings.items()
+        }
+
+    def select(self, month=None, owner=None, service=None, env=None):
+        """
+        Sorted ids of the documents matching every given filter; None when
+        no filter is given. `month` is 'YYYY-MM' or a YYYYMM key.
+        """
+        key = month_key(month) if month is not None else None
+        lists = [] if month is None else [self._postings["month"].get(key, _NO_IDS)]
+        for field, value in (("owner", owner), ("service", service), ("env", env)):
+            if value is not None:
+                lists.append(self._postings[field].get(str(value).lower(), _NO_IDS))
+        if not lists:
+            return None
+        ids = lists[0]
+        for found in lists[1:]:
+            ids = np.intersect1d(ids, found, assume_unique=True)
+        return ids
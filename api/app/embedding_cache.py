@@ -0,0 +1,232 @@
+"""
+Content-addressed, on-disk cache of text embeddings.
+
+Vectors are keyed by (model name, 64-bit blake2b hash of the text). Each
+model gets a directory under FINOPS_EMBEDDING_CACHE_DIR holding
+
+- vectors.f32  row-major float32 matrix, appended to and read via np.memmap
+- keys.u64     the text hash of every row, in row order
+- meta.json    model name and embedding dimension
+
+Lookups go through a sorted copy of keys.u64 (np.searchsorted), so the index
+costs 16 bytes per cached text. Vectors are appended before their keys, so a
+crash mid-write only loses the unfinished rows. Lookups and appends hold an
+flock on the directory's .lock file and reload the key index whenever
+another process appended since, so the API and build_index.py can share a
+cache; the model itself runs outside the lock.
+
+get_encoder(model_name) returns a drop-in for SentenceTransformer.encode
+that embeds only texts it has not seen before and loads the model only on
+the first miss, so rebuilding an index from already-embedded texts does not
+run the model at all.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+import numpy as np
+
+CACHE_DIR = os.getenv(
+    "FINOPS_EMBEDDING_CACHE_DIR",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+        "data",
+        "embedding_cache",
+    ),
+)
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def text_keys(texts) -> np.ndarray:
+    """64-bit content hash of every text."""
+    return np.array(
+        [
+            int.from_bytes(hashlib.blake2b(t.encode(), digest_size=8).digest(), "big")
+            for t in texts
+        ],
+        dtype=np.uint64,
+    )
+
+
+class EmbeddingCache:
+    def __init__(self, model_name: str, cache_dir: str = None):
+        self.model_name = model_name
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        # created on the first append, so merely loading an encoder
+        # writes nothing
+        self.path = os.path.join(cache_dir or CACHE_DIR, slug)
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._keys_path = os.path.join(self.path, "keys.u64")
+        self._meta_path = os.path.join(self.path, "meta.json")
+        self._lock_path = os.path.join(self.path, ".lock")
+        self._lock = threading.Lock()
+        self.dim = None
+        with self._file_lock():
+            self._load_index()
+        self.hits = self.misses = 0
+
+    @contextlib.contextmanager
+    def _file_lock(self, create: bool = False):
+        """
+        Exclusive lock on the cache directory, across processes. Creates the
+        directory when `create`; without it, a missing directory holds
+        nothing to guard and no lock is taken.
+        """
+        if create:
+            os.makedirs(self.path, exist_ok=True)
+        elif not os.path.isdir(self.path):
+            yield
+            return
+        with open(self._lock_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _disk_rows(self) -> int:
+        """Complete rows on disk: keys written after their vectors."""
+        paths = (self._vectors_path, self._keys_path)
+        if not self.dim or not all(os.path.exists(p) for p in paths):
+            return 0
+        vectors = os.path.getsize(self._vectors_path) // (4 * self.dim)
+        return min(vectors, os.path.getsize(self._keys_path) // 8)
+
+    def _refresh(self):
+        """Reload the key index if another process appended since (under lock)."""
+        if self.dim is None or self._disk_rows() != self._rows:
+            self._load_index()
+
+    def _load_index(self):
+        if self.dim is None and os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        keys = np.empty(0, dtype=np.uint64)
+        if self.dim and os.path.exists(self._vectors_path):
+            rows = os.path.getsize(self._vectors_path) // (4 * self.dim)
+            if os.path.exists(self._keys_path):
+                keys = np.fromfile(self._keys_path, dtype=np.uint64)[:rows]
+        self._rows = len(keys)
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted = keys[self._order]
+        self._vectors = None
+
+    def __len__(self):
+        return self._rows
+
+    def _matrix(self) -> np.ndarray:
+        if self._vectors is None or len(self._vectors) != self._rows:
+            self._vectors = np.memmap(
+                self._vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(self._rows, self.dim),
+            )
+        return self._vectors
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Cache row of every key, -1 where the key is not cached."""
+        if not len(self._sorted):
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted, keys), len(self._sorted) - 1)
+        return np.where(self._sorted[pos] == keys, self._order[pos], -1)
+
+    def _append(self, keys: np.ndarray, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self._meta_path, "w") as f:
+                json.dump({"model": self.model_name, "dim": self.dim}, f)
+        # drop a torn tail left by an interrupted append
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(self._rows * 4 * self.dim)
+            f.write(vectors.tobytes())
+        with open(self._keys_path, "ab") as f:
+            f.truncate(self._rows * 8)
+            f.write(np.ascontiguousarray(keys, dtype=np.uint64).tobytes())
+        rows = np.arange(self._rows, self._rows + len(keys))
+        self._rows += len(keys)
+        merged_keys = np.concatenate([self._sorted, keys])
+        merged_rows = np.concatenate([self._order, rows])
+        order = np.argsort(merged_keys, kind="stable")
+        self._sorted, self._order = merged_keys[order], merged_rows[order]
+
+    def get_or_compute(self, texts, compute) -> np.ndarray:
+        """
+        Embeddings of `texts` (n x dim float32); `compute(list_of_texts)` is
+        called once, with the distinct texts that are not cached yet.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        keys = text_keys(texts)
+        with self._lock:
+            with self._file_lock():
+                self._refresh()
+                rows = self.lookup(keys)
+            missing = np.flatnonzero(rows < 0)
+            if len(missing):
+                new_keys, first = np.unique(keys[missing], return_index=True)
+                new_texts = [texts[i] for i in missing[first]]
+                vectors = np.asarray(compute(new_texts), dtype=np.float32)
+                with self._file_lock(create=True):
+                    # another process may have cached some of them meanwhile
+                    self._refresh()
+                    fresh = self.lookup(new_keys) < 0
+                    if fresh.any():
+                        self._append(new_keys[fresh], vectors[fresh])
+                    rows = self.lookup(keys)
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            return np.array(self._matrix()[rows])
+
+
+class CachedEncoder:
+    """SentenceTransformer-like encoder whose document embeddings are cached."""
+
+    def __init__(self, model_name: str, cache_dir: str = None, model=None):
+        self.model_name = model_name
+        self.cache = EmbeddingCache(model_name, cache_dir)
+        self._model = model
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def encode(self, texts, cache: bool = True, **kwargs) -> np.ndarray:
+        """
+        Like SentenceTransformer.encode for a list of texts. cache=False
+        skips the cache (one-off texts such as user questions).
+        """
+        if not cache:
+            return np.asarray(self.model.encode(texts, **kwargs), dtype=np.float32)
+        kwargs.setdefault("show_progress_bar", False)
+        return self.cache.get_or_compute(
+            texts, lambda missing: self.model.encode(missing, **kwargs)
+        )
+
+
+def get_encoder(model_name: str) -> CachedEncoder:
+    """Process-wide CachedEncoder for `model_name` in CACHE_DIR."""
+    with _encoders_lock:
+        key = (model_name, CACHE_DIR)
+        if key not in _encoders:
+            _encoders[key] = CachedEncoder(model_name)
+        return _encoders[key]
@@ -2,31 +2,83 @@
 ETL: loads billing.csv and resources.csv into SQLite (SQLAlchemy).
 Includes sample data generator and quality checks.
 
+Billing loads are idempotent: each (file, invoice_month) partition is
+content-hashed in ingest_manifest and only replaced when it changed.
+Rows failing a quality rule go to billing_quarantine instead (see quality.py).
+Every load refreshes the cost_rollup rows of the months it touched (see
+rollups.py). The database comes from db.py (FINOPS_DATABASE_URL).
+
 Usage:
   python etl.py --generate-sample
   python etl.py --load ./data/billing.csv
+  python etl.py --load ./data/billing.csv --chunk-size 50000 [--no-resume]
+  python etl.py --load-dir "./data/exports/*.csv" --workers 4
+  python etl.py --stage ./data/billing.csv [--store ./data/billing_parquet]
+  python etl.py --load-dir ./data/billing_parquet
   python etl.py --load-resources ./data/resources.csv
+  python etl.py --anomalies
+  python etl.py --forecast
 """
 
 import argparse
+import glob
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from queue import Empty
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import json
 import os
-from .models import Base, Billing, Resource
-
-DB_PATH = r"D:\finops_copilot\data\finops.db"  # absolute path
-DB_URL = f"sqlite:///{DB_PATH}"
-
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-Base = declarative_base()
-
-
-# Example tables
-from sqlalchemy import Column, Integer, String, Float, Date
+from . import quality
+from .db import SessionLocal, engine
+from .migrations import migrate
+from .quality import QualityGate, quarantine_frame
+from .anomalies import refresh_anomalies
+from .forecast import refresh_forecasts
+from .rollups import bump_generations, refresh_rollups
+from .models import (
+    Base,
+    Billing,
+    BillingQuarantine,
+    BillingStaging,
+    BILLING_NATURAL_KEY,
+    IngestCheckpoint,
+    IngestManifest,
+    Resource,
+)
+from .utils import Timer, format_month_key, logger, month_keys
+
+# Rows per executemany batch for bulk billing inserts
+BULK_BATCH_SIZE = 10_000
+# Rows read from the CSV (and committed) per streaming chunk
+CHUNK_SIZE = 100_000
+
+BILLING_STR_COLUMNS = [
+    "invoice_month",
+    "account_id",
+    "subscription",
+    "service",
+    "resource_group",
+    "resource_id",
+    "region",
+]
+BILLING_FLOAT_COLUMNS = ["usage_qty", "unit_cost", "cost"]
+
+RESOURCE_COLUMN_DEFAULTS = {
+    "resource_id": "",
+    "owner": "",
+    "env": "",
+    "tags_json": "{}",
+}
+# Resources per upsert batch; keeps the IN (...) lookup under SQLite's
+# bound-parameter limit
+UPSERT_BATCH_SIZE = 500
+# how often the billing writer checks for parse workers that died silently
+WRITER_POLL_SECONDS = 5.0
 
 
 # Init
@@ -35,16 +87,14 @@ from sqlalchemy import Column, Integer, String, Float, Date
 def init_db():
     os.makedirs("./data", exist_ok=True)
     Base.metadata.create_all(engine)
+    migrate(engine)
 
 
 # Billing loader
 
 
-def load_csv_to_db(csv_path: str):
-    df = pd.read_csv(csv_path)
-
-    # fill some defaults
-    df = df.fillna(
+def _fill_billing_defaults(df: pd.DataFrame) -> pd.DataFrame:
+    return df.fillna(
         {
             "usage_qty": 0.0,
             "unit_cost": 0.0,
@@ -54,116 +104,695 @@ def load_csv_to_db(csv_path: str):
         }
     )
 
-    # quality checks
-    checks = []
-    if df["resource_id"].isnull().any():
-        checks.append("null_resource_id")
-    if (df["cost"] < 0).any():
-        checks.append("negative_cost")
-    if df["resource_id"].duplicated().sum() > 0:
-        checks.append("duplicate_resource_ids")
 
+class PartitionHashes:
+    """
+    Order-independent content hash per invoice_month: the uint64 sum of the
+    row hashes, so it can be built chunk by chunk and saved in a checkpoint.
+    """
+
+    def __init__(self, state=None):
+        self.state = {m: list(v) for m, v in (state or {}).items()}
+
+    def update(self, frame: pd.DataFrame):
+        row_hashes = pd.util.hash_pandas_object(
+            frame[BILLING_STR_COLUMNS + BILLING_FLOAT_COLUMNS], index=False
+        ).to_numpy()
+        months = frame["invoice_month"].to_numpy()
+        for month in pd.unique(months):
+            mask = months == month
+            part = int(np.add.reduce(row_hashes[mask], dtype=np.uint64))
+            h, n = self.state.get(month, [0, 0])
+            self.state[month] = [(h + part) % 2**64, n + int(mask.sum())]
+
+    def digest(self, month: str) -> str:
+        h, n = self.state[month]
+        return f"{h:016x}-{n}"
+
+
+def _file_fingerprint(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_billing_chunks(
+    path: str, chunk_size: int, skip_rows: int = 0, columns=None, nrows=None
+):
+    """
+    Stream a billing CSV, or a part file of the Parquet store, in fixed-size
+    chunks, skipping already committed rows.
+    """
+    if path.endswith(".parquet"):
+        from . import parquet_store
+
+        return parquet_store.iter_file_chunks(
+            path, chunk_size, columns=columns, skip_rows=skip_rows, nrows=nrows
+        )
+    skip = (lambda i: 0 < i <= skip_rows) if skip_rows else None
+    return pd.read_csv(
+        path,
+        chunksize=chunk_size,
+        skiprows=skip,
+        usecols=columns,
+        nrows=nrows,
+        dtype={c: str for c in BILLING_STR_COLUMNS},
+    )
+
+
+def _plan_load(csv_path: str, resume: bool = True):
+    """
+    Work out what a billing load of `csv_path` has to do. Returns None when the
+    file is unchanged since its last load, otherwise a plain (picklable) dict
+    with the checkpoint to resume from, if any.
+    """
+    source = os.path.abspath(csv_path)
+    plan = {
+        "path": csv_path,
+        "source": source,
+        "fingerprint": _file_fingerprint(csv_path),
+        "file_hash": _file_hash(csv_path),
+        "rows_done": 0,
+        "flags": [],
+        "partitions": {},
+    }
+    session = SessionLocal()
+    try:
+        rows = session.query(IngestManifest).filter(IngestManifest.source == source)
+        rows = rows.all()
+        if rows and all(r.file_hash == plan["file_hash"] for r in rows):
+            return None
+        cp = session.get(IngestCheckpoint, source) if resume else None
+        if cp is not None and cp.fingerprint == plan["fingerprint"] and cp.rows_done:
+            plan["rows_done"] = cp.rows_done
+            plan["flags"] = json.loads(cp.checks_json or "[]")
+            plan["partitions"] = json.loads(cp.partitions_json or "{}")
+    finally:
+        session.close()
+    return plan
+
+
+def _stored_flags(source: str):
+    """Quality-check flags recorded for the last load of `source`."""
     session = SessionLocal()
-    for _, r in df.iterrows():
-        b = Billing(
-            invoice_month=str(r["invoice_month"]),
-            account_id=str(r.get("account_id", "")),
-            subscription=str(r.get("subscription", "")),
-            service=str(r.get("service", "")),
-            resource_group=str(r.get("resource_group", "")),
-            resource_id=str(r.get("resource_id", "")),
-            region=str(r.get("region", "")),
-            usage_qty=float(r.get("usage_qty", 0.0)),
-            unit_cost=float(r.get("unit_cost", 0.0)),
-            cost=float(r.get("cost", 0.0)),
+    try:
+        row = session.query(IngestManifest).filter(IngestManifest.source == source)
+        row = row.first()
+        return json.loads(row.checks_json or "[]") if row else []
+    finally:
+        session.close()
+
+
+def _validated_chunks(plan, chunk_size: int):
+    """
+    Parse, coerce, quality-check and hash the file chunk by chunk. This is
+    the CPU-bound half of a load and touches no database, so it can run in a
+    worker process. Yields (clean rows, quarantined rows, flags, partition
+    hash state).
+    """
+    path, rows_done = plan["path"], plan["rows_done"]
+    gate = QualityGate(plan["flags"])
+    hashes = PartitionHashes(plan["partitions"])
+    if rows_done:
+        # replay the rules over the rows committed before the crash to
+        # rebuild the duplicate-key set
+        for chunk in _read_billing_chunks(path, chunk_size, nrows=rows_done):
+            gate.evaluate(billing_frame(_fill_billing_defaults(chunk), keep_nulls=True))
+    offset = rows_done
+    for chunk in _read_billing_chunks(path, chunk_size, rows_done):
+        frame = billing_frame(_fill_billing_defaults(chunk), keep_nulls=True)
+        codes = gate.evaluate(frame)
+        # quarantined rows keep their nulls; only loaded rows get the
+        # billing table's "nan" strings
+        quarantined = quarantine_frame(frame, codes, offset)
+        clean = billing_frame(frame[codes == 0])
+        offset += len(frame)
+        hashes.update(clean)
+        yield clean, quarantined, gate.flags, hashes.state
+
+
+def _begin_load(plan):
+    if plan["rows_done"]:
+        logger.info(
+            "Resuming %s after %d committed rows", plan["source"], plan["rows_done"]
+        )
+        return
+    with engine.begin() as conn:
+        for table in (BillingStaging.__table__, BillingQuarantine.__table__):
+            conn.execute(table.delete().where(table.c.source_file == plan["source"]))
+
+
+def _write_chunk(
+    plan, clean: pd.DataFrame, quarantined: pd.DataFrame, flags, partitions
+):
+    """
+    Stage one validated chunk, its quarantined rows and the checkpoint in a
+    single transaction.
+    """
+    plan["rows_done"] += len(clean) + len(quarantined)
+    plan["flags"], plan["partitions"] = flags, partitions
+    with engine.begin() as conn:
+        _insert_billing(
+            conn, clean.assign(source_file=plan["source"]), BillingStaging.__table__
+        )
+        if len(quarantined):
+            conn.execute(
+                BillingQuarantine.__table__.insert(),
+                quarantined.assign(source_file=plan["source"]).to_dict("records"),
+            )
+        _save_checkpoint(conn, plan)
+
+
+def quality_report(source: str = None):
+    """Per-rule quarantine counts and cost impact, for one file or overall."""
+    with engine.connect() as conn:
+        return quality.report(conn, os.path.abspath(source) if source else None)
+
+
+def load_csv_to_db(csv_path: str, chunk_size: int = CHUNK_SIZE, resume: bool = True):
+    """
+    Idempotent, resumable billing load.
+
+    The CSV is streamed in chunks of `chunk_size` rows into billing_staging;
+    each chunk is committed together with a checkpoint, so a crashed load of
+    the same file picks up after the last committed chunk when `resume` is
+    set. Afterwards every (file, invoice_month) partition whose content hash
+    differs from the manifest is swapped into billing in its own transaction;
+    unchanged partitions are left alone and an unchanged file is not parsed.
+    Returns the list of quality-check flags for the whole file.
+    """
+    plan = _plan_load(csv_path, resume)
+    if plan is None:
+        source = os.path.abspath(csv_path)
+        logger.info("Skipping %s: unchanged since last load", source)
+        return _stored_flags(source)
+
+    _begin_load(plan)
+    loaded = 0
+    with Timer() as t:
+        for clean, quarantined, flags, partitions in _validated_chunks(
+            plan, chunk_size
+        ):
+            _write_chunk(plan, clean, quarantined, flags, partitions)
+            loaded += len(clean) + len(quarantined)
+        replaced = _swap_partitions(plan)
+
+    logger.info(
+        "Staged %d billing rows in %.2fs (%.0f rows/sec); %d/%d partitions replaced",
+        loaded,
+        t.interval,
+        loaded / t.interval if t.interval > 0 else float(loaded),
+        len(replaced),
+        len(plan["partitions"]),
+    )
+    if plan["flags"]:
+        logger.info("Quarantined billing rows: %s", quality_report(csv_path))
+    return plan["flags"]
+
+
+def _save_checkpoint(conn, plan):
+    table = IngestCheckpoint.__table__
+    values = {
+        "fingerprint": plan["fingerprint"],
+        "rows_done": plan["rows_done"],
+        "checks_json": json.dumps(plan["flags"]),
+        "partitions_json": json.dumps(plan["partitions"]),
+    }
+    updated = conn.execute(
+        table.update().where(table.c.source == plan["source"]).values(**values)
+    )
+    if updated.rowcount == 0:
+        conn.execute(table.insert().values(source=plan["source"], **values))
+
+
+def _swap_partitions(plan):
+    """
+    Atomically replace each changed (source, invoice_month) partition of
+    billing with its staged rows, refresh that month's rollups and record it
+    in the manifest. Months the file no longer contains are removed. Returns
+    the replaced months.
+    """
+    billing = Billing.__table__
+    staging = BillingStaging.__table__
+    manifest = IngestManifest.__table__
+    source = plan["source"]
+    hashes = PartitionHashes(plan["partitions"])
+    now = datetime.now(timezone.utc)
+
+    with engine.connect() as conn:
+        previous = dict(
+            conn.execute(
+                select(manifest.c.invoice_month, manifest.c.content_hash).where(
+                    manifest.c.source == source
+                )
+            ).all()
         )
-        session.add(b)
-    session.commit()
-    session.close()
-    return checks
+
+    replaced = []
+    for month in sorted(set(previous) | set(hashes.state)):
+        in_file = month in hashes.state
+        digest = hashes.digest(month) if in_file else None
+        partition = (manifest.c.source == source) & (manifest.c.invoice_month == month)
+        with engine.begin() as conn:
+            if digest != previous.get(month):
+                conn.execute(
+                    billing.delete().where(
+                        (billing.c.source_file == source)
+                        & (billing.c.invoice_month == month)
+                    )
+                )
+                conn.execute(manifest.delete().where(partition))
+                if in_file:
+                    conn.execute(_billing_upsert_from_staging(source, month))
+                refresh_rollups(conn, [month])
+                replaced.append(month)
+            if in_file:
+                values = {
+                    "content_hash": digest,
+                    "row_count": hashes.state[month][1],
+                    "file_hash": plan["file_hash"],
+                    "checks_json": json.dumps(plan["flags"]),
+                }
+                if month in previous and digest == previous[month]:
+                    conn.execute(manifest.update().where(partition).values(**values))
+                else:
+                    conn.execute(
+                        manifest.insert().values(
+                            source=source, invoice_month=month, loaded_at=now, **values
+                        )
+                    )
+
+    with engine.begin() as conn:
+        conn.execute(staging.delete().where(staging.c.source_file == source))
+        conn.execute(
+            IngestCheckpoint.__table__.delete().where(IngestCheckpoint.source == source)
+        )
+    return replaced
+
+
+# Parquet staging
+
+
+def stage_csv_to_parquet(csv_path: str, store_dir: str = None, chunk_size=CHUNK_SIZE):
+    """
+    Convert a billing CSV once into the month-partitioned Parquet store,
+    replacing any parts from an earlier conversion of the same file.
+    The parts can then be loaded with load_csv_to_db / load_billing_files.
+    Expects the database set up by init_db(), whose data generations it bumps.
+    """
+    from . import parquet_store
+
+    store_dir = store_dir or parquet_store.STORE_DIR
+    parquet_store.clear_source(csv_path, store_dir)
+    rows, files, keys = 0, [], set()
+    for i, chunk in enumerate(_read_billing_chunks(csv_path, chunk_size)):
+        frame = billing_frame(_fill_billing_defaults(chunk), keep_nulls=True)
+        files += parquet_store.write_partitions(frame, csv_path, i, store_dir)
+        keys.update(k for k in frame["month_key"] if k is not None)
+        rows += len(frame)
+    # KPIs served from the store (analytics.py) are cached per month too
+    with engine.begin() as conn:
+        bump_generations(conn, sorted(keys))
+    return {"rows": rows, "files": files}
+
+
+# Multi-file loader
+
+
+def billing_files(pattern: str):
+    """
+    Billing files matching a glob pattern, or in a directory: its CSVs plus
+    any Parquet store parts below it.
+    """
+    if not os.path.isdir(pattern):
+        return sorted(glob.glob(pattern, recursive=True))
+    return sorted(
+        glob.glob(os.path.join(pattern, "*.csv"))
+        + glob.glob(os.path.join(pattern, "**", "*.parquet"), recursive=True)
+    )
+
+
+def _parse_worker(plan, chunk_size: int, queue):
+    """Worker process: push the validated chunks of one file to the writer."""
+    try:
+        for payload in _validated_chunks(plan, chunk_size):
+            queue.put(("chunk", plan["source"], payload))
+        queue.put(("done", plan["source"], None))
+    except Exception as e:
+        queue.put(("error", plan["source"], f"{type(e).__name__}: {e}"))
+
+
+def load_billing_files(
+    pattern: str,
+    workers: int = None,
+    chunk_size: int = CHUNK_SIZE,
+    resume: bool = True,
+):
+    """
+    Load every billing CSV in a directory or matching a glob. Files are parsed
+    and validated in a pool of `workers` processes; validated chunks funnel
+    through a bounded queue to this process, the single SQLite writer.
+    Returns per-file status and an aggregate throughput summary.
+    """
+    paths = billing_files(pattern)
+    workers = max(1, workers or os.cpu_count() or 1)
+    status = {}
+    plans = {}
+    for path in paths:
+        source = os.path.abspath(path)
+        status[source] = {"path": path, "status": "skipped", "rows": 0, "checks": []}
+        plan = _plan_load(path, resume)
+        if plan is None:
+            status[source]["checks"] = _stored_flags(source)
+        else:
+            plans[source] = plan
+
+    with Timer() as t:
+        if plans:
+            with multiprocessing.Manager() as manager, ProcessPoolExecutor(
+                max_workers=workers
+            ) as pool:
+                # bounded, so parsing can't run ahead of the writer
+                queue = manager.Queue(maxsize=workers * 2)
+                futures = {}
+                for plan in plans.values():
+                    _begin_load(plan)
+                    status[plan["source"]]["status"] = "running"
+                    futures[plan["source"]] = pool.submit(
+                        _parse_worker, plan, chunk_size, queue
+                    )
+                _drain_writer(queue, plans, status, futures)
+
+    rows = sum(s["rows"] for s in status.values())
+    summary = {
+        "files": len(paths),
+        "loaded": sum(s["status"] == "loaded" for s in status.values()),
+        "skipped": sum(s["status"] == "skipped" for s in status.values()),
+        "failed": sum(s["status"] == "failed" for s in status.values()),
+        "rows": rows,
+        "seconds": t.interval,
+        "rows_per_sec": rows / t.interval if t.interval > 0 else float(rows),
+    }
+    return {"summary": summary, "files": list(status.values())}
+
+
+def _drain_writer(queue, plans, status, futures=None):
+    """
+    Single writer: stage chunks as they arrive and swap in finished files.
+    While the queue is idle, the workers' `futures` (source -> Future) are
+    checked: a worker that died without reporting (killed, broken pool) fails
+    its file instead of leaving the load waiting forever.
+    """
+    pending = set(plans)
+    while pending:
+        try:
+            kind, source, payload = queue.get(timeout=WRITER_POLL_SECONDS)
+        except Empty:
+            # workers catch their own errors and report before returning, so
+            # only a future that raised can still owe us a message
+            for source in sorted(pending):
+                future = (futures or {}).get(source)
+                if future is not None and future.done() and future.exception():
+                    error = future.exception()
+                    logger.error("Billing parse worker died for %s: %r", source, error)
+                    pending.discard(source)
+                    status[source]["status"] = "failed"
+                    status[source]["error"] = f"{type(error).__name__}: {error}"
+            continue
+        st, plan = status[source], plans[source]
+        if kind != "chunk":
+            pending.discard(source)
+        if st["status"] == "failed":
+            continue
+        try:
+            if kind == "chunk":
+                clean, quarantined = payload[:2]
+                _write_chunk(plan, *payload)
+                st["rows"] += len(clean) + len(quarantined)
+            elif kind == "error":
+                raise RuntimeError(payload)
+            else:
+                st["partitions_replaced"] = _swap_partitions(plan)
+                st["status"], st["checks"] = "loaded", plan["flags"]
+                st["quality"] = quality_report(source)
+        except Exception as e:
+            logger.exception("Billing load failed for %s", source)
+            st["status"], st["error"] = "failed", str(e)
+
+
+def _as_str(series: pd.Series) -> pd.Series:
+    """Vectorized str(): missing values become "nan" just like str(float("nan"))."""
+    return series.astype(object).where(series.notna(), "nan").astype(str)
+
+
+def billing_frame(df: pd.DataFrame, keep_nulls: bool = False) -> pd.DataFrame:
+    """
+    Coerce a raw billing frame column-wise into the billing table's types.
+    Missing optional columns default to "" / 0.0 like the old per-row loader.
+    With `keep_nulls`, missing strings stay null instead of becoming "nan"
+    (used for the Parquet store, so the null checks still see them).
+    Recognizable invoice months are normalized to YYYY-MM.
+    """
+    out = pd.DataFrame(index=df.index)
+    for col in BILLING_STR_COLUMNS:
+        if col in df.columns:
+            out[col] = df[col].astype(object) if keep_nulls else _as_str(df[col])
+        elif col == "invoice_month":
+            raise KeyError("invoice_month")
+        else:
+            out[col] = ""
+    for col in BILLING_FLOAT_COLUMNS:
+        out[col] = df[col].astype(float) if col in df.columns else 0.0
+    out["month_key"] = month_keys(out["invoice_month"])
+    # one spelling per month ("2025-04-01" -> "2025-04"), so re-exports of a
+    # line can't slip past the natural key and be counted twice
+    parsed = out["month_key"].notna()
+    out.loc[parsed, "invoice_month"] = [
+        format_month_key(k) for k in out.loc[parsed, "month_key"]
+    ]
+    return out.reset_index(drop=True)
+
+
+def _billing_upsert_stmt():
+    """
+    INSERT into billing that overwrites an existing row with the same natural
+    key, so a line re-exported in another file is never counted twice.
+    """
+    table = Billing.__table__
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c[c] for c in BILLING_NATURAL_KEY],
+        set_={c: stmt.excluded[c] for c in BILLING_FLOAT_COLUMNS + ["source_file"]},
+    )
+
+
+def _billing_upsert_from_staging(source: str, month: str):
+    staging = BillingStaging.__table__
+    cols = BILLING_STR_COLUMNS + BILLING_FLOAT_COLUMNS + ["month_key", "source_file"]
+    rows = (
+        select(*[staging.c[c] for c in cols])
+        .where((staging.c.source_file == source) & (staging.c.invoice_month == month))
+        .order_by(staging.c.id)
+    )
+    table = Billing.__table__
+    stmt = sqlite_insert(table).from_select(cols, rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c[c] for c in BILLING_NATURAL_KEY],
+        set_={c: stmt.excluded[c] for c in BILLING_FLOAT_COLUMNS + ["source_file"]},
+    )
+
+
+def _insert_billing(
+    conn, frame: pd.DataFrame, table=None, batch_size: int = BULK_BATCH_SIZE
+):
+    stmt = _billing_upsert_stmt() if table is None else table.insert()
+    for start in range(0, len(frame), batch_size):
+        batch = frame.iloc[start : start + batch_size]
+        conn.execute(stmt, batch.to_dict("records"))
+
+
+def bulk_insert_billing(df: pd.DataFrame, batch_size: int = BULK_BATCH_SIZE):
+    """
+    Insert a billing frame with executemany batches of plain dicts, skipping
+    the ORM unit of work. Returns rows, seconds and rows_per_sec.
+    """
+    frame = billing_frame(df)
+    with Timer() as t:
+        with engine.begin() as conn:
+            _insert_billing(conn, frame, batch_size=batch_size)
+            refresh_rollups(conn, frame["invoice_month"].dropna().unique())
+    rows = len(frame)
+    return {
+        "rows": rows,
+        "seconds": t.interval,
+        "rows_per_sec": rows / t.interval if t.interval > 0 else float(rows),
+    }
 
 
 # Resources loader
 
 
-def load_resources_to_db(csv_path: str):
-    df = pd.read_csv(csv_path)
+def resource_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Coerce a raw resources frame like the old per-row loader did, keeping the
+    last row when a resource_id repeats.
+    """
+    out = pd.DataFrame(index=df.index)
+    for col, default in RESOURCE_COLUMN_DEFAULTS.items():
+        out[col] = _as_str(df[col]) if col in df.columns else default
+    return out.drop_duplicates("resource_id", keep="last").reset_index(drop=True)
+
+
+def _resource_upsert_stmt():
+    """
+    INSERT ... ON CONFLICT(resource_id) DO UPDATE that only fires when a value
+    actually differs, so unchanged resources are never rewritten.
+    """
+    table = Resource.__table__
+    cols = [c for c in RESOURCE_COLUMN_DEFAULTS if c != "resource_id"]
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.resource_id],
+        set_={c: stmt.excluded[c] for c in cols},
+        where=or_(*[table.c[c].is_distinct_from(stmt.excluded[c]) for c in cols]),
+    )
 
-    session = SessionLocal()
-    for _, r in df.iterrows():
-        res = Resource(
-            resource_id=str(r.get("resource_id", "")),
-            owner=str(r.get("owner", "")),
-            env=str(r.get("env", "")),
-            tags_json=str(r.get("tags_json", "{}")),
-        )
-        session.merge(res)  # upsert
-    session.commit()
-    session.close()
 
-    return f"Inserted/updated {len(df)} resources"
+def upsert_resources(
+    conn,
+    frame: pd.DataFrame,
+    batch_size: int = UPSERT_BATCH_SIZE,
+    written: list = None,
+):
+    """
+    Set-based upsert of a coerced resources frame.
+    Returns a dict of inserted / updated / unchanged counts; the ids of the
+    inserted or updated resources are appended to `written` when given.
+    """
+    table = Resource.__table__
+    stmt = _resource_upsert_stmt().returning(table.c.resource_id)
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    for start in range(0, len(frame), batch_size):
+        batch = frame.iloc[start : start + batch_size]
+        existing = conn.execute(
+            select(func.count())
+            .select_from(table)
+            .where(table.c.resource_id.in_(batch["resource_id"].tolist()))
+        ).scalar()
+        # RETURNING covers inserted rows plus rows whose values changed
+        ids = conn.execute(stmt, batch.to_dict("records")).scalars().all()
+        if written is not None:
+            written.extend(ids)
+        inserted = len(batch) - existing
+        counts["inserted"] += inserted
+        counts["updated"] += len(ids) - inserted
+        counts["unchanged"] += existing - (len(ids) - inserted)
+    return counts
+
+
+def billing_months_of(conn, resource_ids, batch_size: int = UPSERT_BATCH_SIZE):
+    """Month keys with billing lines of any of `resource_ids`."""
+    billing = Billing.__table__
+    months = set()
+    for start in range(0, len(resource_ids), batch_size):
+        months.update(
+            conn.execute(
+                select(billing.c.month_key)
+                .where(
+                    billing.c.resource_id.in_(resource_ids[start : start + batch_size])
+                )
+                .distinct()
+            ).scalars()
+        )
+    months.discard(None)
+    return sorted(months)
+
+
+def load_resources_to_db(csv_path: str, chunk_size: int = CHUNK_SIZE):
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    for df in pd.read_csv(csv_path, chunksize=chunk_size):
+        written = []
+        # upserts are idempotent, so a re-run after a crash is safe
+        with engine.begin() as conn:
+            for k, v in upsert_resources(
+                conn, resource_frame(df), written=written
+            ).items():
+                counts[k] += v
+            # owners feed the rollups of the months these resources were billed in
+            if written:
+                refresh_rollups(conn, billing_months_of(conn, written))
+
+    return (
+        f"Inserted/updated {counts['inserted'] + counts['updated']} resources "
+        f"(inserted={counts['inserted']}, updated={counts['updated']}, "
+        f"unchanged={counts['unchanged']})"
+    )
 
 
 # Sample generator (billing only)
 
 
 def generate_sample(
-    path: str = "./data/sample_billing.csv", months: int = 6, rows_per_month: int = 200
+    path: str = "./data/sample_billing.csv",
+    months: int = 6,
+    rows_per_month: int = 200,
+    seed: int = None,
 ):
-    import random, csv
-
-    services = ["Compute", "Storage", "DB", "Networking", "AI", "Analytics"]
-    regions = ["eastus", "westus", "centralindia"]
-    owners = ["alice", "bob", "carol", None]
+    """
+    Small billing sample with an owner tag column, built with vectorized
+    NumPy draws. For production-scale datasets use synth.generate_dataset.
+    """
+    rng = np.random.default_rng(seed)
+    services = np.array(["Compute", "Storage", "DB", "Networking", "AI", "Analytics"])
+    regions = np.array(["eastus", "westus", "centralindia"])
+    rgs = np.array(["rg-prod", "rg-dev", "rg-test", "rg-unknown"])
+    owner_tags = np.array(
+        ['{"owner": "alice"}', '{"owner": "bob"}', '{"owner": "carol"}', "{}"]
+    )
 
-    rows = []
     base = pd.Timestamp.today()
-    for m in range(months):
-        month_dt = base - pd.DateOffset(months=(months - 1 - m))
-        month_str = month_dt.strftime("%Y-%m")
-        for i in range(rows_per_month):
-            service = random.choice(services)
-            rg = random.choice(["rg-prod", "rg-dev", "rg-test", "rg-unknown"])
-            resource_id = f"res-{service[:3].lower()}-{m}-{i}"
-            usage = round(random.random() * 100, 3)
-            unit_cost = round(random.random() * 2.5, 3)
-            cost = round(usage * unit_cost, 3)
-            owner = random.choice(owners)
-            tags = {"owner": owner} if owner else {}
-            rows.append(
-                [
-                    month_str,
-                    "acct-1",
-                    "sub-1",
-                    service,
-                    rg,
-                    resource_id,
-                    random.choice(regions),
-                    usage,
-                    unit_cost,
-                    cost,
-                    json.dumps(tags),
-                ]
-            )
+    month_strs = np.array(
+        [
+            (base - pd.DateOffset(months=(months - 1 - m))).strftime("%Y-%m")
+            for m in range(months)
+        ]
+    )
+    n = months * rows_per_month
+    m_idx = np.repeat(np.arange(months), rows_per_month)
+    i_idx = np.tile(np.arange(rows_per_month), months)
+    service = pd.Series(services[rng.integers(0, len(services), n)])
+    usage = np.round(rng.random(n) * 100, 3)
+    unit_cost = np.round(rng.random(n) * 2.5, 3)
+
+    df = pd.DataFrame(
+        {
+            "invoice_month": month_strs[m_idx],
+            "account_id": "acct-1",
+            "subscription": "sub-1",
+            "service": service,
+            "resource_group": rgs[rng.integers(0, len(rgs), n)],
+            "resource_id": "res-"
+            + service.str[:3].str.lower()
+            + "-"
+            + pd.Series(m_idx).astype(str)
+            + "-"
+            + pd.Series(i_idx).astype(str),
+            "region": regions[rng.integers(0, len(regions), n)],
+            "usage_qty": usage,
+            "unit_cost": unit_cost,
+            "cost": np.round(usage * unit_cost, 3),
+            "tags_json": owner_tags[rng.integers(0, len(owner_tags), n)],
+        }
+    )
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "w", newline="") as fh:
-        w = csv.writer(fh)
-        w.writerow(
-            [
-                "invoice_month",
-                "account_id",
-                "subscription",
-                "service",
-                "resource_group",
-                "resource_id",
-                "region",
-                "usage_qty",
-                "unit_cost",
-                "cost",
-                "tags_json",
-            ]
-        )
-        w.writerows(rows)
+    df.to_csv(path, index=False)
     print("sample generated:", path)
 
 
@@ -178,6 +807,36 @@ if __name__ == "__main__":
     parser.add_argument(
         "--load-resources", type=str, default=None, help="Load resources CSV"
     )
+    parser.add_argument(
+        "--load-dir",
+        type=str,
+        default=None,
+        help="Load every billing CSV in a directory or matching a glob",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Parser processes for --load-dir"
+    )
+    parser.add_argument(
+        "--stage",
+        type=str,
+        default=None,
+        help="Convert a billing CSV into the month-partitioned Parquet store",
+    )
+    parser.add_argument("--store", type=str, default=None, help="Parquet store dir")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument(
+        "--anomalies",
+        action="store_true",
+        help="Recompute the anomalies table (done after every load anyway)",
+    )
+    parser.add_argument(
+        "--forecast",
+        action="store_true",
+        help="Recompute the forecasts table (done after every load anyway)",
+    )
+    parser.add_argument(
+        "--no-resume", action="store_true", help="Ignore an existing checkpoint"
+    )
     args = parser.parse_args()
 
     init_db()
@@ -185,10 +844,37 @@ if __name__ == "__main__":
     if args.generate_sample:
         generate_sample(args.path)
 
+    if args.stage:
+        staged = stage_csv_to_parquet(args.stage, args.store, args.chunk_size)
+        print(f"Staged {staged['rows']} rows into {len(staged['files'])} Parquet parts")
+
     if args.load:
-        checks = load_csv_to_db(args.load)
+        checks = load_csv_to_db(
+            args.load, chunk_size=args.chunk_size, resume=not args.no_resume
+        )
         print("Billing quality checks:", checks)
+        print("Quarantined rows by rule:", quality_report(args.load))
+
+    if args.load_dir:
+        result = load_billing_files(
+            args.load_dir,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            resume=not args.no_resume,
+        )
+        for f in result["files"]:
+            print(
+                f"{f['status']:>8} {f['rows']:>10} rows  {f['path']}",
+                f.get("error", ""),
+            )
+        print("Billing load summary:", result["summary"])
 
     if args.load_resources:
-        msg = load_resources_to_db(args.load_resources)
+        msg = load_resources_to_db(args.load_resources, chunk_size=args.chunk_size)
         print("Resources load:", msg)
+
+    if args.anomalies or args.load or args.load_dir or args.load_resources:
+        print("Anomalies found:", refresh_anomalies())
+
+    if args.forecast or args.load or args.load_dir or args.load_resources:
+        print("Forecast rows written:", refresh_forecasts())
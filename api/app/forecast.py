@@ -0,0 +1,237 @@
+"""
+Next-quarter cost forecasts for every owner, service and resource group.
+
+Monthly totals come from cost_rollup and are pivoted into one dense
+(series x month) matrix per dimension over the last FIT_MONTHS months. Every
+series is fitted with the same design matrix (intercept + linear trend, plus
+one yearly sine/cosine pair for series with SEASONAL_MONTHS of history),
+weighted to the months since the series first had cost. The per-series
+normal equations are built with two matrix products and solved with one
+batched np.linalg.solve call per model, so there is no Python loop over
+series.
+
+Prediction intervals are the usual OLS ones, yhat +- z * s * sqrt(1 + x0'
+(X'X)^-1 x0), with z for INTERVAL (default 0.9) and costs clipped at 0;
+series with no more months than model terms have no residuals to estimate s
+from, so their lower / upper are NaN (NULL in the table) rather than exact.
+refresh_forecasts() rewrites the forecasts table after each ETL run; the
+/forecast endpoint reads it.
+"""
+
+import os
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from .cache import cached
+from .cube import _Encoder
+from .db import STREAM_BATCH_SIZE, engine, iter_batches, read_engine
+from .models import CostRollup, Forecast
+from .rollups import FORECASTS_TABLE, bump_table_generation
+from .utils import add_months, format_month_key, month_key, month_window
+
+HORIZON = int(os.getenv("FINOPS_FORECAST_HORIZON", "3"))
+FIT_MONTHS = int(os.getenv("FINOPS_FORECAST_FIT_MONTHS", "24"))
+SEASONAL_MONTHS = int(os.getenv("FINOPS_FORECAST_SEASONAL_MONTHS", "24"))
+INTERVAL = float(os.getenv("FINOPS_FORECAST_INTERVAL", "0.9"))
+# ridge on the non-intercept terms so series shorter than the model still solve
+RIDGE = 1e-6
+INSERT_BATCH_SIZE = 5000
+
+FORECAST_SQL = """
+    SELECT month_key, owner, service, resource_group, has_resource, cost
+    FROM cost_rollup
+    WHERE month_key BETWEEN :since AND :until
+"""
+
+# entity_type -> column of FORECAST_SQL
+ENTITY_TYPES = {
+    "owner": "owner",
+    "service": "service",
+    "resource_group": "resource_group",
+}
+
+COLUMNS = [c.name for c in Forecast.__table__.columns if c.name != "id"]
+
+
+def design_matrix(n_months: int, horizon: int, seasonal: bool) -> np.ndarray:
+    """(n_months + horizon) x p regressors; the last `horizon` rows are future."""
+    t = np.arange(n_months + horizon, dtype=np.float64)
+    # trend in months relative to the last observed month
+    columns = [np.ones_like(t), t - (n_months - 1)]
+    if seasonal:
+        columns += [np.sin(2 * np.pi * t / 12), np.cos(2 * np.pi * t / 12)]
+    return np.column_stack(columns)
+
+
+def _fit(cost: np.ndarray, started: np.ndarray, horizon: int, seasonal: bool):
+    """Weighted least squares of every row of `cost` on one shared design."""
+    n_series, n_months = cost.shape
+    x = design_matrix(n_months, horizon, seasonal)
+    x_hist, x_future = x[:n_months], x[n_months:]
+    p = x.shape[1]
+    weights = started.astype(np.float64)
+    n_obs = started.sum(axis=1)
+
+    # per-series normal equations X'WX (series x p x p) and X'Wy (series x p)
+    outer = (x_hist[:, :, None] * x_hist[:, None, :]).reshape(n_months, p * p)
+    xtx = (weights @ outer).reshape(n_series, p, p)
+    xtx += np.diag([0.0] + [RIDGE] * (p - 1))
+    xty = (weights * cost) @ x_hist
+    beta = np.linalg.solve(xtx, xty[:, :, None])[:, :, 0]
+
+    residuals = (cost - beta @ x_hist.T) * weights
+    # no residual degrees of freedom (n_obs <= p): the spread is unknown
+    dof = n_obs - p
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma = np.where(
+            dof > 0, np.sqrt((residuals**2).sum(axis=1) / np.maximum(dof, 1)), np.nan
+        )
+    # x0' (X'WX)^-1 x0 for every future month
+    inv_x0 = np.linalg.solve(xtx, np.broadcast_to(x_future.T, (n_series, p, horizon)))
+    leverage = np.einsum("hp,sph->sh", x_future, inv_x0)
+    return beta @ x_future.T, sigma[:, None] * np.sqrt(1 + np.maximum(leverage, 0))
+
+
+def fit_forecasts(cost: np.ndarray, horizon: int = HORIZON):
+    """
+    Fit every row of a (series x month) cost matrix and forecast `horizon`
+    months ahead. Months before a series' first non-zero cost are ignored;
+    series with SEASONAL_MONTHS of history get the seasonal terms. Returns
+    (series x horizon) forecast / lower / upper arrays plus per-series
+    n_obs and model; lower / upper are NaN for series with n_obs <= the
+    number of model terms.
+    """
+    started = np.cumsum(cost > 0, axis=1) > 0
+    n_obs = started.sum(axis=1)
+    seasonal = n_obs >= SEASONAL_MONTHS
+    yhat = np.zeros((len(cost), horizon))
+    spread = np.zeros((len(cost), horizon))
+    for use_seasonal in (False, True):
+        rows = np.flatnonzero(seasonal == use_seasonal)
+        if len(rows):
+            yhat[rows], spread[rows] = _fit(
+                cost[rows], started[rows], horizon, use_seasonal
+            )
+
+    half_width = NormalDist().inv_cdf(0.5 + INTERVAL / 2) * spread
+    return {
+        "forecast": np.maximum(yhat, 0),
+        "lower": np.maximum(yhat - half_width, 0),
+        "upper": np.maximum(yhat + half_width, 0),
+        "n_obs": n_obs,
+        "model": np.where(seasonal, "seasonal", "linear"),
+    }
+
+
+def forecast_all(
+    horizon: int = HORIZON,
+    fit_months: int = FIT_MONTHS,
+    batch_size: int = STREAM_BATCH_SIZE,
+    until=None,
+) -> pd.DataFrame:
+    """
+    Forecast rows for every owner, service and resource group series, fitted
+    on the fit_months months up to `until` (default the latest loaded month).
+    """
+    if until is not None:
+        last = month_key(until)
+    else:
+        with read_engine.connect() as conn:
+            last = conn.execute(select(func.max(CostRollup.month_key))).scalar()
+    if last is None:
+        return pd.DataFrame(columns=COLUMNS)
+    history = month_window(last, fit_months)
+    future = month_window(add_months(last, horizon), horizon)
+    position = {k: i for i, k in enumerate(history)}
+
+    encoders = {t: _Encoder() for t in ENTITY_TYPES}
+    parts = {t: [] for t in ENTITY_TYPES}
+    months, cost, has_resource = [], [], []
+    for batch in iter_batches(
+        FORECAST_SQL, {"since": history[0], "until": last}, batch_size
+    ):
+        for entity_type, column in ENTITY_TYPES.items():
+            parts[entity_type].append(encoders[entity_type].encode(batch[column]))
+        months.append(np.array([position[k] for k in batch["month_key"]]))
+        cost.append(np.nan_to_num(np.array(batch["cost"], dtype=np.float64)))
+        has_resource.append(np.array(batch["has_resource"], dtype=bool))
+    if not months:
+        return pd.DataFrame(columns=COLUMNS)
+    months, cost = np.concatenate(months), np.concatenate(cost)
+    has_resource = np.concatenate(has_resource)
+
+    frames = []
+    for entity_type, encoder in encoders.items():
+        codes = np.concatenate(parts[entity_type]).astype(np.int64)
+        # owners keep the inner-join semantics of the owner KPIs
+        weights = cost * has_resource if entity_type == "owner" else cost
+        n_series = len(encoder.values)
+        matrix = np.bincount(
+            codes * fit_months + months,
+            weights=weights,
+            minlength=n_series * fit_months,
+        ).reshape(n_series, fit_months)
+        named = np.array([v is not None for v in encoder.values])
+        keep = np.flatnonzero(named & (matrix != 0).any(axis=1))
+        if not len(keep):
+            continue
+        fitted = fit_forecasts(matrix[keep], horizon)
+        entities = np.array(encoder.values, dtype=object)[keep]
+        frames.append(
+            pd.DataFrame(
+                {
+                    "entity_type": entity_type,
+                    "entity": np.repeat(entities, horizon),
+                    "month_key": np.tile(future, len(keep)),
+                    "forecast": fitted["forecast"].ravel(),
+                    "lower": fitted["lower"].ravel(),
+                    "upper": fitted["upper"].ravel(),
+                    "n_obs": np.repeat(fitted["n_obs"], horizon),
+                    "model": np.repeat(fitted["model"], horizon),
+                }
+            )
+        )
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def refresh_forecasts(
+    horizon: int = HORIZON, fit_months: int = FIT_MONTHS, until=None
+) -> int:
+    """Recompute the forecasts table in one transaction; returns the row count."""
+    rows = forecast_all(horizon, fit_months, until=until)
+    rows = rows.astype(object).where(rows.notna(), None)
+    table = Forecast.__table__
+    with engine.begin() as conn:
+        conn.execute(table.delete())
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            chunk = rows.iloc[start : start + INSERT_BATCH_SIZE]
+            conn.execute(table.insert(), chunk.to_dict("records"))
+        bump_table_generation(conn, FORECASTS_TABLE)
+    return len(rows)
+
+
+@cached(table=FORECASTS_TABLE)
+def get_forecasts(entity_type=None, entity=None, limit=100, offset=0):
+    """Stored forecasts by series then month, with YYYY-MM months."""
+    table = Forecast.__table__
+    q = select(table)
+    if entity_type:
+        q = q.where(table.c.entity_type == entity_type)
+    if entity:
+        q = q.where(table.c.entity == entity)
+    q = q.order_by(table.c.entity_type, table.c.entity, table.c.month_key)
+    q = q.limit(limit).offset(offset)
+    with read_engine.connect() as conn:
+        rows = conn.execute(q).mappings().all()
+    return [
+        {
+            **{k: v for k, v in row.items() if k not in ("id", "month_key")},
+            "month": format_month_key(row["month_key"]),
+        }
+        for row in rows
+    ]
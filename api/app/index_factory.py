@@ -0,0 +1,188 @@
+"""
+FAISS index factory for the vector stores.
+
+FINOPS_VECTOR_INDEX picks the index type:
+
+- "flat"      exact IndexFlatL2 (default)
+- "ivf_flat"  inverted lists over full vectors
+- "ivf_pq"    inverted lists over product-quantized vectors (smallest)
+- "hnsw"      HNSW graph (fastest queries, no vector removal)
+
+IVF indexes are trained on a random sample of at most TRAIN_SAMPLE vectors
+(make_index + train). nlist defaults to 4 * sqrt(n) and shrinks when there
+are too few vectors to train it; types that can't be trained on the data at
+hand fall back to the next simpler one (ivf_pq -> ivf_flat -> flat).
+Search-time recall/speed knobs (FINOPS_IVF_NPROBE, FINOPS_HNSW_EF_SEARCH)
+are applied by set_search_params whenever an index is built or loaded;
+search_params restricts one search to a set of ids.
+"""
+
+import math
+import os
+
+import faiss
+import numpy as np
+
+from .utils import logger
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+INDEX_TYPE = os.getenv("FINOPS_VECTOR_INDEX", "flat").lower()
+NLIST = int(os.getenv("FINOPS_IVF_NLIST", "0"))  # 0: 4 * sqrt(n)
+NPROBE = int(os.getenv("FINOPS_IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("FINOPS_PQ_M", "0"))  # 0: dim / 8 sub-quantizers
+PQ_BITS = 8
+HNSW_M = int(os.getenv("FINOPS_HNSW_M", "32"))
+EF_CONSTRUCTION = int(os.getenv("FINOPS_HNSW_EF_CONSTRUCTION", "80"))
+EF_SEARCH = int(os.getenv("FINOPS_HNSW_EF_SEARCH", "64"))
+TRAIN_SAMPLE = int(os.getenv("FINOPS_INDEX_TRAIN_SAMPLE", "100000"))
+
+# faiss wants ~39 training points per centroid (IVF lists and PQ codes)
+MIN_POINTS_PER_LIST = 39
+
+
+def _nlist(n_vectors: int, nlist: int = None) -> int:
+    nlist = nlist or NLIST or int(4 * math.sqrt(max(n_vectors, 1)))
+    return max(1, min(nlist, min(n_vectors, TRAIN_SAMPLE) // MIN_POINTS_PER_LIST))
+
+
+def _pq_m(dim: int, m: int = None) -> int:
+    """Largest divisor of dim not above the requested sub-quantizer count."""
+    m = m or PQ_M or max(1, dim // 8)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def resolve_type(kind: str, n_vectors: int) -> str:
+    """`kind`, or the simpler type used when n_vectors can't train it."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"unknown index type {kind!r}; expected one of {INDEX_TYPES}")
+    train_points = min(n_vectors, TRAIN_SAMPLE)
+    if kind == "ivf_pq" and train_points < MIN_POINTS_PER_LIST * 2**PQ_BITS:
+        kind = "ivf_flat"
+    if kind == "ivf_flat" and train_points < 2 * MIN_POINTS_PER_LIST:
+        kind = "flat"
+    return kind
+
+
+def make_index(
+    dim: int,
+    n_vectors: int,
+    kind: str = None,
+    id_map: bool = True,
+    nlist: int = None,
+    pq_m: int = None,
+):
+    """
+    Empty index for about `n_vectors` vectors of `dim` floats, wrapped in
+    IndexIDMap2 unless id_map is False. Train it with train() before adding.
+    """
+    requested = (kind or INDEX_TYPE).lower()
+    kind = resolve_type(requested, n_vectors)
+    if kind != requested:
+        logger.info(
+            "%d vectors are too few for a %s index; using %s",
+            n_vectors,
+            requested,
+            kind,
+        )
+    if kind == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = EF_CONSTRUCTION
+    else:
+        quantizer = faiss.IndexFlatL2(dim)
+        lists = _nlist(n_vectors, nlist)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, lists)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, lists, _pq_m(dim, pq_m), PQ_BITS)
+    set_search_params(index)
+    return faiss.IndexIDMap2(index) if id_map else index
+
+
+def train(index, vectors: np.ndarray, sample: int = TRAIN_SAMPLE, seed: int = 0):
+    """Train `index` on at most `sample` random rows of `vectors` if it needs it."""
+    if index.is_trained:
+        return index
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if len(vectors) > sample:
+        rows = np.random.default_rng(seed).choice(len(vectors), sample, replace=False)
+        vectors = vectors[np.sort(rows)]
+    index.train(vectors)
+    return index
+
+
+def _base(index):
+    """The index under an IndexIDMap / IndexIDMap2 wrapper."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_type(index) -> str:
+    """The INDEX_TYPES name of a built index."""
+    base = _base(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def supports_remove(index) -> bool:
+    """HNSW graphs can't delete vectors; such indexes are rebuilt instead."""
+    return not isinstance(_base(index), faiss.IndexHNSW)
+
+
+def set_search_params(index, nprobe: int = None, ef_search: int = None):
+    """Apply nprobe (IVF) / efSearch (HNSW), defaulting to the env settings."""
+    base = _base(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(nprobe or NPROBE, base.nlist)
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = ef_search or EF_SEARCH
+    return index
+
+
+def search_params(index, ids: np.ndarray):
+    """
+    faiss search parameters limiting a search of `index` to `ids` (the ids
+    given to add_with_ids), keeping its nprobe / efSearch. Filtered-out
+    vectors are skipped during the scan rather than dropped afterwards, so
+    every one of the k results matches; IVF only scans its nprobe lists, so
+    it can return fewer than k when the matches sit in other lists.
+    """
+    ids = np.ascontiguousarray(ids, dtype="int64")
+    selector = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    base = _base(index)
+    if isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=base.nprobe)
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def read_index(path: str):
+    """faiss.read_index with the configured search parameters applied."""
+    return set_search_params(faiss.read_index(path))
+
+
+def build_index(
+    vectors: np.ndarray, ids: np.ndarray = None, kind: str = None, **params
+):
+    """Index holding `vectors` (with `ids` when given), trained on a sample."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = make_index(
+        vectors.shape[1], len(vectors), kind, id_map=ids is not None, **params
+    )
+    train(index, vectors)
+    if ids is None:
+        index.add(vectors)
+    else:
+        index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    return index
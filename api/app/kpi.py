@@ -1,50 +1,75 @@
-from sqlalchemy import func, desc
-from .etl import SessionLocal
-from .models import Billing, Resource
-import pandas as pd
+from sqlalchemy import desc, false, func, literal, select, union_all
+from . import analytics, cube
+from .cache import cached
+from .db import ReadSessionLocal, read_engine
+from .models import Billing, CostRollup, Resource
+from .utils import format_month_key, month_key
 
 
-def get_cost_by_owner(month: str):
-    session = SessionLocal()
-    # Aggregate cost per owner after deduplicating per resource
-    subquery = (
-        session.query(Billing.resource_id, func.min(Billing.cost).label("cost"))
-        .filter(Billing.invoice_month.like(f"{month}%"))
-        .group_by(Billing.resource_id)
-        .subquery()
-    )
+def month_clause(month: str, column=Billing.month_key):
+    """
+    Sargable equality on the normalized month key instead of LIKE 'YYYY-MM%'.
+    Unparsable months match nothing, and so do year-only values ("2025"),
+    which the LIKE matched as the whole year.
+    """
+    key = month_key(month)
+    return column == key if key is not None else false()
 
+
+@cached
+def get_cost_by_owner(month: str):
+    if cube.enabled():
+        return cube.get_cost_by_owner(month)
+    if analytics.enabled():
+        return analytics.get_cost_by_owner(month)
+    session = ReadSessionLocal()
+    # read from the rollup; has_resource keeps the billing/resources inner join
     results = (
-        session.query(Resource.owner, func.sum(subquery.c.cost).label("total_cost"))
-        .join(subquery, Resource.resource_id == subquery.c.resource_id)
-        .group_by(Resource.owner)
+        session.query(CostRollup.owner, func.sum(CostRollup.cost).label("total_cost"))
+        .filter(month_clause(month, CostRollup.month_key))
+        .filter(CostRollup.has_resource == 1)
+        .group_by(CostRollup.owner)
         .all()
     )
     session.close()
     return [(owner if owner else "unknown", total) for owner, total in results]
 
 
+@cached
 def monthly_trend(owner: str):
     """
     Returns month-wise cost trend for a given owner
     """
-    session = SessionLocal()
+    if cube.enabled():
+        return cube.monthly_trend(owner)
+    if analytics.enabled():
+        return analytics.monthly_trend(owner)
+    session = ReadSessionLocal()
 
-    # Example query to get monthly cost trend
     results = (
-        session.query(Billing.invoice_month, func.sum(Billing.cost).label("total_cost"))
-        .join(Resource, Resource.resource_id == Billing.resource_id)
-        .filter(Resource.owner == owner)
-        .group_by(Billing.invoice_month)
-        .order_by(Billing.invoice_month)
+        session.query(
+            CostRollup.month_key, func.sum(CostRollup.cost).label("total_cost")
+        )
+        .filter(CostRollup.owner == owner)
+        .group_by(CostRollup.month_key)
+        .order_by(CostRollup.month_key)
         .all()
     )
+    session.close()
 
-    return [{"month": r.invoice_month, "total_cost": r.total_cost} for r in results]
+    return [
+        {"month": format_month_key(r.month_key), "total_cost": r.total_cost}
+        for r in results
+    ]
 
 
+@cached
 def top_service_expenditures(service_keyword: str = "network", n: int = 5):
-    session = SessionLocal()
+    if cube.enabled():
+        return cube.top_service_expenditures(service_keyword, n)
+    if analytics.enabled():
+        return analytics.top_service_expenditures(service_keyword, n)
+    session = ReadSessionLocal()
     try:
         results = (
             session.query(
@@ -63,3 +88,150 @@ def top_service_expenditures(service_keyword: str = "network", n: int = 5):
         return results
     finally:
         session.close()
+
+
+# Dimensions top_n_per_group can rank resources within
+RANK_DIMENSIONS = ("service", "owner", "region", "resource_group")
+
+
+@cached
+def top_n_per_group(
+    group_by=("service", "owner", "region"),
+    n: int = 5,
+    month: str = None,
+    service_keyword: str = None,
+):
+    """
+    Top `n` resources by cost within every group of each `group_by`
+    dimension, e.g. the 5 most expensive resources of every service, owner
+    and region. One statement: billing joined to resources is aggregated
+    once per resource (a CTE SQLite materializes because every dimension
+    reads it), then ROW_NUMBER() OVER (PARTITION BY <dimension>) keeps the
+    first `n` rows of each group. Returns {dimension: [{"group", "rank",
+    "resource_id", "owner", "total_cost"}, ...]} ordered by group and rank.
+    """
+    unknown = [d for d in group_by if d not in RANK_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown group_by dimension(s): {', '.join(unknown)}")
+    group_by = list(dict.fromkeys(group_by))
+    if cube.enabled():
+        return cube.top_n_per_group(group_by, n, month, service_keyword)
+
+    query = select(
+        Billing.resource_id,
+        Resource.owner,
+        Billing.service,
+        Billing.region,
+        Billing.resource_group,
+        func.sum(Billing.cost).label("cost"),
+    ).join(Resource, Resource.resource_id == Billing.resource_id)
+    if month is not None:
+        query = query.where(month_clause(month))
+    if service_keyword:
+        query = query.where(Billing.service.ilike(f"%{service_keyword}%"))
+    per_resource = query.group_by(
+        Billing.resource_id,
+        Resource.owner,
+        Billing.service,
+        Billing.region,
+        Billing.resource_group,
+    ).cte("per_resource")
+
+    parts = []
+    for dim in group_by:
+        group = per_resource.c[dim]
+        total = func.sum(per_resource.c.cost)
+        ranked = (
+            select(
+                literal(dim).label("dimension"),
+                group.label("grp"),
+                per_resource.c.resource_id,
+                per_resource.c.owner,
+                total.label("total_cost"),
+                func.row_number()
+                .over(
+                    partition_by=group,
+                    order_by=(total.desc(), per_resource.c.resource_id),
+                )
+                .label("rank"),
+            )
+            .group_by(group, per_resource.c.resource_id, per_resource.c.owner)
+            .subquery()
+        )
+        parts.append(select(ranked).where(ranked.c.rank <= n))
+
+    out = {dim: [] for dim in group_by}
+    if n <= 0:
+        return out
+    stmt = union_all(*parts).subquery()
+    stmt = select(stmt).order_by(stmt.c.dimension, stmt.c.grp, stmt.c.rank)
+    with read_engine.connect() as conn:
+        for row in conn.execute(stmt):
+            out[row.dimension].append(
+                {
+                    "group": row.grp,
+                    "rank": row.rank,
+                    "resource_id": row.resource_id,
+                    "owner": row.owner,
+                    "total_cost": row.total_cost,
+                }
+            )
+    return out
+
+
+# Rollup column and output formatting per batch dimension
+BATCH_DIMENSIONS = {
+    "month": CostRollup.month_key,
+    "owner": CostRollup.owner,
+    "service": CostRollup.service,
+    "resource_group": CostRollup.resource_group,
+}
+
+
+@cached
+def batch_costs(
+    months=None, owners=None, services=None, resource_groups=None, group_by=("month",)
+):
+    """
+    Cost for many months / owners / services / resource groups in one grouped
+    pass over cost_rollup, as columns: {"month": [...], ..., "total_cost": [...]}.
+
+    Empty filters mean "all". Grouping by or filtering on owner keeps the
+    billing/resources inner join of get_cost_by_owner (missing owners are
+    "unknown"); otherwise every billing line counts, as in kpi_for_month.
+    """
+    unknown = [d for d in group_by if d not in BATCH_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown group_by dimension(s): {', '.join(unknown)}")
+    group_by = list(dict.fromkeys(group_by))
+    columns = [BATCH_DIMENSIONS[d] for d in group_by]
+
+    session = ReadSessionLocal()
+    try:
+        query = session.query(*columns, func.sum(CostRollup.cost))
+        if months:
+            keys = {month_key(m) for m in months} - {None}
+            query = query.filter(CostRollup.month_key.in_(keys))
+        if owners or "owner" in group_by:
+            query = query.filter(CostRollup.has_resource == 1)
+        if owners:
+            query = query.filter(CostRollup.owner.in_(owners))
+        if services:
+            query = query.filter(CostRollup.service.in_(services))
+        if resource_groups:
+            query = query.filter(CostRollup.resource_group.in_(resource_groups))
+        rows = query.group_by(*columns).order_by(*columns).all()
+    finally:
+        session.close()
+
+    out = {d: [] for d in group_by}
+    out["total_cost"] = []
+    for row in rows:
+        for d, value in zip(group_by, row):
+            if d == "month":
+                value = format_month_key(value)
+            elif d == "owner":
+                value = value if value else "unknown"
+            out[d].append(value)
+        out["total_cost"].append(float(row[-1] or 0.0))
+    return out
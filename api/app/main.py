@@ -1,26 +1,34 @@
 import os
 import calendar
+from typing import List, Optional
 from .utils import logger
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from groq import Groq
 import logging
 import streamlit as st
 import re
-from .etl import SessionLocal
+from . import anomalies, cache, cube, forecast
+from .cache import cached
+from .db import ReadSessionLocal
 from sqlalchemy import func
 
-from .models import Billing, Resource
-from .kpi import get_cost_by_owner, monthly_trend, top_service_expenditures
+from .models import CostRollup
+from .kpi import (
+    batch_costs,
+    get_cost_by_owner,
+    month_clause,
+    monthly_trend,
+    top_n_per_group,
+    top_service_expenditures,
+)
+from .schemas import ForecastResponse, KPIBatchRequest, KPIBatchResponse
+from .etl import init_db
 
 
 # For vector store
-import faiss
-import pickle
-from sentence_transformers import SentenceTransformer
-
-from .rag import retriever, sync_db_to_vectors, get_cost_by_owner
+from .rag import retriever, sync_db_to_vectors
 
 # sync_db_to_vectors()
 
@@ -46,7 +54,8 @@ app = FastAPI(title="FinOps Copilot with Groq")
 @app.get("/cost_by_owner")
 def cost_by_owner(month: str):
     """
-    Returns actual cost by owner for a given month (YYYY-MM)
+    Returns actual cost by owner for a given month (YYYY-MM). A year alone
+    ("2025") is not a month and returns no data.
     """
     data = get_cost_by_owner(month)
     return {"month": month, "data": data}
@@ -57,9 +66,19 @@ def cost_by_owner(month: str):
 
 @app.on_event("startup")
 def startup_event():
+    # an existing database may predate the rollup / generation tables
+    init_db()
+    if cube.enabled():
+        report = cube.memory_report()  # builds the cube
+        logger.info(
+            "KPI cube ready: %d rows, %.1f MiB",
+            report["rows"],
+            report["total_bytes"] / 2**20,
+        )
     try:
         logger.info("Syncing DB to vector store on startup...")
         sync_db_to_vectors()
+        retriever.load()
         logger.info("Vector store ready.")
     except Exception as e:
         logger.exception("Failed to sync vector store, using fallback retriever.")
@@ -139,19 +158,21 @@ def parse_top_n_service(question: str):
     return n
 
 
+@cached
 def get_cost_by_owner_for_owner(month: str, owner: str):
     """
     Fetch total cost for a specific owner and month.
     Returns list of dicts.
     """
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
         results = (
-            session.query(Resource.owner, func.sum(Billing.cost).label("total_cost"))
-            .join(Billing, Billing.resource_id == Resource.resource_id)
-            .filter(Resource.owner.ilike(f"%{owner}%"))
-            .filter(Billing.invoice_month.like(f"{month}%"))
-            .group_by(Resource.owner)
+            session.query(
+                CostRollup.owner, func.sum(CostRollup.cost).label("total_cost")
+            )
+            .filter(CostRollup.owner.ilike(f"%{owner}%"))
+            .filter(month_clause(month, CostRollup.month_key))
+            .group_by(CostRollup.owner)
             .all()
         )
         return [
@@ -162,18 +183,23 @@ def get_cost_by_owner_for_owner(month: str, owner: str):
         session.close()
 
 
+@cached
 def get_highest_paid_owner(month: str):
     """
     Returns owner with highest total cost for a given month
     """
-    session = SessionLocal()
+    if cube.enabled():
+        return cube.get_highest_paid_owner(month)
+    session = ReadSessionLocal()
     try:
         result = (
-            session.query(Resource.owner, func.sum(Billing.cost).label("total_cost"))
-            .join(Billing, Resource.resource_id == Billing.resource_id)
-            .filter(Billing.invoice_month.like(f"{month}%"))
-            .group_by(Resource.owner)
-            .order_by(func.sum(Billing.cost).desc())
+            session.query(
+                CostRollup.owner, func.sum(CostRollup.cost).label("total_cost")
+            )
+            .filter(CostRollup.has_resource == 1)
+            .filter(month_clause(month, CostRollup.month_key))
+            .group_by(CostRollup.owner)
+            .order_by(func.sum(CostRollup.cost).desc())
             .first()
         )
         if result:
@@ -184,22 +210,27 @@ def get_highest_paid_owner(month: str):
         session.close()
 
 
+@cached
 def get_most_used_service(owner: str = None, month: str = None):
     """
     Returns service with highest usage (cost) optionally filtered by owner/month
     """
-    session = SessionLocal()
+    if cube.enabled():
+        return cube.get_most_used_service(owner, month)
+    session = ReadSessionLocal()
     try:
         query = session.query(
-            Billing.service, func.sum(Billing.cost).label("total_cost")
-        ).join(Resource, Resource.resource_id == Billing.resource_id)
+            CostRollup.service, func.sum(CostRollup.cost).label("total_cost")
+        ).filter(CostRollup.has_resource == 1)
 
         if owner:
-            query = query.filter(Resource.owner.ilike(f"%{owner}%"))
+            query = query.filter(CostRollup.owner.ilike(f"%{owner}%"))
         if month:
-            query = query.filter(Billing.invoice_month.like(f"{month}%"))
+            query = query.filter(month_clause(month, CostRollup.month_key))
 
-        query = query.group_by(Billing.service).order_by(func.sum(Billing.cost).desc())
+        query = query.group_by(CostRollup.service).order_by(
+            func.sum(CostRollup.cost).desc()
+        )
         result = query.first()
         if result:
             service, total = result
@@ -211,110 +242,156 @@ def get_most_used_service(owner: str = None, month: str = None):
 
 @app.get("/kpi")
 def kpi(month: str):
+    """Cost by owner for a month (YYYY-MM); a year alone returns no data."""
     data = get_cost_by_owner(month)
     return {"month": month, "cost_by_owner": data}
 
 
-@app.get("/monthly_trend")
-def monthly_trend_api(owner: str):
-    data = monthly_trend(owner)
-    return {"owner": owner, "monthly_trend": data}
-
-
-# Dummy retriever (replace with vector store later)
-
-
-def dummy_retrieve(query: str, k: int = 5):
-    return [
-        {
-            "source": "finops_tips.md",
-            "text": "Monitor Azure cost anomalies using Cost Explorer.",
-        },
-        {
-            "source": "finops_tips.md",
-            "text": "May often has spikes due to fiscal year-end workloads.",
-        },
-        {
-            "source": "finops_tips.md",
-            "text": "Always tag resources properly to track cost allocation.",
-        },
-    ]
-
-
-# Vector store retriever
-
-VECTOR_INDEX_PATH = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-    "data/vector_store.index",
-)  # outside api folder
+@app.post("/kpi/batch", response_model=KPIBatchResponse)
+def kpi_batch(req: KPIBatchRequest):
+    """
+    Costs for many months / owners / services / resource groups in one
+    grouped query, returned column-wise; replaces loops over /cost_by_owner
+    and /monthly_trend.
+    """
+    group_by = list(dict.fromkeys(req.group_by)) or ["month"]
+    columns = batch_costs(
+        months=req.months,
+        owners=req.owners,
+        services=req.services,
+        resource_groups=req.resource_groups,
+        group_by=group_by,
+    )
+    return {
+        "group_by": group_by,
+        "rows": len(columns["total_cost"]),
+        "columns": columns,
+    }
 
-DOCS_PICKLE_PATH = VECTOR_INDEX_PATH + ".pkl"
 
+@app.get("/top_resources")
+def top_resources(
+    by: List[str] = Query(["service", "owner", "region"]),
+    n: int = 5,
+    month: Optional[str] = None,
+    service: Optional[str] = None,
+):
+    """
+    Top `n` resources by cost in every group of each `by` dimension
+    (service, owner, region, resource_group), ranked in one query, over one
+    month (YYYY-MM; a year alone matches nothing) or all of them.
+    """
+    try:
+        data = top_n_per_group(by, n=n, month=month, service_keyword=service)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"month": month, "n": n, "top": data}
+
+
+@app.get("/anomalies")
+def anomalies_api(
+    month: Optional[str] = None,
+    entity_type: Optional[str] = None,
+    kind: Optional[str] = None,
+    entity: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+):
+    """
+    Stored month-over-month cost / unit-cost spikes, largest extra spend
+    first; written by the ETL (anomalies.refresh_anomalies), not recomputed here.
+    """
+    data = anomalies.get_anomalies(
+        month=month,
+        entity_type=entity_type,
+        kind=kind,
+        entity=entity,
+        limit=limit,
+        offset=offset,
+    )
+    return {"month": month, "anomalies": data}
+
+
+@app.get("/forecast", response_model=ForecastResponse)
+def forecast_api(
+    entity_type: Optional[str] = None,
+    entity: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+):
+    """
+    Next-quarter cost forecasts with prediction intervals per owner, service
+    and resource group, as stored by the ETL (forecast.refresh_forecasts).
+    lower / upper are null for series too short to estimate an interval.
+    """
+    data = forecast.get_forecasts(
+        entity_type=entity_type, entity=entity, limit=limit, offset=offset
+    )
+    return {"forecasts": data}
 
-class Retriever:
-    def __init__(self, index_path=VECTOR_INDEX_PATH):
-        self.index = None
-        self.docs = []
-        self.embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-        if os.path.exists(index_path) and os.path.exists(DOCS_PICKLE_PATH):
-            self.index = faiss.read_index(index_path)
-            with open(DOCS_PICKLE_PATH, "rb") as f:
-                self.docs = pickle.load(f)
-            logger.info("✅ Vector store loaded successfully.")
-        else:
-            logger.warning("⚠️ Vector store not found. Using dummy retriever.")
 
-    def query(self, query: str, top_k=5):
-        if self.index is None:
-            return dummy_retrieve(query, k=top_k)
-        q_emb = self.embed_model.encode([query])
-        D, I = self.index.search(q_emb, top_k)
-        return [self.docs[i] for i in I[0] if i < len(self.docs)]
+@app.get("/cube/memory")
+def cube_memory():
+    """Memory footprint of the in-process KPI cube (FINOPS_KPI_BACKEND=cube)."""
+    if not cube.enabled():
+        return {"enabled": False}
+    return {"enabled": True, **cube.memory_report()}
 
 
-retriever = Retriever()
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit / miss / eviction counters of the KPI result cache."""
+    return cache.stats()
 
 
-# Dummy retriever fallback
+@app.get("/monthly_trend")
+def monthly_trend_api(owner: str):
+    data = monthly_trend(owner)
+    return {"owner": owner, "monthly_trend": data}
 
 
-def dummy_retrieve(query: str, k: int = 5):
-    return [
-        {
-            "source": "finops_tips.md",
-            "text": "Monitor Azure cost anomalies using Cost Explorer.",
-        },
-        {
-            "source": "finops_tips.md",
-            "text": "May often has spikes due to fiscal year-end workloads.",
-        },
-        {
-            "source": "finops_tips.md",
-            "text": "Always tag resources properly to track cost allocation.",
-        },
-    ]
+# Vector store retriever: rag.retriever (index synced at startup)
 
 
 # ------------------------
 # /ask endpoint
 # ------------------------
+def retrieve_context(question: str, month=None, owner=None, top_k: int = 10):
+    """
+    Documents for `question` scoped to the parsed month and owner. The scope
+    widens when nothing matches (e.g. "cost by owner" parses owner "owner"):
+    to the month alone, then to all documents.
+    """
+    scopes = [{"month": month, "owner": owner}]
+    if month and owner:
+        scopes.append({"month": month})
+    if month or owner:
+        scopes.append({})
+    for scope in scopes:
+        docs = retriever.query(question, top_k=top_k, **scope)
+        if docs:
+            break
+    return docs
+
+
 @app.post("/ask")
 async def ask(req: AskRequest):
     question = sanitize_user_input(req.question)
 
-    # Step 1: Retrieve context from FAISS
-
-    relevant_docs = retriever.query(question, top_k=10)
-    context_texts = "\n".join([d["text"] for d in relevant_docs])
-    sources = [d["source"] for d in relevant_docs]
-
-    # Step 2: Parse structured info
+    # Step 1: Parse structured info
 
     table_data, trend_data, top_service_data = None, None, None
+    anomaly_data = None
     month = parse_month_year(question)
     owner = parse_owner(question)
     top_n = parse_top_n_service(question)
 
+    # Step 2: Retrieve context from FAISS, scoped to the parsed month / owner
+
+    relevant_docs = retrieve_context(question, month=month, owner=owner)
+    context_texts = "\n".join([d["text"] for d in relevant_docs])
+    sources = [d["source"] for d in relevant_docs]
+
     # Step 3: Structured KPI enrichments
 
     # Cost by owner → filter by owner and month if available
@@ -334,6 +411,15 @@ async def ask(req: AskRequest):
     if "mostly taken service" in question.lower():
         top_service_data = get_most_used_service(owner=owner, month=month)
 
+    # Anomalies → precomputed spikes, scoped to the month / owner if given
+    if any(w in question.lower() for w in ("anomal", "spike", "unusual")):
+        anomaly_data = anomalies.get_anomalies(
+            month=month,
+            entity_type="owner" if owner else None,
+            entity=owner,
+            limit=10,
+        )
+
     # Top-N services → detect number + service keyword
     if "top" in question.lower() and top_n:
         m = re.search(r"in\s+(\w+)", question.lower())
@@ -368,6 +454,8 @@ Context:
         prompt += f"\nMonthly Trend Data:\n{trend_data}\n"
     if top_service_data:
         prompt += f"\nTop Service Expenditures:\n{top_service_data}\n"
+    if anomaly_data:
+        prompt += f"\nCost Anomalies:\n{anomaly_data}\n"
 
     prompt += f"\nUser Question: {question}\nAnswer:\n"
 
@@ -396,6 +484,7 @@ Context:
         "table": table_data,
         "trend": trend_data,
         "top_service": top_service_data,
+        "anomalies": anomaly_data,
         "suggestions": [],
     }
 
@@ -0,0 +1,100 @@
+"""
+Idempotent schema migrations for databases created by older versions.
+
+Base.metadata.create_all() only creates missing tables, so columns and
+indexes added to existing tables are applied here. Safe to run on every
+start-up.
+"""
+
+from sqlalchemy import bindparam, inspect, select, text
+from .models import Base, Billing, BILLING_NATURAL_KEY
+from .rollups import refresh_rollups, rollups_missing
+from .utils import month_key
+
+
+def _add_missing_columns(conn, table):
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    for col in table.columns:
+        if col.name not in existing:
+            col_type = col.type.compile(dialect=conn.dialect)
+            conn.execute(
+                text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}")
+            )
+
+
+def _dedupe_billing(conn):
+    """Drop repeated loads of the same billing line, keeping the first one."""
+    key = ", ".join(BILLING_NATURAL_KEY)
+    conn.execute(
+        text(
+            f"DELETE FROM billing WHERE id NOT IN "
+            f"(SELECT MIN(id) FROM billing GROUP BY {key})"
+        )
+    )
+
+
+def _backfill_month_keys(conn):
+    """
+    YYYYMM month_key for rows loaded before the column existed, parsed by
+    utils.month_key like every loaded row; months it rejects ("2025-13")
+    stay NULL.
+    """
+    table = Billing.__table__
+    months = conn.execute(
+        select(table.c.invoice_month).where(table.c.month_key.is_(None)).distinct()
+    ).scalars()
+    keys = [{"m": m, "k": month_key(m)} for m in months if month_key(m) is not None]
+    if keys:
+        conn.execute(
+            table.update()
+            .where(table.c.month_key.is_(None), table.c.invoice_month == bindparam("m"))
+            .values(month_key=bindparam("k")),
+            keys,
+        )
+
+
+def _normalize_invoice_months(conn):
+    """
+    Rewrite invoice_month as YYYY-MM wherever month_key is known, first
+    dropping lines that only differed by the month's spelling ("2025-04" vs
+    "2025-04-01"), keeping the first one.
+    """
+    canonical = "printf('%04d-%02d', month_key / 100, month_key % 100)"
+    others = ", ".join(c for c in BILLING_NATURAL_KEY if c != "invoice_month")
+    if not conn.execute(
+        text(
+            f"SELECT 1 FROM billing WHERE month_key IS NOT NULL "
+            f"AND invoice_month != {canonical} LIMIT 1"
+        )
+    ).first():
+        return
+    conn.execute(
+        text(
+            f"DELETE FROM billing WHERE month_key IS NOT NULL AND id NOT IN "
+            f"(SELECT MIN(id) FROM billing WHERE month_key IS NOT NULL "
+            f"GROUP BY month_key, {others})"
+        )
+    )
+    conn.execute(
+        text(
+            f"UPDATE billing SET invoice_month = {canonical} "
+            f"WHERE month_key IS NOT NULL AND invoice_month != {canonical}"
+        )
+    )
+    refresh_rollups(conn)
+
+
+def migrate(engine):
+    with engine.begin() as conn:
+        indexes = {i["name"] for i in inspect(conn).get_indexes("billing")}
+        for table in Base.metadata.sorted_tables:
+            _add_missing_columns(conn, table)
+        _backfill_month_keys(conn)
+        if "ux_billing_natural_key" not in indexes:
+            _dedupe_billing(conn)
+        _normalize_invoice_months(conn)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        if rollups_missing(conn):
+            refresh_rollups(conn)
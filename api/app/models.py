@@ -1,14 +1,34 @@
-from sqlalchemy import Column, Integer, String, Float, JSON
+from sqlalchemy import Column, Integer, String, Float, JSON, DateTime, Index
 from sqlalchemy.orm import declarative_base
 
 
 Base = declarative_base()
 
+# Columns that identify one billing line; enforced unique so re-loads can't
+# double count and KPI queries need no dedup
+BILLING_NATURAL_KEY = (
+    "invoice_month",
+    "account_id",
+    "subscription",
+    "service",
+    "resource_group",
+    "resource_id",
+    "region",
+)
+
 
 class Billing(Base):
     __tablename__ = "billing"
+    __table_args__ = (
+        Index("ux_billing_natural_key", *BILLING_NATURAL_KEY, unique=True),
+        # covering indexes for the KPI access paths (kpi.py / main.py)
+        Index("ix_billing_month_resource_cost", "month_key", "resource_id", "cost"),
+        Index("ix_billing_service_month", "service", "month_key", "cost"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     invoice_month = Column(String, index=True)
+    # invoice_month normalized to YYYYMM at ingest, for sargable filters
+    month_key = Column(Integer)
     account_id = Column(String)
     subscription = Column(String)
     service = Column(String, index=True)
@@ -18,11 +38,158 @@ class Billing(Base):
     usage_qty = Column(Float)
     unit_cost = Column(Float)
     cost = Column(Float)
+    source_file = Column(String, index=True)
+
+
+class BillingStaging(Base):
+    """Rows of an in-progress load, swapped into billing per month partition."""
+
+    __tablename__ = "billing_staging"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source_file = Column(String, index=True)
+    invoice_month = Column(String)
+    month_key = Column(Integer)
+    account_id = Column(String)
+    subscription = Column(String)
+    service = Column(String)
+    resource_group = Column(String)
+    resource_id = Column(String)
+    region = Column(String)
+    usage_qty = Column(Float)
+    unit_cost = Column(Float)
+    cost = Column(Float)
+
+
+class BillingQuarantine(Base):
+    """Billing rows rejected by a data-quality rule, kept for review."""
+
+    __tablename__ = "billing_quarantine"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source_file = Column(String, index=True)
+    row_number = Column(Integer)
+    rule = Column(String, index=True)
+    invoice_month = Column(String)
+    month_key = Column(Integer)
+    account_id = Column(String)
+    subscription = Column(String)
+    service = Column(String)
+    resource_group = Column(String)
+    resource_id = Column(String)
+    region = Column(String)
+    usage_qty = Column(Float)
+    unit_cost = Column(Float)
+    cost = Column(Float)
 
 
 class Resource(Base):
     __tablename__ = "resources"
+    __table_args__ = (Index("ix_resources_resource_owner", "resource_id", "owner"),)
     resource_id = Column(String, primary_key=True)
     owner = Column(String, nullable=True)
     env = Column(String)
     tags_json = Column(JSON)
+
+
+class CostRollup(Base):
+    """
+    Billing cost pre-aggregated per month x owner x service x resource group,
+    refreshed by the ETL for the months a load touched (see rollups.py).
+    `has_resource` is 0 for billing lines with no resources row, so owner
+    queries keep the inner-join semantics of the raw billing/resources join.
+    """
+
+    __tablename__ = "cost_rollup"
+    __table_args__ = (
+        Index("ix_cost_rollup_month_owner", "month_key", "owner", "cost"),
+        Index("ix_cost_rollup_owner_month", "owner", "month_key", "cost"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    month_key = Column(Integer)
+    owner = Column(String)
+    service = Column(String)
+    resource_group = Column(String)
+    has_resource = Column(Integer)
+    cost = Column(Float)
+    row_count = Column(Integer)
+
+
+class DataGeneration(Base):
+    """
+    Per-month change counter bumped whenever a load changes that month's
+    billing or rollups; month_key 0 counts changes to any month. KPI result
+    caches are keyed on it (see cache.py).
+    """
+
+    __tablename__ = "data_generations"
+    month_key = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+
+
+class Anomaly(Base):
+    """
+    Month-over-month cost or unit-cost spike of one resource, service or
+    owner series, written by anomalies.refresh_anomalies.
+    """
+
+    __tablename__ = "anomalies"
+    __table_args__ = (
+        Index("ix_anomalies_month_score", "month_key", "score"),
+        Index("ix_anomalies_entity", "entity_type", "entity", "month_key"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entity_type = Column(String)  # resource | service | owner
+    entity = Column(String)
+    month_key = Column(Integer)
+    kind = Column(String)  # cost_spike | unit_cost_spike
+    cost = Column(Float)
+    prev_cost = Column(Float)
+    delta = Column(Float)
+    pct_change = Column(Float)
+    zscore = Column(Float)
+    unit_cost = Column(Float)
+    prev_unit_cost = Column(Float)
+    unit_cost_change = Column(Float)
+    score = Column(Float)
+
+
+class Forecast(Base):
+    """
+    Forecast monthly cost of one owner, service or resource group series
+    with its prediction interval, written by forecast.refresh_forecasts.
+    """
+
+    __tablename__ = "forecasts"
+    __table_args__ = (
+        Index("ix_forecasts_entity", "entity_type", "entity", "month_key"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entity_type = Column(String)  # owner | service | resource_group
+    entity = Column(String)
+    month_key = Column(Integer)
+    forecast = Column(Float)
+    lower = Column(Float)  # NULL for series too short for an interval
+    upper = Column(Float)
+    n_obs = Column(Integer)  # history months the model was fitted on
+    model = Column(String)  # linear | seasonal
+
+
+class IngestCheckpoint(Base):
+    __tablename__ = "ingest_checkpoints"
+    source = Column(String, primary_key=True)
+    fingerprint = Column(String)
+    rows_done = Column(Integer, default=0)
+    checks_json = Column(String, default="[]")
+    partitions_json = Column(String, default="{}")
+
+
+class IngestManifest(Base):
+    """Content hash of every (file, invoice_month) partition loaded so far."""
+
+    __tablename__ = "ingest_manifest"
+    source = Column(String, primary_key=True)
+    invoice_month = Column(String, primary_key=True)
+    content_hash = Column(String)
+    row_count = Column(Integer)
+    file_hash = Column(String)
+    checks_json = Column(String, default="[]")
+    loaded_at = Column(DateTime)
@@ -0,0 +1,172 @@
+"""
+Month-partitioned Parquet store for billing data.
+
+CSV exports are converted once into
+
+    <store>/month=YYYY-MM/<source id>-<chunk>.parquet
+
+with explicit column types: dictionary-encoded service/region/resource_group
+and float32 usage/cost columns whenever every value round-trips exactly at
+its decimal precision (the precision is kept in the file metadata, so
+readers get the original float64 values back). Readers project only the
+columns they need and memory-map the files.
+"""
+
+import glob
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+STORE_DIR = os.getenv("FINOPS_PARQUET_DIR", str(BASE_DIR / "data" / "billing_parquet"))
+
+STRING_COLUMNS = ["invoice_month", "account_id", "subscription", "resource_id"]
+CATEGORICAL_COLUMNS = ["service", "resource_group", "region"]
+FLOAT_COLUMNS = ["usage_qty", "unit_cost", "cost"]
+
+# Decimal places tried when checking whether float32 can hold a column
+MAX_DECIMALS = 6
+DECIMALS_KEY = b"finops.decimals"
+
+
+def month_partition(invoice_month: str) -> str:
+    """'2025-04' and '2025-04-01' both land in the month=2025-04 partition."""
+    return str(invoice_month)[:7]
+
+
+def source_id(path: str) -> str:
+    return hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+
+
+def _decimals(values: np.ndarray):
+    """Fewest decimal places that reproduce every value, or None."""
+    for d in range(MAX_DECIMALS + 1):
+        if np.array_equal(np.round(values, d), values):
+            return d
+    return None
+
+
+def _float_array(values: np.ndarray):
+    """(arrow array, decimals): float32 when it round-trips at `decimals`."""
+    d = _decimals(values)
+    if d is not None:
+        narrow = values.astype(np.float32)
+        if np.array_equal(np.round(narrow.astype(np.float64), d), values):
+            return pa.array(narrow, pa.float32()), d
+    return pa.array(values, pa.float64()), None
+
+
+def to_arrow(frame: pd.DataFrame) -> pa.Table:
+    """Typed Arrow table for a coerced billing frame (see etl.billing_frame)."""
+    arrays, fields, decimals = [], [], {}
+    for col in STRING_COLUMNS + CATEGORICAL_COLUMNS + FLOAT_COLUMNS:
+        if col in CATEGORICAL_COLUMNS:
+            arr = pa.array(
+                frame[col].to_numpy(dtype=object), pa.string(), from_pandas=True
+            )
+            arr = arr.dictionary_encode()
+        elif col in FLOAT_COLUMNS:
+            arr, d = _float_array(frame[col].to_numpy(dtype=np.float64))
+            if d is not None:
+                decimals[col] = d
+        else:
+            arr = pa.array(
+                frame[col].to_numpy(dtype=object), pa.string(), from_pandas=True
+            )
+        arrays.append(arr)
+        fields.append(pa.field(col, arr.type))
+    schema = pa.schema(fields, metadata={DECIMALS_KEY: json.dumps(decimals)})
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _restore_floats(df: pd.DataFrame, schema: pa.Schema) -> pd.DataFrame:
+    decimals = json.loads((schema.metadata or {}).get(DECIMALS_KEY, b"{}"))
+    for col, d in decimals.items():
+        if col in df.columns:
+            df[col] = np.round(df[col].to_numpy(dtype=np.float64), d)
+    return df
+
+
+def clear_source(source: str, store_dir: str = STORE_DIR):
+    """Remove the parts written by an earlier conversion of `source`."""
+    for path in glob.glob(
+        os.path.join(store_dir, "month=*", f"{source_id(source)}-*.parquet")
+    ):
+        os.remove(path)
+
+
+def write_partitions(
+    frame: pd.DataFrame, source: str, chunk_no: int, store_dir: str = STORE_DIR
+):
+    """Write one coerced chunk, split by month partition. Returns the files."""
+    written = []
+    months = frame["invoice_month"].map(month_partition)
+    for month, part in frame.groupby(months, sort=True):
+        part_dir = os.path.join(store_dir, f"month={month}")
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, f"{source_id(source)}-{chunk_no:05d}.parquet")
+        pq.write_table(to_arrow(part), path)
+        written.append(path)
+    return written
+
+
+def partition_files(store_dir: str = STORE_DIR, months=None):
+    """Part files of the store, optionally only those of the given months."""
+    if months is None:
+        dirs = ["month=*"]
+    else:
+        dirs = [f"month={month_partition(m)}" for m in months]
+    files = []
+    for d in dirs:
+        files.extend(glob.glob(os.path.join(store_dir, d, "*.parquet")))
+    return sorted(files)
+
+
+def iter_file_chunks(
+    path: str, chunk_size: int, columns=None, skip_rows: int = 0, nrows=None
+):
+    """Memory-mapped record batches of one part file as DataFrames."""
+    pf = pq.ParquetFile(path, memory_map=True)
+    start, stop = skip_rows, nrows
+    seen = 0
+    for batch in pf.iter_batches(batch_size=chunk_size, columns=columns):
+        lo, hi = seen, seen + batch.num_rows
+        seen = hi
+        if hi <= start:
+            continue
+        if stop is not None and lo >= stop:
+            break
+        batch = batch.slice(max(start - lo, 0))
+        if stop is not None:
+            batch = batch.slice(0, stop - max(lo, start))
+        yield _restore_floats(batch.to_pandas(), pf.schema_arrow)
+
+
+def read_billing(columns=None, months=None, store_dir: str = STORE_DIR) -> pd.DataFrame:
+    """Only the requested columns of the requested month partitions."""
+    frames = []
+    for path in partition_files(store_dir, months):
+        table = pq.read_table(path, columns=columns, memory_map=True)
+        frames.append(_restore_floats(table.to_pandas(), table.schema))
+    if not frames:
+        return pd.DataFrame(columns=columns or [])
+    return pd.concat(frames, ignore_index=True)
+
+
+def kpi_for_month(month: str, store_dir: str = STORE_DIR):
+    """Same payload as crud.kpi_for_month, scanning three columns of one partition."""
+    df = read_billing(["service", "resource_group", "cost"], [month], store_dir)
+    by_service = df.groupby("service", observed=True)["cost"].sum()
+    by_rg = df.groupby("resource_group", observed=True)["cost"].sum()
+    return {
+        "month": month,
+        "total_cost": float(df["cost"].sum()),
+        "by_service": {s: float(c) for s, c in by_service.items()},
+        "by_resource_group": {rg: float(c) for rg, c in by_rg.items()},
+    }
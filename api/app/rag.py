@@ -1,16 +1,18 @@
+import hashlib
 import os
 import pickle
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from . import documents, index_factory
+from .embedding_cache import get_encoder
 from .utils import dummy_retrieve, logger
-import pandas as pd
-from sqlalchemy import func, text as sql_text
+from sqlalchemy import select
 
 # DB imports
-from .etl import SessionLocal, Billing, Resource  # Use engine-bound session
-from .models import Billing, Resource
-from .db import get_billing_rows, get_resource_rows
+from .db import STREAM_BATCH_SIZE, read_engine
+from .models import DataGeneration
+from .rollups import ALL_MONTHS
+from .kpi import get_cost_by_owner  # noqa: F401 (re-exported)
 
 
 # Vector store paths (outside api folder)
@@ -22,29 +24,62 @@ VECTOR_INDEX_PATH = os.path.join(
 )
 DOCS_PICKLE_PATH = VECTOR_INDEX_PATH + ".pkl"
 
+EMBED_MODEL = "all-MiniLM-L6-v2"
+
 
 # Retriever class
 
 
 class Retriever:
     def __init__(self, index_path=VECTOR_INDEX_PATH):
+        self.index_path = index_path
         self.index = None
         self.docs = []
-        self.embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-        if os.path.exists(index_path) and os.path.exists(DOCS_PICKLE_PATH):
-            self.index = faiss.read_index(index_path)
+        self.metadata = None
+        self.embed_model = get_encoder(EMBED_MODEL)
+        self.load()
+
+    def load(self):
+        """(Re)load the index and docs written by sync_db_to_vectors."""
+        if os.path.exists(self.index_path) and os.path.exists(DOCS_PICKLE_PATH):
+            self.index = index_factory.read_index(self.index_path)
             with open(DOCS_PICKLE_PATH, "rb") as f:
                 self.docs = pickle.load(f)
+            # ID-mapped docs from sync_db_to_vectors carry filterable metadata
+            self.metadata = (
+                documents.MetadataIndex(self.docs)
+                if isinstance(self.docs, dict)
+                else None
+            )
             logger.info("✅ Vector store loaded successfully.")
         else:
             logger.warning("⚠️ Vector store not found. Using dummy retriever.")
 
-    def query(self, query: str, top_k=5):
+    def query(
+        self, query: str, top_k=5, month=None, owner=None, service=None, env=None
+    ):
+        """
+        top_k documents nearest to `query`. month ('YYYY-MM'), owner, service
+        and env restrict the search to matching documents (see
+        documents.MetadataIndex); no document matching gives [].
+        """
         if self.index is None:
             return dummy_retrieve(query, k=top_k)
-        q_emb = self.embed_model.encode([query])
-        D, I = self.index.search(np.array(q_emb, dtype="float32"), top_k)
-        return [self.docs[i] for i in I[0] if i < len(self.docs)]
+        params = None
+        if any(f is not None for f in (month, owner, service, env)):
+            if self.metadata is None:
+                logger.warning("Vector store has no metadata; ignoring filters.")
+            else:
+                ids = self.metadata.select(month, owner, service, env)
+                if not len(ids):
+                    return []
+                params = index_factory.search_params(self.index, ids)
+                top_k = min(top_k, len(ids))
+        q_emb = self.embed_model.encode([query], cache=False)
+        D, I = self.index.search(np.array(q_emb, dtype="float32"), top_k, params=params)
+        if isinstance(self.docs, dict):  # ID-mapped index from sync_db_to_vectors
+            return [self.docs[i] for i in I[0] if i in self.docs]
+        return [self.docs[i] for i in I[0] if 0 <= i < len(self.docs)]
 
 
 # Instantiate retriever
@@ -54,88 +89,180 @@ retriever = Retriever()
 
 # DB → Vector sync
 
+# per-row content hashes and the month generations the index reflects
+SYNC_STATE_PATH = VECTOR_INDEX_PATH + ".sync.pkl"
 
-def sync_db_to_vectors():
-    embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-    docs = []
-
-    # --- Billing + Resources joined ---
-    db = SessionLocal()
-    try:
-        rows = (
-            db.execute(
-                sql_text(
-                    """
-            SELECT b.invoice_month, b.account_id, b.subscription, b.service,
-                   b.resource_group, b.resource_id, b.region,
-                   b.usage_qty, b.unit_cost, b.cost,
-                   r.owner, r.env, r.tags_json
-            FROM billing b
-            LEFT JOIN resources r
-              ON b.resource_id = r.resource_id
-        """
-                )
-            )
-            .mappings()
-            .all()
-        )
-    finally:
-        db.close()
-
-    for row in rows:
-        text = (
-            f"Invoice Month: {row['invoice_month']}, "
-            f"Account: {row['account_id']}, Subscription: {row['subscription']}, "
-            f"Service: {row['service']}, Resource Group: {row['resource_group']}, "
-            f"Resource ID: {row['resource_id']}, Region: {row['region']}, "
-            f"Usage Qty: {row['usage_qty']}, Unit Cost: {row['unit_cost']}, "
-            f"Cost: {row['cost']}, "
-            f"Owner: {row.get('owner', 'N/A')}, "
-            f"Environment: {row.get('env', 'N/A')}, "
-            f"Tags: {row.get('tags_json', '{}')}"
-        )
-        docs.append({"text": text, "source": "billing+resources"})
-
-    # --- Create embeddings ---
-    embeddings = embed_model.encode([d["text"] for d in docs])
-
-    # --- Build FAISS index ---
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-
-    # --- Save index + docs ---
-    faiss.write_index(index, VECTOR_INDEX_PATH)
-    with open(DOCS_PICKLE_PATH, "wb") as f:
-        pickle.dump(docs, f)
-
-    print(f"✅ Vector store synced with {len(docs)} joined docs.")
-
-
-def get_cost_by_owner(month: str):
-    session = SessionLocal()
-
-    # Fetch unique billing entries per resource per month
-    results = (
-        session.query(Resource.owner, func.sum(Billing.cost).label("total_cost"))
-        .join(Resource, Resource.resource_id == Billing.resource_id)
-        .filter(Billing.invoice_month.like(f"{month}%"))
-        .group_by(Resource.owner)
-        .distinct(
-            Billing.invoice_month,
-            Billing.account_id,
-            Billing.subscription,
-            Billing.service,
-            Billing.resource_group,
-            Billing.resource_id,
-            Billing.region,
-            Billing.usage_qty,
-            Billing.unit_cost,
-            Billing.cost,
-        )
-        .all()
+
+def _text_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=8).digest()
+
+
+def _target_type(n_docs: int) -> str:
+    """Index type FINOPS_VECTOR_INDEX resolves to for n_docs documents."""
+    return index_factory.resolve_type(index_factory.INDEX_TYPE, n_docs)
+
+
+def _month_generations():
+    table = DataGeneration.__table__
+    with read_engine.connect() as conn:
+        rows = conn.execute(select(table.c.month_key, table.c.generation)).all()
+    # month keys only: not ALL_MONTHS nor the derived tables' negative keys
+    return {k: g for k, g in rows if k > ALL_MONTHS}
+
+
+def _load_sync_state():
+    """(index, docs, state) of the last sync, or None when missing or stale."""
+    paths = (VECTOR_INDEX_PATH, DOCS_PICKLE_PATH, SYNC_STATE_PATH)
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    with open(SYNC_STATE_PATH, "rb") as f:
+        state = pickle.load(f)
+    if state.get("model") != EMBED_MODEL:
+        return None
+    index = index_factory.read_index(VECTOR_INDEX_PATH)
+    with open(DOCS_PICKLE_PATH, "rb") as f:
+        docs = pickle.load(f)
+    if not isinstance(docs, dict):
+        return None
+    return index, docs, state
+
+
+def _atomic_write(path, write):
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _save_sync_state(index, docs, state):
+    def dump(obj):
+        def write(path):
+            with open(path, "wb") as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        return write
+
+    _atomic_write(VECTOR_INDEX_PATH, lambda path: faiss.write_index(index, path))
+    _atomic_write(DOCS_PICKLE_PATH, dump(docs))
+    _atomic_write(SYNC_STATE_PATH, dump(state))
+
+
+def sync_db_to_vectors(batch_size: int = STREAM_BATCH_SIZE, full: bool = False):
+    """
+    Bring the FAISS index up to date with the documents of documents.py:
+    resource / owner / service monthly summaries, plus one document per
+    billing line when FINOPS_RAG_DOCS includes "row".
+
+    Every document is one vector in an ID-mapped index of the type set by
+    FINOPS_VECTOR_INDEX (see index_factory.py), keyed by its stable id, with
+    a hash of its text kept alongside. Only months whose data generation
+    changed since the last sync (and the months after them, whose summaries
+    compare against them) are re-read; of those documents only new or
+    changed ones are embedded, and vectors of documents that disappeared
+    are removed. With no new loads this returns without touching the
+    database beyond one small query. `full` rebuilds from scratch. Returns
+    counts of added / updated / removed / unchanged documents.
+    """
+    levels = documents.check_levels(documents.DOC_LEVELS)
+    generations = _month_generations()
+    loaded = None if full else _load_sync_state()
+    if loaded is None:
+        index, docs, state = None, {}, {"generations": {}, "rows": {}}
+    else:
+        index, docs, state = loaded
+    rows_state = state["rows"]
+    if state.get("documents") != levels:
+        # other document levels: re-read every month, dropping the old docs
+        state["generations"] = {}
+    changed = sorted(
+        m for m, g in generations.items() if state["generations"].get(m) != g
     )
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+    # HNSW can't remove vectors, and a new FINOPS_VECTOR_INDEX or a collection
+    # grown enough to train the configured type (which fell back to a simpler
+    # one while small) needs a new index: all rebuild from the stored docs
+    # (embeddings come from the cache)
+    rebuild = loaded is not None and state.get("index_type") != _target_type(len(docs))
+    if loaded is not None and not changed and not rebuild:
+        logger.info("Vector store up to date; nothing to sync.")
+        return stats
+
+    scan = documents.affected_months(changed, levels)
+    scan_set = set(scan)
+    stale = {i for i, (m, _) in rows_state.items() if m is None or m in scan_set}
+    embed_model = get_encoder(EMBED_MODEL)
+    pending = []  # (doc, text_hash)
+    # IVF indexes are trained on the first TRAIN_SAMPLE documents of a new index
+    train_first = index_factory.INDEX_TYPE.startswith("ivf")
+    expected = documents.count_documents(levels) if index is None else 0
+
+    def flush(final=False):
+        nonlocal index, rebuild
+        if not pending:
+            return
+        if index is None and train_first and not final:
+            if len(pending) < index_factory.TRAIN_SAMPLE:
+                return
+        ids = np.array([doc["id"] for doc, _ in pending], dtype="int64")
+        texts = [doc["text"] for doc, _ in pending]
+        embeddings = np.asarray(embed_model.encode(texts), dtype="float32")
+        if index is None:
+            index = index_factory.make_index(embeddings.shape[1], expected)
+            index_factory.train(index, embeddings)
+        replaced = ids[[doc["id"] in rows_state for doc, _ in pending]]
+        if len(replaced) and not index_factory.supports_remove(index):
+            rebuild = True
+        if not rebuild:
+            if len(replaced):
+                index.remove_ids(replaced)
+            index.add_with_ids(embeddings, ids)
+        for doc, text_hash in pending:
+            doc_id = doc.pop("id")
+            stats["updated" if doc_id in rows_state else "added"] += 1
+            rows_state[doc_id] = (doc["month_key"], text_hash)
+            docs[doc_id] = doc
+        pending.clear()
+
+    for doc in documents.iter_documents(scan, levels, batch_size=batch_size):
+        text_hash = _text_hash(doc["text"])
+        stale.discard(doc["id"])
+        if rows_state.get(doc["id"], (None, None))[1] == text_hash:
+            rows_state[doc["id"]] = (doc["month_key"], text_hash)
+            docs[doc["id"]] = {k: v for k, v in doc.items() if k != "id"}
+            stats["unchanged"] += 1
+        else:
+            pending.append((doc, text_hash))
+            if len(pending) >= batch_size:
+                flush()
+    flush(final=True)
+
+    if stale and index is not None:
+        if index_factory.supports_remove(index):
+            index.remove_ids(np.array(sorted(stale), dtype="int64"))
+        else:
+            rebuild = True
+    for doc_id in stale:
+        rows_state.pop(doc_id, None)
+        docs.pop(doc_id, None)
+    stats["removed"] = len(stale)
+
+    if index is not None and index_factory.index_type(index) != _target_type(len(docs)):
+        rebuild = True
+    if rebuild and docs:
+        ids = np.fromiter(docs, dtype="int64", count=len(docs))
+        embeddings = embed_model.encode([docs[i]["text"] for i in ids])
+        index = index_factory.build_index(embeddings, ids)
 
-    session.close()
+    if index is None:
+        logger.warning("No billing rows to index; vector store left unchanged.")
+        return stats
 
-    return [(owner if owner else "unknown", total) for owner, total in results]
+    state = {
+        "model": EMBED_MODEL,
+        "index_type": index_factory.index_type(index),
+        "documents": levels,
+        "generations": generations,
+        "rows": rows_state,
+    }
+    _save_sync_state(index, docs, state)
+    logger.info("Vector store synced: %s (%d docs).", stats, index.ntotal)
+    return stats
@@ -0,0 +1,145 @@
+"""
+Rollup maintenance for the dashboard KPIs.
+
+cost_rollup holds SUM(cost) of billing LEFT JOIN resources grouped by
+month_key, owner, service and resource_group. The ETL rebuilds only the
+months a load replaced (and, after a resources change, the months those
+resources were billed in, since an owner change moves cost between groups), so KPI reads scan a few hundred
+rollup rows per month however many raw billing lines are kept. Every
+refresh also bumps the data generation of the months it rebuilt, which is
+what invalidates cached KPI results; tables derived from billing as a whole
+(anomalies, forecasts) have generation keys of their own.
+"""
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .models import Billing, CostRollup, DataGeneration, Resource
+from .utils import month_key
+
+# data_generations key counting changes to any month
+ALL_MONTHS = 0
+
+# data_generations keys of tables rebuilt as a whole from billing; negative so
+# they never collide with YYYYMM month keys, and bumping them leaves the month
+# generations (and so every month-scoped cache entry) alone
+ANOMALIES_TABLE = -1
+FORECASTS_TABLE = -2
+
+ROLLUP_COLUMNS = [
+    "month_key",
+    "owner",
+    "service",
+    "resource_group",
+    "has_resource",
+    "cost",
+    "row_count",
+]
+
+
+def _rollup_select(keys=None):
+    billing = Billing.__table__
+    resources = Resource.__table__
+    has_resource = case((resources.c.resource_id.is_(None), 0), else_=1)
+    query = (
+        select(
+            billing.c.month_key,
+            resources.c.owner,
+            billing.c.service,
+            billing.c.resource_group,
+            has_resource,
+            func.sum(billing.c.cost),
+            func.count(),
+        )
+        .select_from(
+            billing.outerjoin(
+                resources, resources.c.resource_id == billing.c.resource_id
+            )
+        )
+        .group_by(
+            billing.c.month_key,
+            resources.c.owner,
+            billing.c.service,
+            billing.c.resource_group,
+            has_resource,
+        )
+    )
+    if keys is not None:
+        query = query.where(billing.c.month_key.in_(keys))
+    return query
+
+
+def refresh_rollups(conn, months=None):
+    """
+    Recompute the rollup rows of `months` (invoice months or YYYYMM keys)
+    inside the caller's transaction; all months when `months` is None.
+    Returns the number of rollup rows written.
+    """
+    table = CostRollup.__table__
+    keys = None
+    if months is not None:
+        keys = sorted({k for k in map(month_key, months) if k is not None})
+        if not keys:
+            return 0
+    delete = table.delete()
+    if keys is not None:
+        delete = delete.where(table.c.month_key.in_(keys))
+    conn.execute(delete)
+    result = conn.execute(
+        table.insert().from_select(ROLLUP_COLUMNS, _rollup_select(keys))
+    )
+    bump_generations(conn, keys)
+    return result.rowcount
+
+
+def _advance(conn, keys):
+    table = DataGeneration.__table__
+    stmt = sqlite_insert(table)
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.c.month_key],
+            set_={"generation": table.c.generation + 1},
+        ),
+        [{"month_key": k, "generation": 1} for k in keys],
+    )
+
+
+def bump_generations(conn, keys=None):
+    """
+    Advance the data generation of the given month keys (every month when
+    None) and of ALL_MONTHS, in the caller's transaction.
+    """
+    table = DataGeneration.__table__
+    if keys is None:
+        conn.execute(
+            table.update()
+            .where(table.c.month_key >= ALL_MONTHS)
+            .values(generation=table.c.generation + 1)
+        )
+        rolled = select(CostRollup.__table__.c.month_key).distinct()
+        keys = [k for (k,) in conn.execute(rolled) if k is not None]
+        existing = {k for (k,) in conn.execute(select(table.c.month_key))}
+        keys = [k for k in keys if k not in existing]
+        if ALL_MONTHS not in existing:
+            keys.append(ALL_MONTHS)
+    else:
+        keys = list(keys) + [ALL_MONTHS]
+    if keys:
+        _advance(conn, keys)
+
+
+def bump_table_generation(conn, key: int):
+    """
+    Advance only the generation of one derived table (ANOMALIES_TABLE,
+    FORECASTS_TABLE) after rewriting it, in the caller's transaction.
+    """
+    _advance(conn, [key])
+
+
+def rollups_missing(conn) -> bool:
+    """True for a database with billing rows but no rollups (pre-rollup DBs)."""
+    table = CostRollup.__table__
+    has_rollups = conn.execute(select(table.c.id).limit(1)).first() is not None
+    has_billing = (
+        conn.execute(select(Billing.__table__.c.id).limit(1)).first() is not None
+    )
+    return has_billing and not has_rollups
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import Any, List, Literal, Optional, Dict
 
 
 class KPIResponse(BaseModel):
@@ -17,3 +17,35 @@ class AskResponse(BaseModel):
     answer: str
     sources: List[str]
     suggestions: List[str]
+
+
+class ForecastRow(BaseModel):
+    entity_type: str
+    entity: str
+    month: str
+    forecast: float
+    # null when the series has no more months than the model has terms,
+    # leaving no residuals to size the interval from
+    lower: Optional[float]
+    upper: Optional[float]
+    n_obs: int
+    model: str
+
+
+class ForecastResponse(BaseModel):
+    forecasts: List[ForecastRow]
+
+
+class KPIBatchRequest(BaseModel):
+    months: List[str] = []
+    owners: List[str] = []
+    services: List[str] = []
+    resource_groups: List[str] = []
+    group_by: List[Literal["month", "owner", "service", "resource_group"]] = ["month"]
+
+
+class KPIBatchResponse(BaseModel):
+    group_by: List[str]
+    rows: int
+    # one list per group_by dimension plus total_cost, all of length `rows`
+    columns: Dict[str, List[Any]]
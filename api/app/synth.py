@@ -0,0 +1,224 @@
+"""
+Vectorized synthetic billing/resources generator for scale testing.
+
+Rows are produced with NumPy in blocks of resources and streamed to CSV or
+to the month-partitioned Parquet store, so 10M+ row datasets never sit in
+memory. Cardinalities, seasonality, injected anomalies / duplicate rows and
+the seed are configurable; the same arguments always give the same data.
+
+Usage:
+  python -m api.app.synth --out ./data/synth --resources 1000000 --months 12
+  python -m api.app.synth --out ./data/synth --format parquet --seed 7
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+SERVICES = ["Compute", "Storage", "DB", "Networking", "AI", "Analytics"]
+REGIONS = ["eastus", "westus", "centralindia", "westeurope", "southeastasia"]
+RESOURCE_GROUPS = ["rg-prod", "rg-dev", "rg-test", "rg-staging"]
+OWNERS = ["alice", "bob", "carol"]
+ENVS = ["prod", "staging", "dev"]
+
+
+def _names(base, prefix, n):
+    """`n` names: the base list first, then numbered ones."""
+    names = list(base[:n])
+    names += [f"{prefix}-{i}" for i in range(len(names), n)]
+    return np.array(names, dtype=object)
+
+
+def _month_labels(start_month: str, months: int):
+    start = pd.Period(start_month, freq="M")
+    return [str(start + i) for i in range(months)]
+
+
+def _resource_block(seed, block, lo, hi, dims, untagged_rate, idle_rate):
+    """Attributes of resources lo..hi-1; regenerated identically from the seed."""
+    rng = np.random.default_rng([seed, 0, block])
+    n = hi - lo
+    ids = pd.Series(np.arange(lo, hi)).astype(str).str.zfill(8)
+    owners = dims["owners"][rng.integers(0, len(dims["owners"]), n)]
+    owners[rng.random(n) < untagged_rate] = None
+    return {
+        "resource_id": ("res-" + ids).to_numpy(dtype=object),
+        "service": rng.integers(0, len(dims["services"]), n),
+        "region": rng.integers(0, len(dims["regions"]), n),
+        "resource_group": rng.integers(0, len(dims["resource_groups"]), n),
+        "subscription": rng.integers(0, dims["subscriptions"], n),
+        "owner": owners,
+        "env": np.array(ENVS, dtype=object)[rng.integers(0, len(ENVS), n)],
+        "app": rng.integers(1, 50, n),
+        "base_cost": rng.lognormal(3.0, 1.0, n),
+        "unit_cost": rng.lognormal(-1.0, 0.8, n),
+        "idle": rng.random(n) < idle_rate,
+    }
+
+
+def _resources_frame(attrs):
+    app = pd.Series(attrs["app"]).astype(str)
+    return pd.DataFrame(
+        {
+            "resource_id": attrs["resource_id"],
+            "owner": attrs["owner"],
+            "env": attrs["env"],
+            "tags_json": ('{"app": "app-' + app + '"}').to_numpy(dtype=object),
+        }
+    )
+
+
+def _billing_block(seed, block, attrs, months, dims, opts):
+    """All months of one resource block as a billing frame, plus event counts."""
+    rng = np.random.default_rng([seed, 1, block])
+    n, m = len(attrs["resource_id"]), len(months)
+    month_idx = np.repeat(np.arange(m), n)
+    res_idx = np.tile(np.arange(n), m)
+
+    # yearly cycle with a per-service phase, plus multiplicative noise
+    phase = attrs["service"][res_idx] * (2 * np.pi / len(dims["services"]))
+    season = 1 + opts["seasonality"] * np.sin(2 * np.pi * month_idx / 12 + phase)
+    noise = np.clip(rng.normal(1.0, 0.1, n * m), 0.5, None)
+    unit_cost = np.round(attrs["unit_cost"][res_idx], 4) + 0.0001
+    usage = attrs["base_cost"][res_idx] * season * noise / unit_cost
+    usage[attrs["idle"][res_idx]] *= 0.001
+
+    anomalies = rng.random(n * m) < opts["anomaly_rate"]
+    usage[anomalies] *= rng.uniform(3, 10, int(anomalies.sum()))
+    usage = np.round(usage, 3)
+    cost = np.round(usage * unit_cost, 2)
+
+    frame = pd.DataFrame(
+        {
+            "invoice_month": np.array(months, dtype=object)[month_idx],
+            "account_id": "acct-1",
+            "subscription": "sub-"
+            + pd.Series(attrs["subscription"][res_idx] + 1).astype(str),
+            "service": dims["services"][attrs["service"][res_idx]],
+            "resource_group": dims["resource_groups"][attrs["resource_group"][res_idx]],
+            "resource_id": attrs["resource_id"][res_idx],
+            "region": dims["regions"][attrs["region"][res_idx]],
+            "usage_qty": usage,
+            "unit_cost": unit_cost,
+            "cost": cost,
+        }
+    )
+    dupes = np.flatnonzero(rng.random(n * m) < opts["duplicate_rate"])
+    if len(dupes):
+        frame = pd.concat([frame, frame.iloc[dupes]], ignore_index=True)
+    return frame, int(anomalies.sum()), len(dupes)
+
+
+def generate_dataset(
+    out_dir: str,
+    n_resources: int = 10_000,
+    months: int = 6,
+    start_month: str = "2025-01",
+    n_owners: int = 3,
+    n_services: int = 6,
+    n_regions: int = 3,
+    n_resource_groups: int = 4,
+    n_subscriptions: int = 1,
+    seasonality: float = 0.2,
+    anomaly_rate: float = 0.001,
+    duplicate_rate: float = 0.0,
+    untagged_rate: float = 0.05,
+    idle_rate: float = 0.05,
+    seed: int = 0,
+    fmt: str = "csv",
+    block_size: int = 100_000,
+):
+    """
+    Write resources.csv plus billing (billing.csv, or Parquet store parts
+    under out_dir/billing_parquet) with one line per resource per month.
+    Returns paths and row / anomaly / duplicate counts.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    dims = {
+        "owners": _names(OWNERS, "owner", n_owners),
+        "services": _names(SERVICES, "Service", n_services),
+        "regions": _names(REGIONS, "region", n_regions),
+        "resource_groups": _names(RESOURCE_GROUPS, "rg", n_resource_groups),
+        "subscriptions": n_subscriptions,
+    }
+    opts = {
+        "seasonality": seasonality,
+        "anomaly_rate": anomaly_rate,
+        "duplicate_rate": duplicate_rate,
+    }
+    labels = _month_labels(start_month, months)
+    resources_path = os.path.join(out_dir, "resources.csv")
+    billing_path = os.path.join(out_dir, "billing.csv")
+    store_dir = os.path.join(out_dir, "billing_parquet")
+    if fmt == "parquet":
+        from . import parquet_store
+
+        parquet_store.clear_source(billing_path, store_dir)
+
+    totals = {"rows": 0, "anomalies": 0, "duplicates": 0}
+    with open(resources_path, "w", newline="") as res_fh, open(
+        billing_path if fmt == "csv" else os.devnull, "w", newline=""
+    ) as bill_fh:
+        for block, lo in enumerate(range(0, n_resources, block_size)):
+            hi = min(lo + block_size, n_resources)
+            attrs = _resource_block(seed, block, lo, hi, dims, untagged_rate, idle_rate)
+            _resources_frame(attrs).to_csv(res_fh, header=block == 0, index=False)
+            frame, anomalies, dupes = _billing_block(
+                seed, block, attrs, labels, dims, opts
+            )
+            if fmt == "csv":
+                frame.to_csv(bill_fh, header=block == 0, index=False)
+            else:
+                parquet_store.write_partitions(frame, billing_path, block, store_dir)
+            totals["rows"] += len(frame)
+            totals["anomalies"] += anomalies
+            totals["duplicates"] += dupes
+
+    return {
+        "resources": resources_path,
+        "billing": billing_path if fmt == "csv" else store_dir,
+        "resource_rows": n_resources,
+        **totals,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", type=str, default="./data/synth")
+    parser.add_argument("--resources", type=int, default=10_000)
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--start-month", type=str, default="2025-01")
+    parser.add_argument("--owners", type=int, default=3)
+    parser.add_argument("--services", type=int, default=6)
+    parser.add_argument("--regions", type=int, default=3)
+    parser.add_argument("--resource-groups", type=int, default=4)
+    parser.add_argument("--subscriptions", type=int, default=1)
+    parser.add_argument("--seasonality", type=float, default=0.2)
+    parser.add_argument("--anomaly-rate", type=float, default=0.001)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--block-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    result = generate_dataset(
+        args.out,
+        n_resources=args.resources,
+        months=args.months,
+        start_month=args.start_month,
+        n_owners=args.owners,
+        n_services=args.services,
+        n_regions=args.regions,
+        n_resource_groups=args.resource_groups,
+        n_subscriptions=args.subscriptions,
+        seasonality=args.seasonality,
+        anomaly_rate=args.anomaly_rate,
+        duplicate_rate=args.duplicate_rate,
+        seed=args.seed,
+        fmt=args.format,
+        block_size=args.block_size,
+    )
+    print(json.dumps(result, indent=2))
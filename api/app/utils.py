@@ -1,7 +1,10 @@
 # api/app/utils.py
 import logging
+import re
 import time
 
+import pandas as pd
+
 
 # Logger
 
@@ -22,6 +25,50 @@ def sanitize_user_input(s: str) -> str:
     return out
 
 
+# Month keys
+
+
+_MONTH_RE = re.compile(r"^\s*(\d{4})-?(\d{2})")
+
+
+def month_key(value):
+    """
+    Normalized integer month (YYYYMM) for '2025-04', '2025-04-01' or
+    '202504'; None when the value has no recognizable year and month.
+    """
+    m = _MONTH_RE.match(str(value)) if value is not None else None
+    if not m or not 1 <= int(m.group(2)) <= 12:
+        return None
+    return int(m.group(1)) * 100 + int(m.group(2))
+
+
+def month_keys(values: pd.Series) -> pd.Series:
+    """Vectorized month_key(); unparsable values become None."""
+    parts = values.astype(str).str.extract(r"^\s*(\d{4})-?(\d{2})")
+    year = pd.to_numeric(parts[0], errors="coerce")
+    month = pd.to_numeric(parts[1], errors="coerce")
+    keys = (year * 100 + month).where(month.between(1, 12)).astype("Int64")
+    return pd.Series(
+        keys.to_numpy(dtype=object, na_value=None), index=values.index, dtype=object
+    )
+
+
+def format_month_key(key) -> str:
+    """202504 -> '2025-04'."""
+    return f"{key // 100:04d}-{key % 100:02d}" if key else None
+
+
+def add_months(key: int, months: int) -> int:
+    """Month key `months` months after key (before it when negative)."""
+    index = (key // 100) * 12 + key % 100 - 1 + months
+    return (index // 12) * 100 + index % 12 + 1
+
+
+def month_window(end_key: int, months: int) -> list:
+    """The `months` consecutive month keys ending at end_key, oldest first."""
+    return [add_months(end_key, -i) for i in range(months - 1, -1, -1)]
+
+
 # Timer context manager
 
 
@@ -38,7 +85,23 @@ class Timer:
 # Dummy retriever for fallback
 
 
+DUMMY_DOCS = [
+    {
+        "source": "finops_tips.md",
+        "text": "Monitor Azure cost anomalies using Cost Explorer.",
+    },
+    {
+        "source": "finops_tips.md",
+        "text": "May often has spikes due to fiscal year-end workloads.",
+    },
+    {
+        "source": "finops_tips.md",
+        "text": "Always tag resources properly to track cost allocation.",
+    },
+]
+
+
 def dummy_retrieve(query: str, k: int = 5):
-    """Return dummy answers if vector store is missing"""
+    """Return dummy documents (text / source) if vector store is missing"""
     logger.warning(" Using dummy retriever for query: %s", query)
-    return [f"dummy answer {i+1}" for i in range(k)]
+    return [dict(d) for d in DUMMY_DOCS[:k]]
@@ -1,11 +1,13 @@
 """FAISS-based vector store wrappers using sentence-transformers."""
 
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
 import os
 import pickle
 
+from . import index_factory
+from .embedding_cache import get_encoder
+
 # Model dims vary — all-MiniLM-L6-v2 -> 384-dim
 EMB_MODEL = "all-MiniLM-L6-v2"
 DIM = 384
@@ -13,12 +15,12 @@ DIM = 384
 
 class FaissStore:
     def __init__(self, dim=DIM, index_path="./infra/faiss_data/index.faiss"):
-        self.model = SentenceTransformer(EMB_MODEL)
+        self.model = get_encoder(EMB_MODEL)
         self.dim = dim
         self.index_path = index_path
         os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
         if os.path.exists(index_path):
-            self.index = faiss.read_index(index_path)
+            self.index = index_factory.read_index(index_path)
             meta_path = index_path + ".meta"
             if os.path.exists(meta_path):
                 with open(meta_path, "rb") as fh:
@@ -34,10 +36,20 @@ class FaissStore:
         embs = np.array(embs).astype("float32")
         self.index.add(embs)
         self.metadata.extend(metadatas)
+        self._maybe_upgrade()
         self._persist()
 
+    def _maybe_upgrade(self):
+        """Switch to the FINOPS_VECTOR_INDEX type once there is enough to train."""
+        if not isinstance(self.index, faiss.IndexFlat):
+            return
+        kind = index_factory.resolve_type(index_factory.INDEX_TYPE, self.index.ntotal)
+        if kind != "flat":
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+            self.index = index_factory.build_index(vectors, kind=kind)
+
     def search(self, query, top_k=5):
-        q_emb = self.model.encode([query]).astype("float32")
+        q_emb = self.model.encode([query], cache=False)
         D, I = self.index.search(q_emb, top_k)
         results = []
         for idx in I[0]:
@@ -0,0 +1,74 @@
+"""
+Runtime of the summary document builder versus the number of resources.
+
+Loads `--months` months of billing for growing resource counts into a
+throwaway SQLite database and times documents.iter_documents over all
+months at once (what the first sync does) for every summary level. Time per
+document should stay roughly flat as the resource count grows.
+
+Usage:
+  python benchmarks/bench_documents.py
+  python benchmarks/bench_documents.py --resources 2000 8000 32000 --months 3
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resources", type=int, nargs="+", default=[2000, 8000, 32000])
+    parser.add_argument("--months", type=int, default=2)
+    args = parser.parse_args()
+
+    # api.app.db creates its engines on import
+    os.environ.setdefault(
+        "FINOPS_DATABASE_URL",
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='finops-bench-'), 'bench.db')}",
+    )
+    from sqlalchemy import text
+
+    from api.app import documents
+    from api.app.db import engine
+    from api.app.etl import bulk_insert_billing, init_db
+    from api.app.utils import add_months, format_month_key
+
+    init_db()
+    rng = np.random.default_rng(0)
+    months = [format_month_key(add_months(202501, i)) for i in range(args.months)]
+    keys = [add_months(202501, i) for i in range(args.months)]
+    print(f"{'resources':>10}{'docs':>10}{'seconds':>10}{'us/doc':>10}")
+    for n in args.resources:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM billing"))
+            conn.execute(text("DELETE FROM cost_rollup"))
+        bulk_insert_billing(
+            pd.DataFrame(
+                {
+                    "invoice_month": np.repeat(months, n),
+                    "account_id": "acct-bench",
+                    "service": rng.choice(
+                        ["Compute", "Storage", "SQL"], n * len(months)
+                    ),
+                    "resource_id": np.tile([f"res-{i}" for i in range(n)], len(months)),
+                    "cost": rng.uniform(1, 100, n * len(months)),
+                }
+            )
+        )
+        t = time.perf_counter()
+        count = sum(1 for _ in documents.iter_documents(keys, documents.SUMMARY_LEVELS))
+        seconds = time.perf_counter() - t
+        print(f"{n:>10,}{count:>10,}{seconds:>10.2f}{seconds / count * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Runtime of the batched forecast fit versus the number of series.
+
+Generates trending, seasonal, noisy monthly cost series (some starting late)
+and times forecast.fit_forecasts on growing series counts. For reference it
+also times a per-series np.linalg.lstsq loop on the smallest count and
+checks both give the same forecasts.
+
+Usage:
+  python benchmarks/bench_forecast.py
+  python benchmarks/bench_forecast.py --series 1000 10000 100000 1000000 --months 24
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _series(n_series, n_months, rng):
+    t = np.arange(n_months)
+    level = rng.uniform(10, 1000, (n_series, 1))
+    trend = rng.normal(0, 0.02, (n_series, 1)) * level * t
+    season = rng.uniform(0, 0.2, (n_series, 1)) * level * np.sin(2 * np.pi * t / 12)
+    noise = rng.normal(0, 0.05, (n_series, n_months)) * level
+    cost = np.maximum(level + trend + season + noise, 0.01)
+    start = rng.integers(0, n_months // 2, n_series)
+    cost[t[None, :] < start[:, None]] = 0.0
+    return cost
+
+
+def _loop_forecasts(forecast, cost, horizon):
+    out = np.empty((len(cost), horizon))
+    for i, row in enumerate(cost):
+        start = np.flatnonzero(row > 0)[0]
+        seasonal = len(row) - start >= forecast.SEASONAL_MONTHS
+        x = forecast.design_matrix(len(row), horizon, seasonal)
+        beta = np.linalg.lstsq(x[start : len(row)], row[start:], rcond=None)[0]
+        out[i] = np.maximum(x[len(row) :] @ beta, 0)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--series", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--horizon", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # api.app.db creates its engines on import
+    os.environ.setdefault(
+        "FINOPS_DATABASE_URL",
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='finops-bench-'), 'bench.db')}",
+    )
+    from api.app import forecast
+
+    rng = np.random.default_rng(0)
+    print(f"{'series':>10}{'batched ms':>14}{'series/s':>14}")
+    for n in args.series:
+        cost = _series(n, args.months, rng)
+        runs = []
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            fitted = forecast.fit_forecasts(cost, args.horizon)
+            runs.append(time.perf_counter() - t)
+        best = min(runs)
+        print(f"{n:>10,}{best * 1000:>14.1f}{n / best:>14,.0f}")
+
+    n = args.series[0]
+    cost = _series(n, args.months, rng)
+    t = time.perf_counter()
+    looped = _loop_forecasts(forecast, cost, args.horizon)
+    loop_s = time.perf_counter() - t
+    fitted = forecast.fit_forecasts(cost, args.horizon)
+    same = np.allclose(fitted["forecast"], looped, rtol=1e-5, atol=1e-6)
+    print(
+        f"\nper-series lstsq loop on {n:,} series: {loop_s * 1000:.1f} ms "
+        f"(same forecasts: {'yes' if same else 'NO'})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Compare the KPI backends on a generated dataset.
+
+Generates billing/resources with api.app.synth, loads them into a fresh
+SQLite database and the Parquet store, then times every KPI function on
+
+  sqlite          kpi.py / crud.py on SQLite (cost_rollup tables)
+  duckdb-sqlite   DuckDB scanning the SQLite billing table (needs the
+                  DuckDB sqlite extension; skipped when it can't load)
+  duckdb-parquet  DuckDB scanning the month-partitioned Parquet store
+
+and checks that every backend returns the same numbers.
+
+Usage:
+  python benchmarks/bench_kpi_backends.py --resources 200000 --months 12
+  python benchmarks/bench_kpi_backends.py --workdir ./data/bench --reuse
+"""
+
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BACKENDS = [
+    ("sqlite", None),
+    ("duckdb-sqlite", "sqlite"),
+    ("duckdb-parquet", "parquet"),
+]
+
+
+def _prepare(workdir, n_resources, months, reuse):
+    from api.app import etl, synth
+
+    billing = os.path.join(workdir, "billing.csv")
+    store = os.path.join(workdir, "billing_parquet")
+    etl.init_db()
+    if not (reuse and os.path.exists(billing)):
+        t = time.perf_counter()
+        info = synth.generate_dataset(
+            workdir, n_resources=n_resources, months=months, seed=0
+        )
+        print(
+            f"generated {info['rows']:,} billing rows in {time.perf_counter() - t:.1f}s"
+        )
+        etl.stage_csv_to_parquet(billing, store)
+    t = time.perf_counter()
+    etl.load_csv_to_db(billing)
+    etl.load_resources_to_db(os.path.join(workdir, "resources.csv"))
+    print(f"loaded SQLite in {time.perf_counter() - t:.1f}s")
+    return store, synth._month_labels("2025-01", months)
+
+
+def _workload(months):
+    from api.app import crud, kpi
+
+    month = months[len(months) // 2]
+    return {
+        "get_cost_by_owner": lambda: kpi.get_cost_by_owner(month),
+        "monthly_trend": lambda: kpi.monthly_trend("alice"),
+        "top_service_expenditures": lambda: kpi.top_service_expenditures("net", 5),
+        "kpi_for_month": lambda: crud.kpi_for_month(month),
+    }
+
+
+def _numbers(result):
+    """Flatten a KPI result into a sorted list of floats for comparison."""
+    if isinstance(result, dict):
+        return sorted(
+            x for v in result.values() for x in _numbers(v) if not isinstance(v, str)
+        )
+    if isinstance(result, (int, float)):
+        return [float(result)]
+    if isinstance(result, str) or not hasattr(result, "__iter__"):
+        return []
+    # lists, tuples and SQLAlchemy Rows
+    return sorted(x for v in result for x in _numbers(v))
+
+
+def _same(a, b):
+    a, b = _numbers(a), _numbers(b)
+    return len(a) == len(b) and all(
+        math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-6) for x, y in zip(a, b)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resources", type=int, default=50_000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workdir", type=str, default=None)
+    parser.add_argument("--reuse", action="store_true")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="finops-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    # must be set before api.app.db creates its engines
+    db_path = os.path.join(workdir, "bench.db")
+    os.environ["FINOPS_DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from api.app import analytics
+
+    store, months = _prepare(workdir, args.resources, args.months, args.reuse)
+    workload = _workload(months)
+    analytics.STORE_DIR = store
+
+    timings, results = {}, {}
+    for name, source in BACKENDS:
+        analytics.BACKEND = "sqlite" if source is None else "duckdb"
+        analytics.SOURCE = source or analytics.SOURCE
+        analytics.reset()
+        try:
+            for fn_name, fn in workload.items():
+                result = fn()  # warm-up, and the result to compare
+                runs = []
+                for _ in range(args.repeat):
+                    t = time.perf_counter()
+                    fn()
+                    runs.append(time.perf_counter() - t)
+                results[name, fn_name] = result
+                timings[name, fn_name] = statistics.median(runs) * 1000
+        except Exception as e:
+            print(f"{name}: skipped ({type(e).__name__}: {e})")
+            continue
+    analytics.reset()
+
+    names = [
+        n for n, _ in BACKENDS if all((n, fn_name) in timings for fn_name in workload)
+    ]
+    print(f"\nmedian ms over {args.repeat} runs")
+    print(f"{'function':<26}" + "".join(f"{n:>16}" for n in names) + "   same result")
+    for fn_name in workload:
+        cells = "".join(f"{timings[n, fn_name]:>16.2f}" for n in names)
+        same = all(
+            _same(results[names[0], fn_name], results[n, fn_name]) for n in names
+        )
+        print(f"{fn_name:<26}{cells}   {'yes' if same else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Recall and latency of the vector index types in api.app.index_factory.
+
+Generates clustered embedding-like vectors (unit-normalized, like
+sentence-transformer output), builds every index type on them and reports,
+for each nprobe / efSearch setting:
+
+  build s    time to train (on a sample) and add every vector
+  recall@k   share of the exact (Flat) top-k neighbours that were returned
+  p50 / p99  single-query search latency in milliseconds
+
+Usage:
+  python benchmarks/bench_vector_index.py --vectors 200000 --dim 384
+  python benchmarks/bench_vector_index.py --types ivf_flat hnsw --nprobe 8 32 --ef 32 128
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _vectors(n, dim, clusters, rng):
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    x = centers[rng.integers(0, clusters, n)]
+    x += 0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def _latencies(index, queries, k):
+    times = []
+    for q in queries:
+        t = time.perf_counter()
+        index.search(q[None, :], k)
+        times.append(time.perf_counter() - t)
+    return np.percentile(np.array(times) * 1000, [50, 99])
+
+
+def _recall(index, queries, truth, k):
+    _, found = index.search(queries, k)
+    hits = [len(set(f) & set(t)) for f, t in zip(found, truth)]
+    return sum(hits) / (k * len(queries))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--types",
+        nargs="+",
+        default=["flat", "ivf_flat", "ivf_pq", "hnsw"],
+    )
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 64, 256])
+    args = parser.parse_args()
+
+    # api.app.db creates its engines on import
+    os.environ.setdefault(
+        "FINOPS_DATABASE_URL",
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='finops-bench-'), 'bench.db')}",
+    )
+    from api.app import index_factory
+
+    rng = np.random.default_rng(0)
+    data = _vectors(args.vectors, args.dim, args.clusters, rng)
+    queries = _vectors(args.queries, args.dim, args.clusters, rng)
+
+    exact = index_factory.build_index(data, kind="flat")
+    _, truth = exact.search(queries, args.k)
+    print(f"{args.vectors:,} vectors x {args.dim} dims, {args.queries} queries")
+    print(
+        f"{'index':<10}{'param':>14}{'build s':>10}"
+        f"{f'recall@{args.k}':>12}{'p50 ms':>10}{'p99 ms':>10}"
+    )
+
+    for kind in args.types:
+        t = time.perf_counter()
+        index = index_factory.build_index(data, kind=kind)
+        build = time.perf_counter() - t
+        if kind.startswith("ivf"):
+            settings = [("nprobe", n, {"nprobe": n}) for n in args.nprobe]
+        elif kind == "hnsw":
+            settings = [("efSearch", e, {"ef_search": e}) for e in args.ef]
+        else:
+            settings = [("exact", "", {})]
+        for name, value, params in settings:
+            index_factory.set_search_params(index, **params)
+            recall = _recall(index, queries, truth, args.k)
+            p50, p99 = _latencies(index, queries, args.k)
+            print(
+                f"{kind:<10}{f'{name}={value}' if value else name:>14}{build:>10.2f}"
+                f"{recall:>12.3f}{p50:>10.3f}{p99:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+# Point the shared database runtime and the embedding cache at throwaway
+# locations before any api.app module reads its configuration.
+_tmp = tempfile.mkdtemp(prefix="finops-tests-")
+os.environ.setdefault(
+    "FINOPS_DATABASE_URL", f"sqlite:///{os.path.join(_tmp, 'finops.db')}"
+)
+os.environ.setdefault(
+    "FINOPS_EMBEDDING_CACHE_DIR", os.path.join(_tmp, "embedding_cache")
+)
+
+import pandas as pd
+import pytest
+
+from api.app.db import engine
+from api.app.etl import bulk_insert_billing, init_db, load_resources_to_db
+from api.app.models import Anomaly, Billing, CostRollup, Forecast, Resource
+from api.app.rollups import (
+    ANOMALIES_TABLE,
+    FORECASTS_TABLE,
+    bump_generations,
+    bump_table_generation,
+)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """Create and migrate the shared test database once per session."""
+    init_db()
+
+
+@pytest.fixture(scope="session")
+def load_billing(tmp_path_factory):
+    """
+    Replace the billing, resources and derived tables of the shared test
+    database with one test's rows, so whole-table refreshes (anomalies,
+    forecasts, summary documents) only see that data. Bumps every generation
+    so cached reads of earlier tests are dropped.
+    """
+
+    def load(billing: dict, resources: dict = None):
+        with engine.begin() as conn:
+            for model in (Billing, Resource, CostRollup, Anomaly, Forecast):
+                conn.execute(model.__table__.delete())
+            bump_generations(conn)
+            bump_table_generation(conn, ANOMALIES_TABLE)
+            bump_table_generation(conn, FORECASTS_TABLE)
+        if resources is not None:
+            path = tmp_path_factory.mktemp("resources") / "resources.csv"
+            pd.DataFrame(resources).to_csv(path, index=False)
+            load_resources_to_db(str(path))
+        bulk_insert_billing(pd.DataFrame(billing))
+
+    return load
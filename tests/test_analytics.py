@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from api.app import analytics
+from api.app.crud import kpi_for_month
+from api.app.etl import (
+    init_db,
+    load_billing_files,
+    load_resources_to_db,
+    stage_csv_to_parquet,
+)
+from api.app.kpi import get_cost_by_owner, monthly_trend, top_service_expenditures
+
+
+def _as_dict(pairs):
+    return {k: pytest.approx(v) for k, v in pairs}
+
+
+@pytest.fixture(scope="module")
+def duck_data(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("duck")
+    rng = np.random.default_rng(3)
+    n = 60
+    billing = pd.DataFrame(
+        {
+            "invoice_month": rng.choice(["1998-01", "1998-02", "1998-03"], n),
+            "account_id": "acct-duck",
+            "subscription": "sub-1",
+            "service": rng.choice(["an-Networking", "an-DB", "an-Compute"], n),
+            "resource_group": rng.choice(["an-rg-1", "an-rg-2"], n),
+            "resource_id": [f"an-res-{i}" for i in range(n)],
+            "region": "eastus",
+            "usage_qty": rng.uniform(0, 100, n).round(3),
+            "unit_cost": 0.5,
+            "cost": rng.uniform(0, 50, n).round(2),
+        }
+    )
+    billing_path = tmp_path / "duck_billing.csv"
+    billing.to_csv(billing_path, index=False)
+    resources_path = tmp_path / "duck_resources.csv"
+    pd.DataFrame(
+        {
+            # the last resource has no resources row at all
+            "resource_id": billing["resource_id"].iloc[:-1],
+            "owner": rng.choice(["an-alice", "an-bob", ""], n - 1),
+        }
+    ).to_csv(resources_path, index=False)
+
+    store = tmp_path / "store"
+    init_db()
+    stage_csv_to_parquet(str(billing_path), str(store))
+    load_billing_files(str(store), workers=1)
+    load_resources_to_db(str(resources_path))
+
+    expected = {
+        "owners": get_cost_by_owner("1998-02"),
+        "trend": monthly_trend("an-alice"),
+        "top": [tuple(r) for r in top_service_expenditures("an-net", 3)],
+        "kpi": kpi_for_month("1998-02"),
+    }
+    return store, expected
+
+
+def _assert_duckdb_matches(expected):
+    analytics.reset()
+    try:
+        assert _as_dict(get_cost_by_owner("1998-02")) == _as_dict(expected["owners"])
+        trend = monthly_trend("an-alice")
+        assert [t["month"] for t in trend] == [t["month"] for t in expected["trend"]]
+        assert [t["total_cost"] for t in trend] == pytest.approx(
+            [t["total_cost"] for t in expected["trend"]]
+        )
+        top = top_service_expenditures("an-net", 3)
+        assert [r[:3] for r in top] == [r[:3] for r in expected["top"]]
+        kpi = kpi_for_month("1998-02")
+        assert kpi["total_cost"] == pytest.approx(expected["kpi"]["total_cost"])
+        assert _as_dict(kpi["by_service"].items()) == _as_dict(
+            expected["kpi"]["by_service"].items()
+        )
+        assert _as_dict(kpi["by_resource_group"].items()) == _as_dict(
+            expected["kpi"]["by_resource_group"].items()
+        )
+        assert get_cost_by_owner("not-a-month") == []
+    finally:
+        analytics.reset()
+
+
+def test_duckdb_parquet_backend_matches_sqlite(duck_data, monkeypatch):
+    store, expected = duck_data
+    monkeypatch.setattr(analytics, "BACKEND", "duckdb")
+    monkeypatch.setattr(analytics, "SOURCE", "parquet")
+    monkeypatch.setattr(analytics, "STORE_DIR", str(store))
+    _assert_duckdb_matches(expected)
+
+
+@pytest.mark.parametrize("extension", [True, False])
+def test_duckdb_sqlite_source_matches_sqlite(duck_data, monkeypatch, extension):
+    import duckdb
+
+    _, expected = duck_data
+    monkeypatch.setattr(analytics, "BACKEND", "duckdb")
+    monkeypatch.setattr(analytics, "SOURCE", "sqlite")
+    if not extension:
+        # what INSTALL sqlite raises without network access
+        def offline(con, path):
+            raise duckdb.IOException("Failed to download extension")
+
+        monkeypatch.setattr(analytics, "_attach", offline)
+    _assert_duckdb_matches(expected)
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from api.app import anomalies
+from api.app.anomalies import get_anomalies, refresh_anomalies, score_matrix
+from api.app.db import engine
+from api.app.models import Anomaly, DataGeneration
+from api.app.rollups import ALL_MONTHS, ANOMALIES_TABLE, bump_table_generation
+
+
+def test_score_matrix_flags_cost_and_unit_cost_spikes():
+    cost = np.array(
+        [
+            [10.0, 11.0, 10.0, 50.0],  # cost spike in the last month
+            [0.0, 0.0, 10.0, 60.0],  # new series: not enough history
+            [10.0, 10.0, 10.0, 10.0],  # flat cost, unit price doubles at t=2
+        ]
+    )
+    usage = np.array(
+        [[10.0, 11.0, 10.0, 50.0], [0.0, 0.0, 1.0, 6.0], [10.0, 10.0, 5.0, 5.0]]
+    )
+    scores = score_matrix(cost, usage, cost)
+
+    assert scores["cost_spike"].tolist() == [
+        [False, False, True],
+        [False, False, False],
+        [False, False, False],
+    ]
+    assert scores["unit_cost_spike"].tolist() == [
+        [False, False, False],
+        [False, False, False],
+        [False, True, False],
+    ]
+    assert scores["delta"][0, 2] == pytest.approx(40.0)
+    assert scores["pct_change"][0, 2] == pytest.approx(4.0)
+    assert scores["unit_cost_change"][2, 1] == pytest.approx(1.0)
+    assert np.isnan(scores["pct_change"][1, 0])
+
+
+def test_refresh_anomalies_persists_spikes(load_billing):
+    months = ["2024-01", "2024-02", "2024-03", "2024-04"]
+    load_billing(
+        {
+            "invoice_month": months * 2,
+            "account_id": "acct-anomaly",
+            "service": "an-Compute",
+            "resource_id": ["an-1"] * 4 + ["an-2"] * 4,
+            "usage_qty": [10.0, 10.0, 10.0, 10.0, 5.0, 5.0, 5.0, 5.0],
+            "cost": [10.0, 10.0, 10.0, 90.0, 5.0, 5.0, 5.0, 5.0],
+        },
+        resources={"resource_id": ["an-1", "an-2"], "owner": "an-owner"},
+    )
+
+    # cost and unit-cost spikes of an-1, an-Compute and an-owner
+    assert refresh_anomalies() == 6
+    found = get_anomalies(month="2024-04", kind="cost_spike")
+    assert {(a["entity_type"], a["entity"]) for a in found} == {
+        ("resource", "an-1"),
+        ("service", "an-Compute"),
+        ("owner", "an-owner"),
+    }
+    an1 = get_anomalies(month="2024-04", entity="an-1")
+    assert len(an1) == 2  # cost and unit-cost spike
+    spike = next(a for a in an1 if a["kind"] == "cost_spike")
+    assert spike["month"] == "2024-04"
+    assert spike["delta"] == pytest.approx(80.0)
+    assert spike["score"] == pytest.approx(80.0)
+    assert get_anomalies(month="2024-04", entity="an-2") == []
+    assert get_anomalies(month="not-a-month") == []
+
+
+def test_detect_anomalies_on_empty_table(monkeypatch):
+    monkeypatch.setattr(anomalies, "ANOMALY_SQL", anomalies.ANOMALY_SQL + " AND 0")
+    assert list(anomalies.detect_anomalies().columns) == anomalies.COLUMNS
+
+
+def _generations():
+    with engine.connect() as conn:
+        rows = conn.execute(select(DataGeneration.month_key, DataGeneration.generation))
+        return dict(rows.all())
+
+
+def test_refresh_anomalies_keeps_month_generations(load_billing):
+    load_billing(
+        {
+            "invoice_month": ["2024-01", "2024-02", "2024-03", "2024-04"],
+            "account_id": "acct-anomaly-gen",
+            "service": "gen-Compute",
+            "resource_id": "gen-1",
+            "usage_qty": 1.0,
+            "cost": [10.0, 10.0, 10.0, 90.0],
+        }
+    )
+    before = _generations()
+    refresh_anomalies()
+    after = _generations()
+    months = {k: g for k, g in after.items() if k >= ALL_MONTHS}
+    assert months == {k: g for k, g in before.items() if k >= ALL_MONTHS}
+    assert after[ANOMALIES_TABLE] == before.get(ANOMALIES_TABLE, 0) + 1
+
+    assert get_anomalies(entity="gen-1")
+    with engine.begin() as conn:
+        conn.execute(Anomaly.__table__.delete())
+        bump_table_generation(conn, ANOMALIES_TABLE)
+    # the table's own generation still invalidates cached reads
+    assert get_anomalies(entity="gen-1") == []
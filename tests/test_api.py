@@ -48,9 +48,81 @@ def test_monthly_trend():
     assert data["owner"] == owner
     assert "monthly_trend" in data  # must match main.py key
 
+# ------------------------
+# Test /kpi/batch endpoint
+# ------------------------
+def test_kpi_batch():
+    payload = {"months": ["2025-07", "2025-08"], "group_by": ["month", "owner"]}
+    response = client.post("/kpi/batch", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["group_by"] == ["month", "owner"]
+    columns = data["columns"]
+    assert set(columns) == {"month", "owner", "total_cost"}
+    assert all(len(col) == data["rows"] for col in columns.values())
+    assert set(columns["month"]) <= {"2025-07", "2025-08"}
+
+    bad = client.post("/kpi/batch", json={"group_by": ["region"]})
+    assert bad.status_code == 422
+
+# ------------------------
+# Test /top_resources endpoint
+# ------------------------
+def test_top_resources():
+    response = client.get("/top_resources?by=service&by=region&n=2")
+    assert response.status_code == 200
+    top = response.json()["top"]
+    assert set(top) == {"service", "region"}
+    for rows in top.values():
+        assert all(1 <= r["rank"] <= 2 for r in rows)
+
+    assert client.get("/top_resources?by=colour").status_code == 422
+
+# ------------------------
+# Test /anomalies endpoint
+# ------------------------
+def test_anomalies():
+    response = client.get("/anomalies?kind=cost_spike&limit=5")
+    assert response.status_code == 200
+    rows = response.json()["anomalies"]
+    assert len(rows) <= 5
+    assert all(r["kind"] == "cost_spike" for r in rows)
+
+# ------------------------
+# Test /forecast endpoint
+# ------------------------
+def test_forecast():
+    response = client.get("/forecast?entity_type=service&limit=6")
+    assert response.status_code == 200
+    rows = response.json()["forecasts"]
+    assert len(rows) <= 6
+    for r in rows:
+        assert r["entity_type"] == "service"
+        # short series have no interval
+        if r["lower"] is not None:
+            assert r["lower"] <= r["forecast"] <= r["upper"]
+
 # ------------------------
 # Test /ask endpoint
 # ------------------------
+def test_retrieve_context_widens_scope_month_first(monkeypatch):
+    from api.app import main
+
+    calls = []
+
+    def query(question, top_k=5, month=None, owner=None, **filters):
+        calls.append((month, owner))
+        return [{"text": "doc", "source": "x"}] if owner is None and month else []
+
+    monkeypatch.setattr(main.retriever, "query", query)
+    docs = main.retrieve_context("cost for nobody in August 2025", "2025-08", "nobody")
+    assert docs == [{"text": "doc", "source": "x"}]
+    assert calls == [("2025-08", "nobody"), ("2025-08", None)]
+
+    calls.clear()
+    assert main.retrieve_context("anything", owner="nobody") == []
+    assert calls == [(None, "nobody"), (None, None)]
+
 def test_ask():
     payload = {"question": "Show cost by owner alice in August 2025"}
     response = client.post("/ask", json=payload)
@@ -61,4 +133,5 @@ def test_ask():
     assert "table" in data
     assert "trend" in data
     assert "top_service" in data
+    assert "anomalies" in data
     assert "suggestions" in data
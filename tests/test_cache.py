@@ -0,0 +1,66 @@
+import pandas as pd
+
+from api.app import cache
+from api.app.cache import KPICache
+from api.app.etl import bulk_insert_billing
+from api.app.kpi import get_cost_by_owner
+
+
+def _billing(month, cost):
+    return pd.DataFrame(
+        {
+            "invoice_month": [month],
+            "account_id": "acct-cache",
+            "resource_id": "ca-res-1",
+            "cost": [cost],
+        }
+    )
+
+
+def test_cache_hits_and_invalidates_only_touched_months(load_billing):
+    load_billing(
+        pd.concat([_billing("2024-03", 2.0), _billing("2024-04", 7.0)]),
+        resources={"resource_id": ["ca-res-1"], "owner": ["ca-owner"]},
+    )
+    cache.kpi_cache.clear()
+    start = cache.stats()
+
+    assert get_cost_by_owner("2024-03") == [("ca-owner", 2.0)]
+    assert get_cost_by_owner("2024-03-01") == [("ca-owner", 2.0)]
+    april = get_cost_by_owner("2024-04")
+    stats = cache.stats()
+    assert stats["misses"] - start["misses"] == 2
+    assert stats["hits"] - start["hits"] == 1
+
+    # a load of March leaves the cached April result alone
+    bulk_insert_billing(_billing("2024-03", 3.0).assign(region="other"))
+    assert get_cost_by_owner("2024-03") == [("ca-owner", 5.0)]
+    assert get_cost_by_owner("2024-04") is april
+    assert cache.stats()["invalidations"] > stats["invalidations"]
+
+
+def test_lru_bounds_entries_and_bytes():
+    lru = KPICache(max_entries=2, max_bytes=10_000)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    lru.get("a")
+    lru.put("c", 3)
+    assert lru.get("b") == (False, None)
+    assert lru.get("a") == (True, 1)
+    assert lru.stats()["evictions"] == 1
+
+    lru.put("big", "x" * 20_000)
+    assert lru.get("big") == (False, None)
+    assert lru.stats()["uncacheable"] == 1
+    assert lru.stats()["bytes"] <= 10_000
+
+
+def test_generations_of_an_unmigrated_database(tmp_path, monkeypatch):
+    from api.app.db import make_engine
+
+    monkeypatch.setattr(
+        cache, "read_engine", make_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    )
+    monkeypatch.setattr(cache, "data_version", lambda: None)
+    # no data_generations table yet: every generation reads as 0
+    assert KPICache().generations() == {}
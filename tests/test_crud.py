@@ -0,0 +1,62 @@
+import pytest
+
+from api.app.crud import (
+    detect_idle_resources,
+    iter_idle_resources,
+    iter_missing_owner_tags,
+    missing_owner_tags,
+)
+from api.app.utils import month_window
+
+
+@pytest.fixture
+def idle_data(load_billing):
+    load_billing(
+        {
+            # 2023-11 .. 2024-01: idle-1 idle all three months, idle-2 only
+            # in the last two, busy used every month
+            "invoice_month": ["2023-11", "2023-12", "2024-01"] * 3,
+            "account_id": "acct-idle",
+            "subscription": [f"sub-idle-{i}" for i in range(9)],
+            "service": "Compute",
+            "resource_group": ["rg-idle"] * 8 + ["unknown"],
+            "resource_id": ["idle-1"] * 3 + ["idle-2"] * 3 + ["busy"] * 3,
+            "usage_qty": [0.0, 0.5, 0.2, 9.0, 0.0, 1.0, 5.0, 5.0, 5.0],
+            "cost": [10.0, 10.0, 10.0, 40.0, 20.0, 20.0, 7.0, 7.0, 7.0],
+        }
+    )
+
+
+def test_month_window_crosses_years():
+    assert month_window(199401, 3) == [199311, 199312, 199401]
+    assert month_window(199406, 1) == [199406]
+
+
+def test_detect_idle_resources_windows_and_pages(idle_data):
+    one = detect_idle_resources(month="2024-01")
+    assert [r["resource_id"] for r in one] == ["idle-2", "idle-1"]
+    assert one[0]["cost"] == pytest.approx(20.0)
+    assert one[0]["estimated_saving"] == pytest.approx(10.0)
+    assert one[0]["source"].startswith("billing:")
+
+    two = detect_idle_resources(month="2024-01", months=2)
+    assert [(r["resource_id"], r["cost"]) for r in two] == [
+        ("idle-2", 40.0),
+        ("idle-1", 20.0),
+    ]
+    three = detect_idle_resources(month="2024-01", months=3)
+    assert [(r["resource_id"], r["months_idle"]) for r in three] == [("idle-1", 3)]
+    assert three[0]["estimated_saving"] == pytest.approx(15.0)
+
+    page = detect_idle_resources(month="2024-01", months=2, limit=1, offset=1)
+    assert [r["resource_id"] for r in page] == ["idle-1"]
+    assert list(iter_idle_resources(month="2024-01", months=2)) == two
+    assert detect_idle_resources(month="not-a-month") == []
+
+
+def test_missing_owner_tags_pages(idle_data):
+    tags = missing_owner_tags(month="2024-01")
+    assert [r["resource_id"] for r in tags] == ["busy"]
+    assert tags[0]["cost"] == pytest.approx(7.0)
+    assert list(iter_missing_owner_tags("2024-01")) == tags
+    assert missing_owner_tags(month="2024-01", offset=1) == []
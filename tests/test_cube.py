@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from api.app import analytics, cube
+from api.app.etl import bulk_insert_billing
+from api.app.kpi import get_cost_by_owner, monthly_trend, top_service_expenditures
+
+
+@pytest.fixture
+def cube_data(load_billing):
+    rng = np.random.default_rng(5)
+    n = 80
+    billing = pd.DataFrame(
+        {
+            "invoice_month": rng.choice(["2024-01", "2024-02", "2024-03"], n),
+            "account_id": "acct-cube",
+            "service": rng.choice(["cb-Networking", "cb-DB", "cb-network-lb"], n),
+            "resource_group": "cb-rg",
+            "resource_id": rng.choice([f"cb-res-{i}" for i in range(20)], n),
+            "region": [f"r{i}" for i in range(n)],
+            "cost": rng.uniform(0, 40, n).round(2),
+        }
+    )
+    owners = pd.DataFrame(
+        {
+            "resource_id": [f"cb-res-{i}" for i in range(19)],
+            "owner": rng.choice(["cb-alice", "cb-bob", "cb-carol"], 19),
+        }
+    )
+    load_billing(billing, resources=owners)
+    return billing.merge(owners, on="resource_id")
+
+
+def _sql_and_cube(fn, monkeypatch):
+    expected = fn()
+    monkeypatch.setattr(analytics, "BACKEND", "cube")
+    try:
+        return expected, fn()
+    finally:
+        monkeypatch.setattr(analytics, "BACKEND", "sqlite")
+
+
+def test_cube_matches_sql_path(cube_data, monkeypatch):
+    cube.reset()
+    sql, got = _sql_and_cube(lambda: get_cost_by_owner("2024-02"), monkeypatch)
+    assert [o for o, _ in got] == [o for o, _ in sql]
+    assert [c for _, c in got] == pytest.approx([c for _, c in sql])
+
+    sql, got = _sql_and_cube(lambda: monthly_trend("cb-bob"), monkeypatch)
+    assert [t["month"] for t in got] == [t["month"] for t in sql]
+    assert [t["total_cost"] for t in got] == pytest.approx(
+        [t["total_cost"] for t in sql]
+    )
+
+    sql, got = _sql_and_cube(lambda: top_service_expenditures("CB-NET", 4), monkeypatch)
+    assert [tuple(r)[:3] for r in got] == [tuple(r)[:3] for r in sql]
+    assert [r[3] for r in got] == pytest.approx([r[3] for r in sql])
+
+
+def test_cube_owner_and_service_leaders(cube_data):
+    month = cube_data[cube_data["invoice_month"] == "2024-03"]
+    by_owner = month.groupby("owner")["cost"].sum()
+    best = cube.get_cube(refresh=True).highest_paid_owner("2024-03")
+    assert best == {"Owner": by_owner.idxmax(), "Cost": pytest.approx(by_owner.max())}
+
+    alice = cube_data[cube_data["owner"] == "cb-alice"]
+    by_service = alice[alice["invoice_month"] == "2024-01"].groupby("service")
+    top = cube.get_cube().most_used_service("CB-ALI", "2024-01")
+    assert top == {
+        "Service": by_service["cost"].sum().idxmax(),
+        "Cost": pytest.approx(by_service["cost"].sum().max()),
+    }
+    assert cube.get_cube().most_used_service("nobody-at-all") is None
+
+
+def test_cube_reloads_after_etl_and_reports_memory(cube_data):
+    before = cube.get_cube()
+    bulk_insert_billing(
+        pd.DataFrame(
+            {
+                "invoice_month": "2024-04",
+                "account_id": "acct-cube",
+                "resource_id": ["cb-res-0"],
+                "cost": [1.0],
+            }
+        )
+    )
+    after = cube.get_cube()
+    assert after is not before and len(after) == len(before) + 1
+
+    report = cube.memory_report()
+    assert report["rows"] == len(after)
+    assert report["columns"]["cost"] == 8 * len(after)
+    assert report["total_bytes"] > sum(report["columns"].values())
+
+
+def test_cube_top_n_per_group_matches_sql(cube_data, monkeypatch):
+    from api.app.kpi import top_n_per_group
+
+    call = lambda: top_n_per_group(("service", "owner", "region"), 2, "2024-02")
+    sql, got = _sql_and_cube(call, monkeypatch)
+    for dim in sql:
+        strip = lambda rows: [
+            (r["group"], r["rank"], r["resource_id"], r["owner"]) for r in rows
+        ]
+        assert strip(got[dim]) == strip(sql[dim])
+        assert [r["total_cost"] for r in got[dim]] == pytest.approx(
+            [r["total_cost"] for r in sql[dim]]
+        )
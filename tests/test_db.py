@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from api.app.db import make_engine
+
+
+def test_sqlite_runtime_uses_wal_and_read_only_readers(tmp_path):
+    url = f"sqlite:///{tmp_path / 'nested' / 'runtime.db'}"
+    writer = make_engine(url)
+    reader = make_engine(url, read_only=True)
+
+    with writer.begin() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+
+    with reader.connect() as conn:
+        assert conn.execute(text("SELECT x FROM t")).scalar() == 1
+        with pytest.raises(OperationalError):
+            conn.execute(text("INSERT INTO t VALUES (2)"))
+
+    # an open write transaction doesn't block readers
+    with writer.begin() as wconn:
+        wconn.execute(text("INSERT INTO t VALUES (3)"))
+        with reader.connect() as rconn:
+            assert rconn.execute(text("SELECT COUNT(*) FROM t")).scalar() == 1
+    writer.dispose()
+    reader.dispose()
+
+
+def test_streaming_helpers_bound_batches_and_match_full_reads():
+    import pandas as pd
+    from api.app.db import (
+        get_billing_rows,
+        iter_billing_batches,
+        iter_billing_rows,
+    )
+    from api.app.etl import bulk_insert_billing, init_db
+
+    init_db()
+    bulk_insert_billing(
+        pd.DataFrame(
+            {
+                "invoice_month": "1997-01",
+                "account_id": "acct-stream",
+                "resource_id": [f"st-{i}" for i in range(25)],
+                "cost": 1.0,
+            }
+        )
+    )
+    full = get_billing_rows()
+    batches = list(iter_billing_batches(batch_size=7))
+    assert all(len(b["resource_id"]) <= 7 for b in batches)
+    assert sum(len(b["cost"]) for b in batches) == len(full)
+    assert next(iter_billing_rows(batch_size=7)) == full[0]
@@ -0,0 +1,99 @@
+import pytest
+
+from api.app import documents
+from api.app.documents import affected_months, iter_documents, summary_doc_id
+
+
+@pytest.fixture(scope="module")
+def summary_data(load_billing):
+    load_billing(
+        {
+            "invoice_month": ["2023-11", "2023-12", "2024-01", "2024-01", "2024-01"],
+            "account_id": "acct-docs",
+            "subscription": "sub-docs",
+            "service": "doc-Compute",
+            "resource_group": "rg-docs",
+            "resource_id": ["doc-2", "doc-1", "doc-1", "doc-1", "doc-2"],
+            "region": ["westus", "westus", "westus", "eastus", "westus"],
+            "usage_qty": [3.0, 1.0, 1.0, 2.0, 4.0],
+            "cost": [7.0, 10.0, 5.0, 10.0, 20.0],
+        },
+        resources={
+            "resource_id": ["doc-1", "doc-2"],
+            "owner": "doc-owner",
+            "env": "prod",
+        },
+    )
+
+
+def test_affected_months_include_the_following_month():
+    assert affected_months([202312], ("resource",)) == [202312, 202401]
+    assert affected_months([202312], ("row",)) == [202312]
+
+
+def test_summary_documents_aggregate_months_with_deltas(summary_data):
+    docs = {
+        d["id"]: d for d in iter_documents([202401], ("resource", "owner", "service"))
+    }
+    resource = docs[summary_doc_id("resource", "doc-1", 202401)]
+    assert resource["month_key"] == 202401
+    assert resource["source"] == "summary:resource"
+    assert resource["owner"] == "doc-owner"
+    assert resource["env"] == "prod"
+    assert resource["services"] == ("doc-Compute",)
+    assert "cost $15.00 over 2 billing lines" in resource["text"]
+    assert "up $5.00 (+50.0%) from $10.00 in 2023-12" in resource["text"]
+
+    # doc-2 last had cost in 2023-11, two months back: no delta
+    new = docs[summary_doc_id("resource", "doc-2", 202401)]
+    assert "new since 2023-12" in new["text"]
+
+    owner = docs[summary_doc_id("owner", "doc-owner", 202401)]
+    assert "Owner doc-owner in 2024-01: total cost $35.00" in owner["text"]
+    assert "up $25.00" in owner["text"]
+
+    service = docs[summary_doc_id("service", "doc-Compute", 202401)]
+    assert "across 1 owners" in service["text"]
+    assert service["owner"] is None
+
+
+def test_row_documents_are_optional(summary_data):
+    rows = list(iter_documents([202312], ("row",)))
+    assert len(rows) == 1
+    assert rows[0]["source"] == "billing+resources"
+    assert "Resource ID: doc-1" in rows[0]["text"]
+    assert len(list(iter_documents([202312], ("resource",)))) == 1
+
+    with pytest.raises(ValueError):
+        list(iter_documents([202312], ("rows",)))
+    assert documents.count_documents(("row",)) == 5
+    assert documents.count_documents(("resource",)) == 4
+
+
+def test_metadata_index_selects_matching_documents():
+    index = documents.MetadataIndex(
+        {
+            1: {
+                "month_key": 202401,
+                "owner": "Ann",
+                "services": ("VM",),
+                "env": "prod",
+            },
+            2: {"month_key": 202401, "owner": None, "services": ("VM", "Disk")},
+            3: {
+                "month_key": 202402,
+                "owner": "ann",
+                "services": ("Disk",),
+                "env": "dev",
+            },
+            4: {"month_key": None, "owner": "ann", "services": ()},
+        }
+    )
+    assert index.select() is None
+    assert index.select(month="2024-01").tolist() == [1, 2]
+    assert index.select(owner="ANN").tolist() == [1, 3, 4]
+    assert index.select(month=202401, owner="ann").tolist() == [1]
+    assert index.select(service="disk").tolist() == [2, 3]
+    assert index.select(owner="ann", env="dev").tolist() == [3]
+    assert index.select(owner="bob").tolist() == []
+    assert index.select(month="not-a-month").tolist() == []
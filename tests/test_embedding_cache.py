@@ -0,0 +1,77 @@
+import numpy as np
+
+from api.app.embedding_cache import CachedEncoder, EmbeddingCache
+
+
+class CountingModel:
+    """Deterministic 4-d 'embeddings' that record what was encoded."""
+
+    def __init__(self):
+        self.seen = []
+
+    def encode(self, texts, **kwargs):
+        self.seen.extend(texts)
+        return np.array([[len(t), t.count("a"), ord(t[0]), 1.0] for t in texts])
+
+
+def test_encoder_embeds_each_text_once(tmp_path):
+    model = CountingModel()
+    encoder = CachedEncoder("test/model", cache_dir=str(tmp_path), model=model)
+    # nothing is written until the first miss
+    assert not (tmp_path / "test_model").exists()
+
+    first = encoder.encode(["alpha", "beta", "alpha"])
+    assert first.dtype == np.float32 and first.shape == (3, 4)
+    assert model.seen == ["alpha", "beta"] or model.seen == ["beta", "alpha"]
+    np.testing.assert_array_equal(first[0], first[2])
+
+    second = encoder.encode(["beta", "gamma"])
+    assert sorted(model.seen) == ["alpha", "beta", "gamma"]
+    np.testing.assert_array_equal(second[0], first[1])
+    assert encoder.cache.hits == 1 and encoder.cache.misses == 4
+
+    encoder.encode(["delta"], cache=False)
+    assert len(encoder.cache) == 3
+
+
+def test_cache_survives_reopen_and_torn_writes(tmp_path):
+    model = CountingModel()
+    CachedEncoder("m", cache_dir=str(tmp_path), model=model).encode(["a1", "b22"])
+    expected = model.encode(["a1", "b22"]).astype(np.float32)
+
+    # a crash after writing vectors but before their keys
+    cache = EmbeddingCache("m", str(tmp_path))
+    with open(cache._vectors_path, "ab") as f:
+        f.write(np.ones(6, dtype=np.float32).tobytes())
+
+    model = CountingModel()
+    reopened = CachedEncoder("m", cache_dir=str(tmp_path), model=model)
+    assert len(reopened.cache) == 2
+    np.testing.assert_array_equal(reopened.encode(["b22", "a1"]), expected[::-1])
+    assert model.seen == []
+    reopened.encode(["c333"])
+    assert len(EmbeddingCache("m", str(tmp_path))) == 3
+    np.testing.assert_array_equal(
+        EmbeddingCache("m", str(tmp_path)).get_or_compute(["a1"], None), expected[:1]
+    )
+
+
+def test_caches_shared_by_two_writers_stay_consistent(tmp_path):
+    # two handles on one directory stand in for the API and build_index.py
+    model = CountingModel()
+    first = CachedEncoder("shared", cache_dir=str(tmp_path), model=model)
+    second = CachedEncoder("shared", cache_dir=str(tmp_path), model=model)
+    expected = model.encode(["apple", "banana", "cherry"]).astype(np.float32)
+    model.seen.clear()
+
+    first.encode(["apple"])
+    # second's in-memory index predates that append; it must not overwrite it
+    second.encode(["banana"])
+    first.encode(["cherry"])
+
+    np.testing.assert_array_equal(
+        second.encode(["apple", "banana", "cherry"]), expected
+    )
+    np.testing.assert_array_equal(first.encode(["banana", "apple"]), expected[1::-1])
+    assert model.seen == ["apple", "banana", "cherry"]
+    assert len(EmbeddingCache("shared", str(tmp_path))) == 3
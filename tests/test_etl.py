@@ -1,7 +1,17 @@
 import os
 import pytest
-from api.app.etl import generate_sample, init_db, load_csv_to_db, load_resources_to_db, SessionLocal
-from api.app.models import Billing, Resource
+from api.app.etl import (
+    generate_sample,
+    init_db,
+    load_csv_to_db,
+    load_resources_to_db,
+    load_billing_files,
+    billing_frame,
+    bulk_insert_billing,
+    SessionLocal,
+)
+from api.app import etl
+from api.app.models import Billing, BillingStaging, IngestManifest, Resource
 import pandas as pd
 import json
 
@@ -58,3 +68,332 @@ def test_generate_and_load(tmp_path):
         assert count_res > 0, "No rows inserted in Resource table"
     finally:
         session.close()
+
+
+def test_billing_frame_matches_row_loader_coercion():
+    raw = pd.DataFrame(
+        {
+            "invoice_month": ["2025-09", "2025-09"],
+            "service": ["Compute", None],
+            "resource_id": ["res-1", "res-2"],
+            "usage_qty": [1, 2.5],
+            "unit_cost": [0.5, 1.0],
+            "cost": [0.5, 2.5],
+        }
+    )
+    frame = billing_frame(raw)
+    assert list(frame["service"]) == ["Compute", "nan"]
+    assert list(frame["account_id"]) == ["", ""]
+    assert frame["usage_qty"].tolist() == [1.0, 2.5]
+
+
+def test_bulk_insert_reports_throughput(tmp_path):
+    billing_path = tmp_path / "bulk_billing.csv"
+    generate_sample(str(billing_path), months=1, rows_per_month=7)
+    init_db()
+    stats = bulk_insert_billing(pd.read_csv(billing_path), batch_size=3)
+    assert stats["rows"] == 7
+    assert stats["rows_per_sec"] > 0
+
+
+def _write_billing(path, account, rows):
+    df = pd.DataFrame(
+        {
+            "invoice_month": ["2025-07"] * rows,
+            "account_id": [account] * rows,
+            "subscription": ["sub-1"] * rows,
+            "service": ["Compute"] * rows,
+            "resource_group": ["rg-dev"] * rows,
+            "resource_id": [f"{account}-{i % (rows - 1)}" for i in range(rows)],
+            "region": ["eastus"] * rows,
+            "usage_qty": [1.0] * rows,
+            "unit_cost": [2.0] * rows,
+            "cost": [2.0] * rows,
+        }
+    )
+    df.to_csv(path, index=False)
+
+
+def _count_account(account):
+    session = SessionLocal()
+    try:
+        return session.query(Billing).filter(Billing.account_id == account).count()
+    finally:
+        session.close()
+
+
+def test_chunked_load_flags_cross_chunk_duplicates(tmp_path):
+    path = tmp_path / "chunked.csv"
+    _write_billing(path, "acct-chunked", 10)
+    init_db()
+    # the only repeated line is the first and last row, in different chunks
+    checks = load_csv_to_db(str(path), chunk_size=3)
+    assert checks == ["duplicate_row"]
+    # the repeated line shares its natural key, so it is stored once
+    assert _count_account("acct-chunked") == 9
+
+
+def test_chunked_load_resumes_from_checkpoint(tmp_path, monkeypatch):
+    path = tmp_path / "resume.csv"
+    _write_billing(path, "acct-resume", 10)
+    init_db()
+
+    real_insert = etl._insert_billing
+    calls = {"n": 0}
+
+    def crash_on_third_chunk(conn, frame, *args):
+        calls["n"] += 1
+        if calls["n"] == 3:
+            raise RuntimeError("simulated crash")
+        real_insert(conn, frame, *args)
+
+    monkeypatch.setattr(etl, "_insert_billing", crash_on_third_chunk)
+    with pytest.raises(RuntimeError):
+        load_csv_to_db(str(path), chunk_size=3)
+    session = SessionLocal()
+    try:
+        staged = (
+            session.query(BillingStaging)
+            .filter(BillingStaging.account_id == "acct-resume")
+            .count()
+        )
+    finally:
+        session.close()
+    assert staged == 6
+
+    monkeypatch.setattr(etl, "_insert_billing", real_insert)
+    checks = load_csv_to_db(str(path), chunk_size=3)
+    assert _count_account("acct-resume") == 9
+    assert checks == ["duplicate_row"]
+
+
+def test_resource_upsert_skips_unchanged_rows(tmp_path):
+    init_db()
+    path = tmp_path / "resources.csv"
+    rows = [
+        {"resource_id": "upsert-a", "owner": "alice", "env": "dev", "tags_json": "{}"},
+        {"resource_id": "upsert-b", "owner": "bob", "env": "dev", "tags_json": "{}"},
+    ]
+    pd.DataFrame(rows).to_csv(path, index=False)
+    # reset the two rows in case the shared DB already holds them
+    session = SessionLocal()
+    session.query(Resource).filter(Resource.resource_id.like("upsert-%")).delete(
+        synchronize_session=False
+    )
+    session.commit()
+    session.close()
+
+    msg = load_resources_to_db(str(path))
+    assert "inserted=2, updated=0, unchanged=0" in msg
+
+    rows[1]["owner"] = "carol"
+    rows.append({"resource_id": "upsert-c", "owner": "dan", "env": "prod", "tags_json": "{}"})
+    pd.DataFrame(rows).to_csv(path, index=False)
+    msg = load_resources_to_db(str(path))
+    assert "inserted=1, updated=1, unchanged=1" in msg
+
+    session = SessionLocal()
+    try:
+        assert session.get(Resource, "upsert-b").owner == "carol"
+    finally:
+        session.close()
+
+
+def test_reload_is_idempotent_and_replaces_changed_months(tmp_path, monkeypatch):
+    path = tmp_path / "partitions.csv"
+    df = pd.DataFrame(
+        {
+            "invoice_month": ["2024-01", "2024-01", "2024-02"],
+            "account_id": ["acct-parts"] * 3,
+            "resource_id": ["p-1", "p-2", "p-1"],
+            "service": ["Compute"] * 3,
+            "cost": [1.0, 2.0, 3.0],
+        }
+    )
+    df.to_csv(path, index=False)
+    init_db()
+    load_csv_to_db(str(path))
+    load_csv_to_db(str(path))
+    assert _count_account("acct-parts") == 3
+
+    swapped = []
+    real_swap = etl._billing_upsert_from_staging
+    monkeypatch.setattr(
+        etl,
+        "_billing_upsert_from_staging",
+        lambda source, month: swapped.append(month) or real_swap(source, month),
+    )
+    df.loc[2, "cost"] = 5.0
+    df.to_csv(path, index=False)
+    load_csv_to_db(str(path))
+    assert swapped == ["2024-02"]
+
+    session = SessionLocal()
+    try:
+        costs = sorted(
+            c for (c,) in session.query(Billing.cost).filter(
+                Billing.account_id == "acct-parts"
+            )
+        )
+        manifest = (
+            session.query(IngestManifest)
+            .filter(IngestManifest.source == str(path.resolve()))
+            .count()
+        )
+    finally:
+        session.close()
+    assert costs == [1.0, 2.0, 5.0]
+    assert manifest == 2
+
+
+def test_migrate_dedupes_legacy_billing(tmp_path):
+    from sqlalchemy import create_engine, text
+    from api.app.migrations import migrate
+    from api.app.models import Base
+
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE billing (id INTEGER PRIMARY KEY, invoice_month TEXT, "
+                "account_id TEXT, subscription TEXT, service TEXT, "
+                "resource_group TEXT, resource_id TEXT, region TEXT, "
+                "usage_qty FLOAT, unit_cost FLOAT, cost FLOAT)"
+            )
+        )
+        for month in ["2025-04", "2025-04", "2025-13", "2025-00"]:
+            conn.execute(
+                text(
+                    "INSERT INTO billing (invoice_month, account_id, subscription, "
+                    "service, resource_group, resource_id, region, usage_qty, "
+                    "unit_cost, cost) VALUES (:m, 'a', 's', 'DB', 'rg', "
+                    "'r-1', 'eastus', 1, 1, 1)"
+                ),
+                {"m": month},
+            )
+    Base.metadata.create_all(legacy)
+    migrate(legacy)
+    migrate(legacy)
+    with legacy.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM billing")).scalar() == 3
+        assert conn.execute(text("SELECT source_file FROM billing")).scalar() is None
+        # invalid months get no key, as utils.month_key gives them none
+        assert conn.execute(
+            text("SELECT invoice_month, month_key FROM billing ORDER BY id")
+        ).all() == [("2025-04", 202504), ("2025-13", None), ("2025-00", None)]
+        assert conn.execute(
+            text("SELECT cost FROM cost_rollup WHERE month_key = 202504")
+        ).all() == [(1.0,)]
+        plan = conn.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT SUM(cost) FROM billing "
+                "WHERE month_key = 202504"
+            )
+        ).all()
+        assert "ix_billing_month_resource_cost" in str(plan)
+
+
+def test_invoice_month_spellings_share_the_natural_key(tmp_path):
+    init_db()
+    for i, month in enumerate(["2025-08", "2025-08-01"]):
+        _write_billing(tmp_path / f"spelling-{i}.csv", "acct-spelling", 3)
+        df = pd.read_csv(tmp_path / f"spelling-{i}.csv")
+        df.assign(invoice_month=month).to_csv(
+            tmp_path / f"spelling-{i}.csv", index=False
+        )
+        load_csv_to_db(str(tmp_path / f"spelling-{i}.csv"))
+
+    session = SessionLocal()
+    try:
+        months = {
+            m
+            for (m,) in session.query(Billing.invoice_month).filter(
+                Billing.account_id == "acct-spelling"
+            )
+        }
+    finally:
+        session.close()
+    assert months == {"2025-08"}
+    assert _count_account("acct-spelling") == 2
+
+
+def test_migrate_normalizes_legacy_invoice_months(tmp_path):
+    from sqlalchemy import create_engine, text
+    from api.app.migrations import migrate
+    from api.app.models import Base
+
+    legacy = create_engine(f"sqlite:///{tmp_path / 'spellings.db'}")
+    Base.metadata.create_all(legacy)
+    with legacy.begin() as conn:
+        for month, cost in [("2025-04", 1), ("2025-04-01", 1), ("2025-05-01", 2)]:
+            conn.execute(
+                text(
+                    "INSERT INTO billing (invoice_month, month_key, account_id, "
+                    "subscription, service, resource_group, resource_id, region, "
+                    "usage_qty, unit_cost, cost) VALUES (:m, :k, 'a', 's', 'DB', "
+                    "'rg', 'r-1', 'eastus', 1, 1, :c)"
+                ),
+                {"m": month, "k": int(month[:4] + month[5:7]), "c": cost},
+            )
+    migrate(legacy)
+    with legacy.connect() as conn:
+        rows = conn.execute(
+            text("SELECT invoice_month FROM billing ORDER BY invoice_month")
+        ).all()
+        assert rows == [("2025-04",), ("2025-05",)]
+        assert conn.execute(
+            text("SELECT month_key, cost FROM cost_rollup ORDER BY month_key")
+        ).all() == [(202504, 1.0), (202505, 2.0)]
+
+
+def test_month_key_normalization():
+    from api.app.utils import format_month_key, month_key, month_keys
+
+    assert month_key("2025-04") == month_key("2025-04-01") == 202504
+    assert month_key("202504") == 202504
+    assert month_key("n/a") is None and month_key(None) is None
+    assert list(month_keys(pd.Series(["2025-04", None, "2025-12-31"]))) == [
+        202504,
+        None,
+        202512,
+    ]
+    assert format_month_key(202504) == "2025-04"
+
+
+def test_load_billing_files_in_parallel(tmp_path):
+    init_db()
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    for i in range(3):
+        _write_billing(exports / f"sub-{i}.csv", f"acct-multi-{i}", 4)
+    (exports / "broken.csv").write_text("account_id,cost\nacct-x,1.0\n")
+
+    result = load_billing_files(str(exports), workers=2, chunk_size=2)
+    by_name = {os.path.basename(f["path"]): f for f in result["files"]}
+    assert by_name["broken.csv"]["status"] == "failed"
+    assert all(by_name[f"sub-{i}.csv"]["status"] == "loaded" for i in range(3))
+    assert result["summary"]["loaded"] == 3
+    assert result["summary"]["rows"] == 12
+    assert all(_count_account(f"acct-multi-{i}") == 3 for i in range(3))
+
+    again = load_billing_files(str(exports), workers=2)
+    assert again["summary"]["skipped"] == 3
+
+
+def _dying_worker(plan, chunk_size, queue):
+    os._exit(1)  # like an OOM kill: no "done" or "error" message
+
+
+def test_load_billing_files_fails_files_of_dead_workers(tmp_path, monkeypatch):
+    init_db()
+    exports = tmp_path / "dead"
+    exports.mkdir()
+    _write_billing(exports / "killed.csv", "acct-killed", 2)
+    monkeypatch.setattr(etl, "_parse_worker", _dying_worker)
+    monkeypatch.setattr(etl, "WRITER_POLL_SECONDS", 0.1)
+
+    result = load_billing_files(str(exports), workers=1)
+    assert result["files"][0]["status"] == "failed"
+    assert "BrokenProcessPool" in result["files"][0]["error"]
+    assert result["summary"]["failed"] == 1
+    assert _count_account("acct-killed") == 0
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from api.app import forecast
+from api.app.db import engine
+from api.app.forecast import fit_forecasts, get_forecasts, refresh_forecasts
+from api.app.models import DataGeneration
+from api.app.rollups import ALL_MONTHS, FORECASTS_TABLE
+
+
+def test_fit_forecasts_matches_per_series_lstsq():
+    rng = np.random.default_rng(3)
+    cost = rng.uniform(50, 100, (6, 12)) + np.arange(12) * 5.0
+    cost[4, :7] = 0.0  # series that started late
+
+    fitted = fit_forecasts(cost, horizon=3)
+
+    for i, row in enumerate(cost):
+        start = np.flatnonzero(row > 0)[0]
+        x = forecast.design_matrix(12, 3, seasonal=False)
+        beta = np.linalg.lstsq(x[start:12], row[start:], rcond=None)[0]
+        assert fitted["forecast"][i] == pytest.approx(x[12:] @ beta)
+    assert fitted["n_obs"].tolist() == [12, 12, 12, 12, 5, 12]
+    assert (fitted["lower"] <= fitted["forecast"]).all()
+    assert (fitted["forecast"] <= fitted["upper"]).all()
+    assert set(fitted["model"]) == {"linear"}
+
+
+def test_fit_forecasts_uses_seasonal_terms_with_enough_history(monkeypatch):
+    monkeypatch.setattr(forecast, "SEASONAL_MONTHS", 24)
+    t = np.arange(36)
+    cost = np.vstack(
+        [100 + 20 * np.sin(2 * np.pi * t / 12), np.r_[np.zeros(20), t[20:]]]
+    )
+
+    fitted = fit_forecasts(cost, horizon=3)
+
+    assert fitted["model"].tolist() == ["seasonal", "linear"]
+    expected = 100 + 20 * np.sin(2 * np.pi * np.arange(36, 39) / 12)
+    assert fitted["forecast"][0] == pytest.approx(expected)
+    assert fitted["upper"][0] - fitted["lower"][0] == pytest.approx(0, abs=1e-4)
+    assert fitted["forecast"][1] == pytest.approx([36, 37, 38])
+
+
+def test_short_series_have_no_interval():
+    cost = np.array([[0.0, 0.0, 0.0, 10.0], [0.0, 0.0, 10.0, 20.0], [5, 10, 20, 20]])
+
+    fitted = fit_forecasts(cost, horizon=2)
+
+    # 1 and 2 months leave no residual degrees of freedom for a linear fit
+    assert np.isnan(fitted["lower"][:2]).all()
+    assert np.isnan(fitted["upper"][:2]).all()
+    assert fitted["forecast"][1] == pytest.approx([30.0, 40.0], rel=1e-4)
+    assert (fitted["upper"][2] > fitted["lower"][2]).all()
+
+
+def test_refresh_forecasts_stores_every_dimension(load_billing):
+    load_billing(
+        {
+            "invoice_month": ["2024-01", "2024-02", "2024-03", "2024-04"],
+            "account_id": "acct-forecast",
+            "service": "fc-Compute",
+            "resource_group": "fc-rg",
+            "resource_id": "fc-1",
+            "cost": [10.0, 20.0, 30.0, 40.0],
+        },
+        resources={"resource_id": ["fc-1"], "owner": "fc-owner"},
+    )
+
+    # three horizon months for each of the three dimensions
+    assert refresh_forecasts() == 9
+    for entity_type, entity in [
+        ("owner", "fc-owner"),
+        ("service", "fc-Compute"),
+        ("resource_group", "fc-rg"),
+    ]:
+        rows = get_forecasts(entity_type=entity_type, entity=entity)
+        assert [r["month"] for r in rows] == ["2024-05", "2024-06", "2024-07"]
+        assert [r["forecast"] for r in rows] == pytest.approx([50.0, 60.0, 70.0])
+        assert all(r["n_obs"] == 4 and r["model"] == "linear" for r in rows)
+
+    # forecasting from an earlier month ignores the later billing
+    refresh_forecasts(until="2024-03")
+    rows = get_forecasts(entity_type="owner", entity="fc-owner")
+    assert [r["month"] for r in rows] == ["2024-04", "2024-05", "2024-06"]
+    assert [r["forecast"] for r in rows] == pytest.approx([40.0, 50.0, 60.0])
+
+
+def test_refresh_forecasts_keeps_month_generations(load_billing):
+    load_billing(
+        {
+            "invoice_month": ["2024-01", "2024-02"],
+            "account_id": "acct-forecast-gen",
+            "service": "gen-Compute",
+            "resource_id": "gen-1",
+            "cost": [10.0, 20.0],
+        }
+    )
+    with engine.connect() as conn:
+        table = DataGeneration.__table__
+        before = dict(conn.execute(select(table.c.month_key, table.c.generation)).all())
+    refresh_forecasts()
+    with engine.connect() as conn:
+        after = dict(conn.execute(select(table.c.month_key, table.c.generation)).all())
+
+    months = {k: g for k, g in after.items() if k >= ALL_MONTHS}
+    assert months == {k: g for k, g in before.items() if k >= ALL_MONTHS}
+    assert after[FORECASTS_TABLE] == before.get(FORECASTS_TABLE, 0) + 1
+
+    # two months leave a linear fit no residuals: the bounds are stored NULL
+    rows = get_forecasts(entity_type="service", entity="gen-Compute")
+    assert rows and all(r["lower"] is None and r["upper"] is None for r in rows)
@@ -0,0 +1,66 @@
+import faiss
+import numpy as np
+import pytest
+
+from api.app import index_factory
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    return np.random.default_rng(0).normal(size=(12000, 32)).astype("float32")
+
+
+@pytest.mark.parametrize("kind", index_factory.INDEX_TYPES)
+def test_build_index_finds_stored_vectors(vectors, kind):
+    ids = np.arange(len(vectors), dtype="int64") * 3
+    index = index_factory.build_index(vectors, ids, kind=kind)
+
+    assert (
+        type(index_factory._base(index)).__name__
+        == {
+            "flat": "IndexFlatL2",
+            "ivf_flat": "IndexIVFFlat",
+            "ivf_pq": "IndexIVFPQ",
+            "hnsw": "IndexHNSWFlat",
+        }[kind]
+    )
+    _, found = index.search(vectors[:20], 5)
+    assert np.mean(found[:, 0] == ids[:20]) >= 0.9
+    assert index_factory.supports_remove(index) == (kind != "hnsw")
+
+
+def test_small_collections_fall_back_to_simpler_types():
+    assert index_factory.resolve_type("ivf_pq", 5000) == "ivf_flat"
+    assert index_factory.resolve_type("ivf_flat", 50) == "flat"
+    assert index_factory.resolve_type("hnsw", 3) == "hnsw"
+    index = index_factory.make_index(8, 10, kind="ivf_pq", id_map=False)
+    assert isinstance(index, faiss.IndexFlatL2)
+    with pytest.raises(ValueError):
+        index_factory.resolve_type("annoy", 1000)
+
+
+def test_search_params_survive_a_reload(vectors, tmp_path, monkeypatch):
+    index = index_factory.build_index(vectors, kind="ivf_flat")
+    path = str(tmp_path / "ivf.index")
+    faiss.write_index(index, path)
+
+    monkeypatch.setattr(index_factory, "NPROBE", 7)
+    assert faiss.extract_index_ivf(index_factory.read_index(path)).nprobe == 7
+    hnsw = index_factory.set_search_params(
+        index_factory.make_index(32, 100, kind="hnsw"), ef_search=99
+    )
+    assert index_factory._base(hnsw).hnsw.efSearch == 99
+
+
+@pytest.mark.parametrize("kind", ["flat", "ivf_flat", "hnsw"])
+def test_search_params_restrict_results_to_ids(vectors, kind):
+    ids = np.arange(len(vectors), dtype="int64") * 3
+    index = index_factory.build_index(vectors[:2000], ids[:2000], kind=kind)
+    allowed = ids[:2000:10]
+
+    _, found = index.search(
+        vectors[:5], 5, params=index_factory.search_params(index, allowed)
+    )
+    assert set(found[found >= 0].tolist()) <= set(allowed.tolist())
+    # an allowed vector is still its own nearest neighbour
+    assert found[0, 0] == allowed[0]
@@ -1,6 +1,12 @@
 import pytest
+import numpy as np
 import pandas as pd
-from api.app.kpi import get_cost_by_owner, monthly_trend, top_service_expenditures
+from api.app.kpi import (
+    batch_costs,
+    get_cost_by_owner,
+    monthly_trend,
+    top_service_expenditures,
+)
 
 # Test get_cost_by_owner
 def test_get_cost_by_owner():
@@ -31,3 +37,75 @@ def test_top_service_expenditures():
         assert isinstance(resource_id, (int, str))
         assert isinstance(owner, str) or owner is None
         assert isinstance(total_cost, (float, int))
+
+# Test batch_costs against the single-month / single-owner functions
+def test_batch_costs_matches_per_request_kpis(load_billing):
+    load_billing(
+        {
+            "invoice_month": ["2024-01", "2024-01", "2024-02", "2024-02"],
+            "account_id": "acct-batch",
+            "service": ["bk-DB", "bk-Compute", "bk-DB", "bk-DB"],
+            "resource_id": ["bk-1", "bk-2", "bk-1", "bk-orphan"],
+            "cost": [1.0, 2.0, 4.0, 8.0],
+        },
+        resources={"resource_id": ["bk-1", "bk-2"], "owner": ["bk-ann", "bk-ben"]},
+    )
+
+    cols = batch_costs(months=["2024-01", "2024-02"], group_by=["month", "owner"])
+    rows = list(zip(cols["month"], cols["owner"], cols["total_cost"]))
+    for month in ("2024-01", "2024-02"):
+        expected = {o: c for o, c in get_cost_by_owner(month)}
+        assert {o: c for m, o, c in rows if m == month} == expected
+
+    cols = batch_costs(owners=["bk-ann"], group_by=["month"])
+    assert cols == {"month": ["2024-01", "2024-02"], "total_cost": [1.0, 4.0]}
+    assert [t["total_cost"] for t in monthly_trend("bk-ann")] == cols["total_cost"]
+
+    # without owner grouping every billing line counts, orphans included
+    cols = batch_costs(months=["2024-02"], services=["bk-DB"], group_by=["service"])
+    assert cols == {"service": ["bk-DB"], "total_cost": [12.0]}
+
+    with pytest.raises(ValueError):
+        batch_costs(group_by=["region"])
+
+
+# Test top_n_per_group against a pandas ranking of the same rows
+def test_top_n_per_group_ranks_every_group(load_billing):
+    from api.app.kpi import top_n_per_group
+
+    rng = np.random.default_rng(11)
+    n = 120
+    owners = pd.DataFrame(
+        {
+            "resource_id": [f"tn-{i}" for i in range(30)],
+            "owner": rng.choice(["tn-a", "tn-b", "tn-c"], 30),
+        }
+    )
+    billing = pd.DataFrame(
+        {
+            "invoice_month": "2024-05",
+            "account_id": "acct-topn",
+            "subscription": [f"tn-sub-{i}" for i in range(n)],
+            "service": rng.choice(["tn-DB", "tn-Compute", "tn-AI"], n),
+            "region": rng.choice(["tn-east", "tn-west"], n),
+            "resource_id": rng.choice(owners["resource_id"], n),
+            "usage_qty": np.arange(n),
+            "cost": rng.uniform(1, 100, n).round(2),
+        }
+    )
+    load_billing(billing, resources=owners)
+    frame = billing.merge(owners, on="resource_id")
+
+    ranked = top_n_per_group(("service", "owner", "region"), n=3, month="2024-05")
+    for dim in ("service", "owner", "region"):
+        totals = frame.groupby([dim, "resource_id"])["cost"].sum().reset_index()
+        totals = totals.sort_values(
+            [dim, "cost", "resource_id"], ascending=[True, False, True]
+        )
+        expected = totals.groupby(dim).head(3)
+        got = ranked[dim]
+        assert [(r["group"], r["resource_id"]) for r in got] == list(
+            zip(expected[dim], expected["resource_id"])
+        )
+        assert [r["rank"] for r in got] == list(expected.groupby(dim).cumcount() + 1)
+        assert [r["total_cost"] for r in got] == pytest.approx(list(expected["cost"]))
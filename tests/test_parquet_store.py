@@ -0,0 +1,58 @@
+import pandas as pd
+import pyarrow.parquet as pq
+from api.app import parquet_store
+from api.app.etl import (
+    generate_sample,
+    init_db,
+    load_billing_files,
+    stage_csv_to_parquet,
+)
+
+
+def test_stage_uses_compact_types_and_round_trips(tmp_path):
+    csv_path = tmp_path / "billing.csv"
+    store = tmp_path / "store"
+    generate_sample(str(csv_path), months=2, rows_per_month=20)
+    init_db()
+    staged = stage_csv_to_parquet(str(csv_path), str(store))
+    assert staged["rows"] == 40
+    assert len(parquet_store.partition_files(str(store))) == 2
+
+    schema = pq.read_schema(staged["files"][0])
+    assert str(schema.field("service").type).startswith("dictionary")
+    assert str(schema.field("cost").type) == "float"
+
+    # float32 on disk, but the exact CSV values come back
+    raw = pd.read_csv(csv_path)
+    got = parquet_store.read_billing(["resource_id", "cost"], store_dir=str(store))
+    merged = raw.merge(got, on="resource_id", suffixes=("", "_pq"))
+    assert (merged["cost"] == merged["cost_pq"]).all()
+
+    # restaging the same file replaces its parts instead of adding more
+    stage_csv_to_parquet(str(csv_path), str(store))
+    assert len(parquet_store.partition_files(str(store))) == 2
+
+
+def test_kpi_for_month_reads_one_partition(tmp_path):
+    csv_path = tmp_path / "billing.csv"
+    store = tmp_path / "store"
+    generate_sample(str(csv_path), months=2, rows_per_month=10)
+    init_db()
+    stage_csv_to_parquet(str(csv_path), str(store))
+    raw = pd.read_csv(csv_path)
+    month = raw["invoice_month"].iloc[0]
+    kpi = parquet_store.kpi_for_month(month, str(store))
+    expected = raw[raw["invoice_month"] == month]
+    assert abs(kpi["total_cost"] - expected["cost"].sum()) < 1e-9
+    assert set(kpi["by_service"]) == set(expected["service"])
+
+
+def test_store_parts_load_like_csv(tmp_path):
+    csv_path = tmp_path / "billing.csv"
+    store = tmp_path / "store"
+    generate_sample(str(csv_path), months=1, rows_per_month=5)
+    init_db()
+    stage_csv_to_parquet(str(csv_path), str(store))
+    result = load_billing_files(str(store), workers=1)
+    assert result["summary"]["loaded"] == 1
+    assert result["summary"]["rows"] == 5
@@ -0,0 +1,76 @@
+import pandas as pd
+from api.app.etl import (
+    SessionLocal,
+    billing_frame,
+    init_db,
+    load_csv_to_db,
+    quality_report,
+)
+from api.app.models import Billing, BillingQuarantine
+from api.app.quality import RULES, QualityGate
+
+
+def _frame(**overrides):
+    base = {
+        "invoice_month": ["2025-04", "2025-05", "2025-04"],
+        "resource_id": ["r-1", "r-1", "r-2"],
+        "cost": [1.0, 2.0, 3.0],
+    }
+    base.update(overrides)
+    return billing_frame(pd.DataFrame(base), keep_nulls=True)
+
+
+def test_same_resource_in_another_month_is_not_a_duplicate():
+    gate = QualityGate()
+    assert gate.evaluate(_frame()).tolist() == [0, 0, 0]
+    # the identical rows again, in a later chunk
+    codes = gate.evaluate(_frame())
+    assert [RULES[c - 1] for c in codes] == ["duplicate_row"] * 3
+    assert gate.flags == ["duplicate_row"]
+
+
+def test_first_failing_rule_wins():
+    gate = QualityGate()
+    codes = gate.evaluate(
+        _frame(resource_id=[None, "r-1", "r-2"], cost=[-1.0, -2.0, 3.0])
+    )
+    assert [RULES[c - 1] if c else None for c in codes] == [
+        "null_resource_id",
+        "negative_cost",
+        None,
+    ]
+    assert gate.flags == ["null_resource_id", "negative_cost"]
+
+
+def test_bad_rows_are_quarantined_not_loaded(tmp_path):
+    path = tmp_path / "dirty.csv"
+    pd.DataFrame(
+        {
+            "invoice_month": ["2025-03"] * 5,
+            "account_id": ["acct-quality"] * 5,
+            "resource_id": ["q-1", "q-2", None, "q-3", "q-1"],
+            "cost": [1.0, 2.0, 4.0, -8.0, 1.0],
+        }
+    ).to_csv(path, index=False)
+    init_db()
+    flags = load_csv_to_db(str(path), chunk_size=2)
+    assert flags == ["null_resource_id", "negative_cost", "duplicate_row"]
+
+    session = SessionLocal()
+    try:
+        loaded = session.query(Billing).filter(Billing.account_id == "acct-quality")
+        assert sorted(b.resource_id for b in loaded) == ["q-1", "q-2"]
+        rejected = session.query(BillingQuarantine).filter(
+            BillingQuarantine.rule == "null_resource_id",
+            BillingQuarantine.account_id == "acct-quality",
+        )
+        # the missing id is stored as NULL, not as the string "nan"
+        assert [(q.resource_id, q.row_number) for q in rejected] == [(None, 3)]
+    finally:
+        session.close()
+
+    assert quality_report(str(path)) == {
+        "null_resource_id": {"rows": 1, "cost": 4.0},
+        "negative_cost": {"rows": 1, "cost": -8.0},
+        "duplicate_row": {"rows": 1, "cost": 1.0},
+    }
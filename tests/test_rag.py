@@ -2,25 +2,21 @@ import os
 import pytest
 import json
 from api.app.rag import Retriever, sync_db_to_vectors, get_cost_by_owner
-from api.app.etl import SessionLocal, generate_sample, init_db, load_csv_to_db, load_resources_to_db
+from api.app.etl import generate_sample
 import pandas as pd
 
 @pytest.fixture(scope="module")
-def setup_db(tmp_path_factory):
+def setup_db(tmp_path_factory, load_billing):
     tmp_path = tmp_path_factory.mktemp("data")
     billing_csv = tmp_path / "sample_billing.csv"
     generate_sample(str(billing_csv), months=2, rows_per_month=5)
-    init_db()
-    load_csv_to_db(str(billing_csv))
 
     # Resources
     df = pd.read_csv(billing_csv)
     df_resources = df[['resource_id', 'tags_json']].drop_duplicates().copy()
     df_resources['owner'] = df_resources['tags_json'].apply(lambda x: json.loads(x).get('owner', 'unknown'))
     df_resources['env'] = 'dev'
-    resources_csv = tmp_path / "sample_resources.csv"
-    df_resources.to_csv(resources_csv, index=False)
-    load_resources_to_db(str(resources_csv))
+    load_billing(df, resources=df_resources)
 
     return tmp_path
 
@@ -33,11 +29,11 @@ def test_retriever_query(tmp_path_factory, top_k):
     retriever = Retriever(index_path=str(vect_path))
     results = retriever.query("Show top Azure costs", top_k=top_k)
 
+    # no index at this path: the dummy retriever's documents, shaped like
+    # real ones so /ask can read their text and source
     assert isinstance(results, list)
-    if results and isinstance(results[0], dict):
-        assert all('text' in r and 'source' in r for r in results)
-    else:
-        assert all(isinstance(r, str) for r in results)
+    assert 0 < len(results) <= top_k
+    assert all('text' in r and 'source' in r for r in results)
 
 @pytest.mark.usefixtures("setup_db")
 def test_sync_db_to_vectors(tmp_path_factory):
@@ -48,6 +44,7 @@ def test_sync_db_to_vectors(tmp_path_factory):
     from api.app import rag
     rag.VECTOR_INDEX_PATH = str(vect_path)
     rag.DOCS_PICKLE_PATH = docs_path
+    rag.SYNC_STATE_PATH = str(vect_path) + ".sync.pkl"
 
     sync_db_to_vectors()
 
@@ -59,6 +56,158 @@ def test_sync_db_to_vectors(tmp_path_factory):
     assert isinstance(results, list)
     assert all('text' in r and 'source' in r for r in results)
 
+@pytest.mark.usefixtures("setup_db")
+def test_sync_db_to_vectors_is_incremental(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("vector")
+    vect_path = str(tmp_path / "vector_store.index")
+
+    from api.app import rag
+    rag.VECTOR_INDEX_PATH = vect_path
+    rag.DOCS_PICKLE_PATH = vect_path + ".pkl"
+    rag.SYNC_STATE_PATH = vect_path + ".sync.pkl"
+
+    first = sync_db_to_vectors()
+    assert first["added"] > 0
+
+    # no new loads: nothing is re-read or re-embedded
+    again = sync_db_to_vectors()
+    assert again == {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+    rebuilt = sync_db_to_vectors(full=True)
+    assert rebuilt["added"] == first["added"]
+
+@pytest.mark.usefixtures("setup_db")
+def test_sync_db_to_vectors_follows_changed_and_deleted_rows(tmp_path_factory):
+    import faiss
+    from sqlalchemy import text
+    from api.app import rag
+    from api.app.etl import bulk_insert_billing, engine
+    from api.app.rollups import refresh_rollups
+
+    vect_path = str(tmp_path_factory.mktemp("vector") / "vector_store.index")
+    rag.VECTOR_INDEX_PATH = vect_path
+    rag.DOCS_PICKLE_PATH = vect_path + ".pkl"
+    rag.SYNC_STATE_PATH = vect_path + ".sync.pkl"
+    rows = pd.DataFrame({
+        "invoice_month": "2024-05",
+        "account_id": "acct-sync",
+        "service": "sync-Compute",
+        "resource_id": ["sync-1", "sync-2"],
+        "cost": [1.0, 2.0],
+    })
+    bulk_insert_billing(rows)
+    sync_db_to_vectors()
+    total = faiss.read_index(vect_path).ntotal
+
+    # a changed line rewrites its resource and service summaries only
+    bulk_insert_billing(rows.assign(cost=[5.0, 2.0]))
+    changed = sync_db_to_vectors()
+    assert changed == {"added": 0, "updated": 2, "removed": 0, "unchanged": 1}
+    assert faiss.read_index(vect_path).ntotal == total
+
+    # a deleted line drops its resource summary
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM billing WHERE resource_id = 'sync-2'"))
+        refresh_rollups(conn, ["2024-05"])
+    deleted = sync_db_to_vectors()
+    assert deleted == {"added": 0, "updated": 1, "removed": 1, "unchanged": 1}
+    assert faiss.read_index(vect_path).ntotal == total - 1
+
+def _fresh_vector_paths(tmp_path_factory):
+    from api.app import rag
+    vect_path = str(tmp_path_factory.mktemp("vector") / "vector_store.index")
+    rag.VECTOR_INDEX_PATH = vect_path
+    rag.DOCS_PICKLE_PATH = vect_path + ".pkl"
+    rag.SYNC_STATE_PATH = vect_path + ".sync.pkl"
+    return vect_path
+
+
+@pytest.mark.usefixtures("setup_db")
+def test_sync_trains_ivf_first_and_upgrades_fallback_types(tmp_path_factory, monkeypatch):
+    import faiss
+    from api.app import index_factory
+
+    vect_path = _fresh_vector_paths(tmp_path_factory)
+    monkeypatch.setattr(index_factory, "INDEX_TYPE", "ivf_flat")
+    # too few documents to train an IVF index: falls back to flat
+    monkeypatch.setattr(index_factory, "MIN_POINTS_PER_LIST", 10**6)
+    sync_db_to_vectors(batch_size=4)
+    assert index_factory.index_type(faiss.read_index(vect_path)) == "flat"
+
+    # once the collection can train it, the configured type is built
+    monkeypatch.setattr(index_factory, "MIN_POINTS_PER_LIST", 2)
+    monkeypatch.setattr(index_factory, "TRAIN_SAMPLE", 8)
+    stats = sync_db_to_vectors(batch_size=4)
+    assert stats == {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+    upgraded = faiss.read_index(vect_path)
+    assert index_factory.index_type(upgraded) == "ivf_flat"
+
+    # a new IVF index is trained on the first TRAIN_SAMPLE documents
+    first = sync_db_to_vectors(batch_size=4, full=True)
+    index = faiss.read_index(vect_path)
+    assert index_factory.index_type(index) == "ivf_flat"
+    assert index.ntotal == first["added"] == upgraded.ntotal
+
+
+@pytest.mark.usefixtures("setup_db")
+def test_sync_rebuilds_hnsw_instead_of_removing(tmp_path_factory, monkeypatch):
+    import faiss
+    from sqlalchemy import text
+    from api.app import index_factory, rag
+    from api.app.etl import bulk_insert_billing, engine
+    from api.app.rollups import refresh_rollups
+
+    vect_path = _fresh_vector_paths(tmp_path_factory)
+    monkeypatch.setattr(index_factory, "INDEX_TYPE", "hnsw")
+    rows = pd.DataFrame({
+        "invoice_month": "2024-08",
+        "account_id": "acct-hnsw",
+        "service": "hnsw-Compute",
+        "resource_id": ["hnsw-1", "hnsw-2"],
+        "cost": [1.0, 2.0],
+    })
+    bulk_insert_billing(rows)
+    sync_db_to_vectors()
+    total = faiss.read_index(vect_path).ntotal
+
+    bulk_insert_billing(rows.assign(cost=[5.0, 2.0]))
+    assert sync_db_to_vectors()["updated"] == 2
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM billing WHERE resource_id = 'hnsw-2'"))
+        refresh_rollups(conn, ["2024-08"])
+    assert sync_db_to_vectors()["removed"] == 1
+
+    index = faiss.read_index(vect_path)
+    assert index_factory.index_type(index) == "hnsw"
+    assert index.ntotal == total - 1
+    retriever = rag.Retriever(index_path=vect_path)
+    assert set(retriever.docs) == set(faiss.vector_to_array(index.id_map).tolist())
+    texts = [d["text"] for d in retriever.query("hnsw-1", top_k=50, month="2024-08")]
+    assert any("hnsw-1" in t and "$5.00" in t for t in texts)
+    assert not any("hnsw-2" in t for t in texts)
+
+
+@pytest.mark.usefixtures("setup_db")
+def test_retriever_filters_by_month_and_owner(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("vector")
+    vect_path = str(tmp_path / "vector_store.index")
+
+    from api.app import rag
+    rag.VECTOR_INDEX_PATH = vect_path
+    rag.DOCS_PICKLE_PATH = vect_path + ".pkl"
+    rag.SYNC_STATE_PATH = vect_path + ".sync.pkl"
+    sync_db_to_vectors()
+
+    retriever = rag.Retriever(index_path=vect_path)
+    month = retriever.query("Compute cost", top_k=1)[0]["month_key"]
+    results = retriever.query("Compute cost", top_k=50, month=month)
+    assert results and all(r["month_key"] == month for r in results)
+
+    owner = next(d["owner"] for d in retriever.docs.values() if d["owner"])
+    results = retriever.query("Compute cost", top_k=50, owner=owner.upper())
+    assert results and all(r["owner"] == owner for r in results)
+    assert retriever.query("Compute cost", owner="no-such-owner") == []
+
 @pytest.mark.usefixtures("setup_db")
 def test_get_cost_by_owner():
     month = "2025-04"
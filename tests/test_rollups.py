@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+from sqlalchemy import func
+
+from api.app.crud import kpi_for_month
+from api.app.etl import SessionLocal, load_csv_to_db, load_resources_to_db
+from api.app.kpi import get_cost_by_owner, monthly_trend
+from api.app.models import Billing, DataGeneration, Resource
+from api.app.rollups import ALL_MONTHS
+
+
+def _raw_cost_by_owner(month_key):
+    session = SessionLocal()
+    try:
+        rows = (
+            session.query(Resource.owner, func.sum(Billing.cost))
+            .join(Billing, Resource.resource_id == Billing.resource_id)
+            .filter(Billing.month_key == month_key)
+            .group_by(Resource.owner)
+            .all()
+        )
+    finally:
+        session.close()
+    return {owner or "unknown": cost for owner, cost in rows}
+
+
+def test_rollups_follow_billing_and_resource_loads(tmp_path, load_billing):
+    billing = tmp_path / "rollup_billing.csv"
+    resources = tmp_path / "rollup_resources.csv"
+    df = pd.DataFrame(
+        {
+            "invoice_month": ["2024-01", "2024-01", "2024-01", "2024-02"],
+            "account_id": ["acct-rollup"] * 4,
+            "resource_id": ["ru-1", "ru-2", "ru-orphan", "ru-1"],
+            "service": ["Compute", "DB", "DB", "Compute"],
+            "resource_group": ["rg-a", "rg-a", "rg-b", "rg-a"],
+            "cost": [1.5, 2.0, 4.0, 3.0],
+        }
+    )
+    load_billing(
+        df, resources={"resource_id": ["ru-1", "ru-2"], "owner": ["ru-alice", "ru-bob"]}
+    )
+
+    assert dict(get_cost_by_owner("2024-01")) == _raw_cost_by_owner(202401)
+    assert dict(get_cost_by_owner("2024-01")) == {"ru-alice": 1.5, "ru-bob": 2.0}
+    kpi = kpi_for_month("2024-01")
+    assert kpi["total_cost"] == pytest.approx(7.5)
+    assert kpi["by_resource_group"] == {"rg-a": 3.5, "rg-b": 4.0}
+    assert monthly_trend("ru-alice") == [
+        {"month": "2024-01", "total_cost": 1.5},
+        {"month": "2024-02", "total_cost": 3.0},
+    ]
+
+    # a changed month is re-aggregated on reload
+    df.loc[3, "cost"] = 5.0
+    df.to_csv(billing, index=False)
+    load_csv_to_db(str(billing))
+    assert monthly_trend("ru-alice")[-1] == {"month": "2024-02", "total_cost": 5.0}
+
+    # an owner change moves cost in every month
+    pd.DataFrame(
+        {"resource_id": ["ru-1", "ru-2"], "owner": ["ru-bob", "ru-bob"]}
+    ).to_csv(resources, index=False)
+    load_resources_to_db(str(resources))
+    assert monthly_trend("ru-alice") == []
+    assert dict(get_cost_by_owner("2024-01")) == {"ru-bob": 3.5}
+
+
+def _generations():
+    session = SessionLocal()
+    try:
+        return dict(session.query(DataGeneration.month_key, DataGeneration.generation))
+    finally:
+        session.close()
+
+
+def test_resource_change_refreshes_only_its_billed_months(tmp_path, load_billing):
+    resources = tmp_path / "partial_resources.csv"
+    load_billing(
+        {
+            "invoice_month": ["2024-05", "2024-06"],
+            "account_id": "acct-partial",
+            "resource_id": ["rp-1", "rp-2"],
+            "service": "Compute",
+            "cost": [1.0, 2.0],
+        },
+        resources={"resource_id": ["rp-1", "rp-2"], "owner": "rp-alice"},
+    )
+    before = _generations()
+
+    pd.DataFrame(
+        {"resource_id": ["rp-1", "rp-2"], "owner": ["rp-bob", "rp-alice"]}
+    ).to_csv(resources, index=False)
+    load_resources_to_db(str(resources))
+    after = _generations()
+
+    assert after[202405] == before[202405] + 1
+    assert after[202406] == before[202406]
+    assert dict(get_cost_by_owner("2024-05")) == {"rp-bob": 1.0}
+    # only months with billing of changed resources were bumped
+    assert {k for k in after if after[k] != before.get(k)} == {ALL_MONTHS, 202405}